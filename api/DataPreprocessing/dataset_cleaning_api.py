@@ -7,6 +7,7 @@ from flask import current_app as app
 
 # UTILITIES
 from utilities.respond import respond
+from utilities.locks import lock_dataset
 from utilities.methods import (
     get_dataset_name, 
     load_dataset_copy, 
@@ -16,6 +17,8 @@ from utilities.methods import (
     save_dataset_copy,
     get_row_column_metadata
 )
+from utilities.operation_log import apply_operation
+from utilities.metadata_updates import MetadataUpdate, ROW_COLUMN_FIELDS
 
 # MODELS
 from models.user_model import Users
@@ -24,9 +27,6 @@ from models.dataset_metadata_model import MetaData
 # constants
 from api.DataPreprocessing.utilities_data_preprocessing import COLUMN_TYPE_OPTIONS, NUMERICAL, CATEGORICAL
 
-# OTHER
-import pandas as pd
-
 # BLUEPRINT
 dataCleaningAPI = Blueprint("dataCleaningAPI", __name__)
 dataCleaningAPI_restful = Api(dataCleaningAPI)
@@ -35,6 +35,7 @@ dataCleaningAPI_restful = Api(dataCleaningAPI)
 # Api to drop rows by categorical column values
 @dataCleaningAPI.route("/drop-by-column-value", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def drop_by_column_value():
     """
         TAKES dataset name and column name and column value as input
@@ -93,24 +94,24 @@ def drop_by_column_value():
                 raise
         
         # Drop the rows with the given column value
-        for col_name in col_value_info:
-            df = df[~df[col_name].isin(col_value_info[col_name])]
+        operation = ("drop_by_column_value", {"col_value_info": col_value_info})
+        df = apply_operation(df, *operation)
 
         # ================== Business Logic End ==================
         shape = df.shape
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-        metadata_dict = metadata_obj.to_mongo().to_dict()
-
-        metadata_dict["is_copy_modified"] = True
-        metadata_dict["n_rows"] = shape[0]
-        metadata_dict["n_columns"] = shape[1]
-        metadata_dict["n_values"] = shape[0] * shape[1]
-        
-        del metadata_dict["_id"]
-        metadata_obj.update(**metadata_dict)
+        # Only the row and value counts change, the column lists are not sent again
+        metadata_update = MetadataUpdate(dataset_name_copy).set(
+            is_copy_modified=True,
+            n_rows=shape[0],
+            n_columns=shape[1],
+            n_values=shape[0] * shape[1]
+        )
+        if not metadata_update.apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Rows dropped by column value"
@@ -128,6 +129,7 @@ def drop_by_column_value():
 # Api to drop rows by numerical column values and range
 @dataCleaningAPI.route("/drop-by-numerical-value", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def drop_by_numerical_value():
     """
         TAKES dataset name and column name and numerical column value as input
@@ -187,25 +189,25 @@ def drop_by_numerical_value():
                 raise
         
         # Drop the rows with the given numerical column range
-        for col_name in col_value_info:
-            df = df[(df[col_name] < col_value_info[col_name][0]) | (df[col_name] > col_value_info[col_name][1])]
+        operation = ("drop_by_numerical_value", {"col_value_info": col_value_info})
+        df = apply_operation(df, *operation)
         
         # ================== Business Logic End ==================
 
         shape = df.shape
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-        metadata_dict = metadata_obj.to_mongo().to_dict()
-
-        metadata_dict["is_copy_modified"] = True
-        metadata_dict["n_rows"] = shape[0]
-        metadata_dict["n_columns"] = shape[1]
-        metadata_dict["n_values"] = shape[0] * shape[1]
-        
-        del metadata_dict["_id"]
-        metadata_obj.update(**metadata_dict)
+        # Only the row and value counts change, the column lists are not sent again
+        metadata_update = MetadataUpdate(dataset_name_copy).set(
+            is_copy_modified=True,
+            n_rows=shape[0],
+            n_columns=shape[1],
+            n_values=shape[0] * shape[1]
+        )
+        if not metadata_update.apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Rows dropped by numerical value"
@@ -222,6 +224,7 @@ def drop_by_numerical_value():
 # Api to drop rows by index
 @dataCleaningAPI.route("/drop-by-row-index", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def drop_by_row_index():
     """
         TAKES dataset name and row_start and row_end index as input
@@ -292,24 +295,25 @@ def drop_by_row_index():
             err = "Row end must be less than the length of the dataset"
             raise
 
-        df.drop(df.index[row_start:row_end+1], inplace=True)
+        operation = ("drop_by_row_index", {"row_start": row_start, "row_end": row_end})
+        df = apply_operation(df, *operation)
 
         # ================== Business Logic End ==================
 
         shape = df.shape
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-        metadata_dict = metadata_obj.to_mongo().to_dict()
-
-        metadata_dict["is_copy_modified"] = True
-        metadata_dict["n_rows"] = shape[0]
-        metadata_dict["n_columns"] = shape[1]
-        metadata_dict["n_values"] = shape[0] * shape[1]
-        
-        del metadata_dict["_id"]
-        metadata_obj.update(**metadata_dict)
+        # Only the row and value counts change, the column lists are not sent again
+        metadata_update = MetadataUpdate(dataset_name_copy).set(
+            is_copy_modified=True,
+            n_rows=shape[0],
+            n_columns=shape[1],
+            n_values=shape[0] * shape[1]
+        )
+        if not metadata_update.apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Rows dropped successfully",
@@ -326,6 +330,7 @@ def drop_by_row_index():
 # Api to derop columns by column name
 @dataCleaningAPI.route("/drop-by-column-name", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def drop_by_column_name():
     """
         TAKES dataset name and column name as input
@@ -387,27 +392,25 @@ def drop_by_column_name():
                 err = "Column {} does not exist in the dataset".format(col)
                 raise
 
-        df.drop(columns=col_list, inplace=True)
+        operation = ("drop_by_column_name", {"col_list": col_list})
+        df = apply_operation(df, *operation)
 
         # ================== Business Logic End ==================
 
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
+        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).only(*ROW_COLUMN_FIELDS, "deleted_column_list").first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
         
-        # Metadata updation
-        updated_row_column_metadata = get_row_column_metadata(df)
-        for key, value in updated_row_column_metadata.items():
-            metadata_obj[key] = value
-
-        #Update Deleted columns
-        for col in col_list:
-            metadata_obj.deleted_column_list.append(col) 
+        # Metadata updation, the dropped columns are pulled from the column lists and pushed to the deleted columns
+        metadata_update = MetadataUpdate(dataset_name_copy)
+        metadata_update.set_row_column_metadata(metadata_obj, get_row_column_metadata(df))
+        metadata_update.set_list("deleted_column_list", metadata_obj.deleted_column_list, metadata_obj.deleted_column_list + list(col_list))
             
         # Update the metadata of the dataset
-        metadata_obj.is_copy_modified = True
-        metadata_obj.save()
+        if not metadata_update.set(is_copy_modified=True).apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Columns dropped successfully",
@@ -424,6 +427,7 @@ def drop_by_column_name():
 # Api to rename column names
 @dataCleaningAPI.route("/rename-column", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def rename_column():
     """
         TAKES dataset name and column name and new name as input
@@ -474,24 +478,24 @@ def rename_column():
         
         # ================== Business Logic Start ==================
 
-        df.rename(columns=col_name_change_info, inplace=True)
+        operation = ("rename_column", {"col_name_change_info": col_name_change_info})
+        df = apply_operation(df, *operation)
 
         # ================== Business Logic End ==================
 
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         # update metadata copy also
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
 
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-       # Metadata updation
-        updated_row_column_metadata = get_row_column_metadata(df)
-        for key, value in updated_row_column_metadata.items():
-            metadata_obj[key] = value
+        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).only(*ROW_COLUMN_FIELDS).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
+        # Metadata updation
+        metadata_update = MetadataUpdate(dataset_name_copy).set_row_column_metadata(metadata_obj, get_row_column_metadata(df))
             
         # Update the metadata of the dataset
-        metadata_obj.is_copy_modified = True
-        metadata_obj.save()
+        if not metadata_update.set(is_copy_modified=True).apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Column names changed successfully",
@@ -510,6 +514,7 @@ def rename_column():
 # Api to find and replace
 @dataCleaningAPI.route("/find-and-replace", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def find_and_replace():
     """
         TAKES dataset_name, column_name, find_value, replace_value as input 
@@ -578,25 +583,19 @@ def find_and_replace():
         
         # ================== Business Logic Start ==================
 
-        for column_name, find_replace_list in find_relace_info.items():
-            find_list = []
-            replace_list = []
-            for find_replace in find_replace_list:
-                find_list.append(find_replace["find"])
-                replace_list.append(find_replace["replace"])
-            df[column_name].replace(find_list, replace_list, inplace=True)
+        operation = ("find_and_replace", {"find_relace_info": find_relace_info})
+        df = apply_operation(df, *operation)
 
         # ================== Business Logic End ==================
 
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         # Update the metadata of the copy
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
 
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-
-        metadata_obj.is_copy_modified = True
-        metadata_obj.save()
+        if not MetadataUpdate(dataset_name_copy).set(is_copy_modified=True).apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Find and replace operation performed successfully",
@@ -614,6 +613,7 @@ def find_and_replace():
 # Api to change the data type of a column
 @dataCleaningAPI.route("/change-data-type", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def change_data_type():
     """
         TAKES dataset_name, column_name, new_data_type as input
@@ -670,31 +670,34 @@ def change_data_type():
                 err = f"Column '{column}' does not exists in the dataset"
                 raise
 
+        operation = ("change_data_type", {"col_data_type_change_info": col_data_type_change_info})
         try:
-            df = df.astype(col_data_type_change_info)
+            df = apply_operation(df, *operation)
         except ValueError as v:
             err = str(v)
             raise
 
         # ================== Business Logic End ==================
     
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
 
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-        metadata_dict = metadata_obj.to_mongo().to_dict()
+        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).only("column_datatypes").first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
 
-        current_column_datatypes = metadata_dict.get("column_datatypes", {})
+        current_column_datatypes = metadata_obj.column_datatypes or {}
+        new_column_datatypes = dict(current_column_datatypes)
         for column_name, new_data_type in col_data_type_change_info.items():
             if new_data_type == "str":
                 new_data_type = "object"
-            if column_name in current_column_datatypes:
-                current_column_datatypes[column_name] = new_data_type
+            if column_name in new_column_datatypes:
+                new_column_datatypes[column_name] = new_data_type
         
-        metadata_dict["is_copy_modified"] = True
-        del metadata_dict["_id"]
-        metadata_obj.update(**metadata_dict)
+        # Only the types of the changed columns are sent
+        metadata_update = MetadataUpdate(dataset_name_copy).set_items("column_datatypes", current_column_datatypes, new_column_datatypes)
+        if not metadata_update.set(is_copy_modified=True).apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Data type of the columns changed successfully",
@@ -711,6 +714,7 @@ def change_data_type():
 # Api to change column type from categorical to numerical and vice versa
 @dataCleaningAPI.route("/change-column-type", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def change_column_type():
     """
         TAKES dataset_name, column_name, new_column_type as input
@@ -763,11 +767,10 @@ def change_column_type():
         # ================== Business Logic Start ==================
 
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-        metadata_dict = metadata_obj.to_mongo().to_dict()
-        current_column_datatypes = metadata_dict.get("column_datatypes", {})
-        current_categorical_column_list = metadata_dict.get("categorical_column_list", [])
-        current_numerical_column_list = metadata_dict.get("numerical_column_list", [])
+        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).only("column_datatypes", "categorical_column_list", "numerical_column_list").first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
+        current_column_datatypes = dict(metadata_obj.column_datatypes or {})
+        current_categorical_column_list = list(metadata_obj.categorical_column_list or [])
+        current_numerical_column_list = list(metadata_obj.numerical_column_list or [])
 
         # for to numeric change the column to numeric and for to categorical change to string
         for column in col_type_change_info:
@@ -780,15 +783,17 @@ def change_column_type():
                 err = f"Invalid column type '{new_type}'"
                 raise
 
+        operation = ("change_column_type", {"col_type_change_info": col_type_change_info})
+        df = apply_operation(df, *operation)
+
+        for column, new_type in col_type_change_info.items():
             if new_type == NUMERICAL:
-                df[column] = pd.to_numeric(df[column], errors='coerce')
                 if column in current_categorical_column_list:
                     current_categorical_column_list.remove(column)
                 if column not in current_numerical_column_list:
                     current_numerical_column_list.append(column)
                 
             elif new_type == CATEGORICAL:
-                df[column] = df[column].astype(str)
                 if column in current_numerical_column_list:
                     current_numerical_column_list.remove(column)
                 if column not in current_categorical_column_list:
@@ -797,18 +802,20 @@ def change_column_type():
             if column in current_column_datatypes:
                 current_column_datatypes[column] = df[column].dtype.name
 
-        metadata_dict["column_datatypes"] = current_column_datatypes
-        metadata_dict["categorical_column_list"] = current_categorical_column_list
-        metadata_dict["numerical_column_list"] = current_numerical_column_list
+        # The columns are pulled from one list and pushed to the other, only the types of these columns are set
+        metadata_update = MetadataUpdate(dataset_name_copy)
+        metadata_update.set_items("column_datatypes", metadata_obj.column_datatypes or {}, current_column_datatypes)
+        metadata_update.set_list("categorical_column_list", metadata_obj.categorical_column_list or [], current_categorical_column_list)
+        metadata_update.set_list("numerical_column_list", metadata_obj.numerical_column_list or [], current_numerical_column_list)
 
         # ================== Business Logic End ==================
 
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         # Update the metadata of the copy
-        metadata_dict["is_copy_modified"] = True
-        del metadata_dict["_id"]
-        metadata_obj.update(**metadata_dict)
+        if not metadata_update.set(is_copy_modified=True).apply():
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
 
         res = {
             "msg": "Column type changed successfully",
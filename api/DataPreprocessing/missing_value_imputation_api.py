@@ -7,15 +7,17 @@ from flask import current_app as app
 
 # UTILITIES
 from utilities.respond import respond
-from utilities.methods import get_dataset_name, load_dataset_copy, load_dataset, log_error, make_dataset_copy, check_dataset_copy_exists, save_dataset_copy, get_row_column_metadata
+from utilities.locks import lock_dataset
+from utilities.methods import get_dataset_name, load_dataset_copy, log_error, make_dataset_copy, check_dataset_copy_exists, save_dataset_copy, get_row_column_metadata, get_null_counts, is_categorical_dtype_name
+from utilities.metadata_reads import get_metadata_record
+
+from utilities.operation_log import apply_operation
 
 # MODELS
 from models.user_model import Users
 from models.dataset_metadata_model import MetaData
 # constants
-
-# OTHER
-import pandas as pd
+from api.DataPreprocessing.utilities_data_preprocessing import ALL_COLUMNS
 
 # BLUEPRINT
 missingValueImputationAPI = Blueprint("missingValueImputationAPI", __name__)
@@ -25,6 +27,7 @@ missingValueImputationAPI_restful = Api(missingValueImputationAPI)
 # Api to get the percentage of missing values in each column of the given dataset
 @missingValueImputationAPI.route("/missing-value-percentage", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def get_missing_value_percentage():
     """
         TAKES dataset name and get_all_columns and as input
@@ -61,28 +64,33 @@ def get_missing_value_percentage():
 
         dataset_file_name = get_dataset_name(user.id, dataset_name) # dataset_name = iris_1
         
-        df = None
         err = None
         metadata = None
         
-        # ======================== Get Metada and Dataset ( Original) to handle some special cases =========================
+        # ======================== Get Metada and Null Counts ( Original) to handle some special cases =========================
         
          # get Metadata of original dataset
-        metadata_og = MetaData.objects(dataset_file_name=dataset_file_name).first_or_404(message=f"Dataset Metadata for {dataset_file_name} not found")
-        df_og,err = load_dataset(dataset_name, user.id, user.email)
+        metadata_og = get_metadata_record(dataset_file_name, fields=["is_copy", "column_list", "deleted_column_list"])
+        if not metadata_og:
+            err = f"Dataset Metadata for {dataset_file_name} not found"
+            raise
+        null_counts_og, n_rows_og, err = get_null_counts(dataset_name, user.id, user.email, is_copy=False)
         
         if err:
             raise
         
         # ======= Get Metada =======
-        # Look if the copy of dataset exists and if it does, load dataset copy otherwise load the original dataset
+        # Look if the copy of dataset exists and if it does, use dataset copy otherwise use the original dataset
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df,err = load_dataset_copy(dataset_name, user.id, user.email)
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name+"_copy").first_or_404(message=f"Dataset Metadata for {dataset_file_name}_copy not found")
+            null_counts, n_rows, err = get_null_counts(dataset_name, user.id, user.email, is_copy=True)
+            metadata = get_metadata_record(dataset_file_name+"_copy", fields=["is_copy", "column_list", "deleted_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name}_copy not found"
+                raise
             
         else:
-            df,err = load_dataset(dataset_name, user.id, user.email)
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name).first_or_404(message=f"Dataset Metadata for {dataset_file_name} not found")
+            null_counts, n_rows = null_counts_og, n_rows_og
+            metadata = metadata_og
         
         if err: 
             raise
@@ -112,10 +120,10 @@ def get_missing_value_percentage():
             
             # if the column is deleted from the copy of dataset then calculate the missing value percentage from the original dataset
             if is_column_deleted == True:
-                missing_percentage = round(df_og[col].isna().sum()/len(df_og[col]) * 100, 2)
+                missing_percentage = round(null_counts_og[col]/n_rows_og * 100, 2)
             # if the column is not deleted from the copy of dataset then calculate the missing value percentage
             else: 
-                missing_percentage = round(df[col].isna().sum()/len(df[col]) * 100, 2)
+                missing_percentage = round(null_counts[col]/n_rows * 100, 2)
                 
             non_missing_percentage = round(100 - missing_percentage,1)
             missing_value_data.append({
@@ -140,9 +148,9 @@ def get_missing_value_percentage():
             # Check if all columns are deleted from the copy of dataset
             if metadata.is_copy == True and len(metadata.column_list) == 0: # If all columns are deleted from the copy of dataset
                 is_column_deleted = True
-                all_columns_missing_value_percentage = round(df_og.isna().sum().sum()/df_og.size * 100, 1)
+                all_columns_missing_value_percentage = round(sum(null_counts_og.values())/(n_rows_og*len(null_counts_og)) * 100, 1)
             else:
-                all_columns_missing_value_percentage = round(df.isna().sum().sum()/df.size * 100, 1)
+                all_columns_missing_value_percentage = round(sum(null_counts.values())/(n_rows*len(null_counts)) * 100, 1)
                 
             all_columns_non_missing_value_percentage = round(100 - all_columns_missing_value_percentage,1)
             
@@ -185,6 +193,7 @@ def get_missing_value_percentage():
 # API to Impute Missing Value in a Dataset
 @missingValueImputationAPI.route("/impute-missing-value", methods=["POST"]) # type: ignore
 @jwt_required() # type: ignore
+@lock_dataset(exclusive=True)
 def impute_missing_value():
     """
         TAKES dataset_name, column_name, missing_value, imputation_method as input
@@ -249,178 +258,102 @@ def impute_missing_value():
         if column_name != "All Columns":
             column_dtype = metadata.column_datatypes[column_name]
         # ================== Business Logic Start ==================
+
+        # The missing values are imputed by the impute_missing_value operation, only the inputs are checked here
+        operation_params = {"column_name": column_name, "imputation_method": imputation_method}
         
         # When user wants to impute missing value of a particular column
-        if column_name != "All Columns":
+        if column_name != ALL_COLUMNS:
             
-            # Imputattion is DROP ROWS or DROP COLUMN
-            if imputation_method == "drop_rows" or imputation_method == "drop_column":
-                
-                # Drop the rows with missing value
-                if imputation_method == "drop_rows":
-                    
-                    df.dropna(subset=[column_name], inplace=True)
-                    # update the metadata of the dataset
-                    if metadata.n_rows != df.shape[0]:
-                        metadata.n_rows = df.shape[0]
-                        metadata.n_values = df.size
-                        response_message = "Rows with missing value dropped successfully"
-                 
-                # Drop entire column   
-                elif imputation_method == "drop_column":
-                    df.drop(column_name, axis=1, inplace=True)
-                
-                    # Update the metadata of the dataset
-                    updated_row_column_metadata = get_row_column_metadata(df)
-                    for key, value in updated_row_column_metadata.items():
-                        metadata[key] = value
-                        
-                    # Update in the metadata
-                    metadata.deleted_column_list.append(column_name)
-                    
-                    response_message = "Column dropped successfully"
-                
             # Imputation is MEAN, MEDIAN , MODE or Custom_Value    
-            else:  
-                   
-                imputation_value = None
+            if imputation_method != "drop_rows" and imputation_method != "drop_column":
                 
                 # Imputation is MEAN
                 if imputation_method == "mean":
                     
                     # Check if the column is of type int or float
-                    if column_dtype == "object" or column_dtype == "bool":
+                    if is_categorical_dtype_name(column_dtype):
                         err = "Cannot Impute Mean value in a Categorical column"
                         raise
                     
-                    imputation_value = df[column_name].mean()
-                    
                 # Imputation is MEDIAN
                 elif imputation_method == "median":
                     
                     # Check if the column is of type int or float
-                    if column_dtype == "object" or column_dtype == "bool":
+                    if is_categorical_dtype_name(column_dtype):
                         err = "Cannot Impute Median value in a Categorical column"
                         raise
-                    
-                    imputation_value = df[column_name].median()
 
-                # Imputation is MODE
-                elif imputation_method == "mode":
-                    imputation_value = df[column_name].mode()[0]
-            
                 # Imputation is Custom Value ( imputation_method == "custom_value" )
                 elif imputation_method == "custom_value":
                     
                     imputation_value = request.json.get("imputation_value")
                     
                     # Check if we are imputing a numeric value in a categorical column
-                    if (column_dtype == "object" or column_dtype == "bool") and isinstance(imputation_value, (int, float )):
+                    if is_categorical_dtype_name(column_dtype) and isinstance(imputation_value, (int, float )):
                         err = "Cannot Impute a Numeric value in a Categorical column"
                         raise
                     
                     # Check if we are imputing a categorical value in a numeric column
-                    if (column_dtype != "object" and column_dtype != "bool") and not isinstance(imputation_value, (int, float )): 
+                    if not is_categorical_dtype_name(column_dtype) and not isinstance(imputation_value, (int, float )): 
                         err = "Cannot Impute a Categorical value in a Numeric column"
                         raise
+
+                    operation_params["imputation_value"] = imputation_value
                 
-                else:
+                elif imputation_method != "mode":
                     err = "Invalid Imputation Method"
                     raise
-                
-                # Impute the missing value
-                df[column_name].fillna(imputation_value, inplace=True)
-                
-                response_message = "Missing value imputed successfully"
             
         # When user wants to impute missing value of all columns
         else:
             
-            # Imputattion is DROP ROWS or DROP COLUMN
-            if imputation_method == "drop_rows" or imputation_method == "drop_column":
-                
-                # Drop the rows with missing value
-                if imputation_method == "drop_rows":
-                    
-                    df.dropna(inplace=True)
-                    # update the metadata of the dataset
-                    if metadata.n_rows != df.shape[0]:
-                        metadata.n_rows = df.shape[0]
-                        metadata.n_values = df.size
-                    
+            if imputation_method not in ["drop_rows", "drop_column", "mean", "median", "mode"]:
+                err = "Invalid Imputation Method"
+                raise
+
+            if imputation_method == "mean" or imputation_method == "median":
+                operation_params["numerical_column_list"] = metadata.numerical_column_list
+                operation_params["categorical_column_list"] = metadata.categorical_column_list
+
+        columns_before_imputation = df.columns.tolist()
+        operation = ("impute_missing_value", operation_params)
+        df = apply_operation(df, *operation)
+
+        # Drop the rows with missing value
+        if imputation_method == "drop_rows":
+            # update the metadata of the dataset
+            if metadata.n_rows != df.shape[0]:
+                metadata.n_rows = df.shape[0]
+                metadata.n_values = df.size
+                if column_name != ALL_COLUMNS:
                     response_message = "Rows with missing value dropped successfully"
-                 
-                # Drop entire column   
-                elif imputation_method == "drop_column":
-                    
-                    # Getting Columns with missing value
-                    columns_with_missing_value = []
-                    for column in df.columns:
-                        if df[column].isnull().values.any():
-                            columns_with_missing_value.append(column)
+            if column_name == ALL_COLUMNS:
+                response_message = "Rows with missing value dropped successfully"
 
-                    df.drop(columns_with_missing_value, axis=1, inplace=True)
-                                   
-                    # Update the metadata of the dataset
-                    updated_row_column_metadata = get_row_column_metadata(df)
-                    for key, value in updated_row_column_metadata.items():
-                        metadata[key] = value
+        # Drop entire column(s)
+        elif imputation_method == "drop_column":
+            # Update the metadata of the dataset
+            updated_row_column_metadata = get_row_column_metadata(df)
+            for key, value in updated_row_column_metadata.items():
+                metadata[key] = value
 
-                    # Update the deleted_column_status in the metadata
-                    for column in columns_with_missing_value:
-                        # Update in the metadata
-                        metadata.deleted_column_list.append(column)
-                                            
-                    response_message = "Columns with missing value dropped successfully"
-                    
-            # Imputation is MEAN, MEDIAN , MODE or Custom_Value    
-            else:  
-                   
-                imputation_values = None
-                
-                # Imputation is MEAN
-                if imputation_method == "mean":
-                    
-                    # For numerical columns impute mean value
-                    numercical_imputation_values = df[metadata.numerical_column_list].mean()
-                    
-                    # For categorical columns impute mode value
-                    categorical_imputation_values = df[metadata.categorical_column_list].mode().iloc[0]
-                    
-                    # Concatenate the imputation values
-                    imputation_values = pd.concat([numercical_imputation_values, categorical_imputation_values])
-                
-                # Imputation is MEDIAN
-                elif imputation_method == "median":
-                    
-                    # For numerical columns impute median value
-                    numercical_imputation_values = df[metadata.numerical_column_list].median()
-                    
-                    # For categorical columns impute mode value
-                    categorical_imputation_values = df[metadata.categorical_column_list].mode().iloc[0]
-                    
-                    # Concatenate the imputation values
-                    imputation_values = pd.concat([numercical_imputation_values, categorical_imputation_values])
+            # Update the deleted_column_status in the metadata
+            for column in columns_before_imputation:
+                if column not in df.columns:
+                    metadata.deleted_column_list.append(column)
 
-                # Imputation is MODE
-                elif imputation_method == "mode":
-                    imputation_values = df.mode().iloc[0]
-    
-                else:
-                    err = "Invalid Imputation Method"
-                    raise
-                    
-                # Impute the missing value
-                df.fillna(imputation_values, inplace=True)
-                
-                response_message = "Missing value imputed successfully"
+            response_message = "Column dropped successfully" if column_name != ALL_COLUMNS else "Columns with missing value dropped successfully"
+
+        else:
+            response_message = "Missing value imputed successfully"
         
         # Update the metadata of the dataset
         metadata.is_copy_modified = True
         metadata.save()
         
         # ================== Business Logic End ==================
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         res = {
             "msg": response_message,
@@ -1,10 +1,122 @@
 """Common methods, constants, and utilities for Data Preprocessing API"""
 
 # Import
+import pandas as pd
+from utilities.operation_log import register_operation
+from utilities.methods import categories_to_object
 
 # =========METHODS================
 
+# Operations of the Data Preprocessing APIs, these are replayed from the operation log of the dataset copy.
+# The inputs are validated by the APIs before the operation is applied.
+
+@register_operation("drop_by_column_value")
+def drop_by_column_value(df, col_value_info):
+    for col_name in col_value_info:
+        df = df[~df[col_name].isin(col_value_info[col_name])]
+    return df
+
+@register_operation("drop_by_numerical_value")
+def drop_by_numerical_value(df, col_value_info):
+    for col_name in col_value_info:
+        df = df[(df[col_name] < col_value_info[col_name][0]) | (df[col_name] > col_value_info[col_name][1])]
+    return df
+
+@register_operation("drop_by_row_index")
+def drop_by_row_index(df, row_start, row_end):
+    df.drop(df.index[row_start:row_end+1], inplace=True)
+    return df
+
+@register_operation("drop_by_column_name")
+def drop_by_column_name(df, col_list):
+    df.drop(columns=col_list, inplace=True)
+    return df
+
+@register_operation("rename_column")
+def rename_column(df, col_name_change_info):
+    df.rename(columns=col_name_change_info, inplace=True)
+    return df
+
+@register_operation("find_and_replace")
+def find_and_replace(df, find_relace_info):
+    for column_name, find_replace_list in find_relace_info.items():
+        find_list = []
+        replace_list = []
+        for find_replace in find_replace_list:
+            find_list.append(find_replace["find"])
+            replace_list.append(find_replace["replace"])
+        # On a category column the replacements are applied to the categories one after another,
+        # so a => b, b => c would give c for a. The values are replaced instead.
+        is_category = str(df[column_name].dtype) == "category"
+        df = categories_to_object(df, [column_name])
+        df[column_name].replace(find_list, replace_list, inplace=True)
+        if is_category:
+            df[column_name] = df[column_name].astype("category")
+    return df
+
+@register_operation("change_data_type")
+def change_data_type(df, col_data_type_change_info):
+    return df.astype(col_data_type_change_info)
+
+@register_operation("change_column_type")
+def change_column_type(df, col_type_change_info):
+    # for to numeric change the column to numeric and for to categorical change to string
+    for column, new_type in col_type_change_info.items():
+        if new_type == NUMERICAL:
+            df = categories_to_object(df, [column]) # to_numeric does not take category columns
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        elif new_type == CATEGORICAL:
+            df[column] = df[column].astype(str)
+    return df
+
+@register_operation("impute_missing_value")
+def impute_missing_value(df, column_name, imputation_method, imputation_value=None, numerical_column_list=None, categorical_column_list=None):
+    # When user wants to impute missing value of a particular column
+    if column_name != ALL_COLUMNS:
+        if imputation_method == "drop_rows":
+            df.dropna(subset=[column_name], inplace=True)
+        elif imputation_method == "drop_column":
+            df.drop(column_name, axis=1, inplace=True)
+        else:
+            if imputation_method == "mean":
+                imputation_value = df[column_name].mean()
+            elif imputation_method == "median":
+                imputation_value = df[column_name].median()
+            elif imputation_method == "mode":
+                imputation_value = df[column_name].mode()[0]
+            elif str(df[column_name].dtype) == "category" and imputation_value not in df[column_name].cat.categories:
+                df[column_name] = df[column_name].cat.add_categories([imputation_value])
+            df[column_name].fillna(imputation_value, inplace=True)
+
+    # When user wants to impute missing value of all columns
+    else:
+        if imputation_method == "drop_rows":
+            df.dropna(inplace=True)
+        elif imputation_method == "drop_column":
+            # Getting Columns with missing value
+            columns_with_missing_value = []
+            for column in df.columns:
+                if df[column].isnull().values.any():
+                    columns_with_missing_value.append(column)
+            df.drop(columns_with_missing_value, axis=1, inplace=True)
+        else:
+            if imputation_method == "mean" or imputation_method == "median":
+                # For numerical columns impute mean/median value
+                if imputation_method == "mean":
+                    numercical_imputation_values = df[numerical_column_list].mean()
+                else:
+                    numercical_imputation_values = df[numerical_column_list].median()
+                # For categorical columns impute mode value
+                categorical_imputation_values = df[categorical_column_list].mode().iloc[0]
+                # Concatenate the imputation values
+                imputation_values = pd.concat([numercical_imputation_values, categorical_imputation_values])
+            elif imputation_method == "mode":
+                imputation_values = df.mode().iloc[0]
+            df.fillna(imputation_values, inplace=True)
+    return df
+
 # =========CONSTANTS================
 CATEGORICAL = "Categorical"
 NUMERICAL = "Numerical"
-COLUMN_TYPE_OPTIONS = ["Categorical", "Numerical"]
\ No newline at end of file
+COLUMN_TYPE_OPTIONS = ["Categorical", "Numerical"]
+ALL_COLUMNS = "All Columns"
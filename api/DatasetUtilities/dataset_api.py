@@ -1,10 +1,12 @@
 from datetime import datetime
+import math
 import os
 from flask import (
     Blueprint,
     request,
     current_app as app,
-    Response
+    Response,
+    stream_with_context
 )
 from models.user_model import Users
 from models.dataset_metadata_model import MetaData
@@ -17,14 +19,54 @@ from utilities.methods import (
     get_user_directory,
     load_dataset,
     load_dataset_copy,
+    write_dataset_file,
+    read_dataset_file,
+    get_dataset_compression,
+    materialise_dataset_copy,
+    get_temporary_file_name,
+    dates_to_strings,
     log_error
 )
+from utilities.metadata_reads import get_metadata_record
 from utilities.respond import respond
+from utilities.locks import lock_dataset, dataset_lock, DatasetLockTimeout
 from flask_restful import  Api
-import pandas as pd
-from utilities.constants import ALLOWED_DB_PER_USER
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utilities.constants import ALLOWED_DB_PER_USER, CATEGORICAL_DTYPES
 from pathlib import Path
 from manage.celery_setup import celery_instance
+from manage.db_setup import db
+from manage.dataset_cache import dataset_cache
+from manage.metadata_cache import metadata_cache
+from utilities.column_statistics import (
+    rename_column_statistics,
+    delete_column_statistics,
+    get_statistics_signature,
+    refresh_column_statistics_signature
+)
+from utilities.operation_log import clear_operation_log
+from utilities.parquet_compression import parse_compression
+from api.DatasetUtilities.utilities import (
+    save_uploaded_dataset,
+    iter_dataset_csv,
+    iter_dataset_ipc,
+    iter_dataset_parquet,
+    get_export_columns,
+    send_stored_dataset,
+    EXPORT_FORMATS,
+    DATASETS_PER_PAGE,
+    DATASET_SORT_FIELDS
+)
+from utilities.dataset_filters import get_dataset_filters
+from utilities.upload_jobs import (
+    create_upload_job,
+    update_upload_job,
+    get_upload_job,
+    UPLOAD_JOB_RUNNING,
+    UPLOAD_JOB_SUCCESS,
+    UPLOAD_JOB_FAILED
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 datasetAPI = Blueprint("datasetAPI", __name__)
@@ -33,6 +75,7 @@ datasetAPI_restful = Api(datasetAPI)
 # Api to upload dataset
 @datasetAPI.route("/upload-dataset", methods=['POST'])
 @jwt_required()
+@lock_dataset(exclusive=True, fields=("dataset",))
 def upload_dataset():
     """
         TAKES dataset file as input
@@ -69,64 +112,55 @@ def upload_dataset():
             err = "This dataset already exists"
             raise
         
-        # Read the csv and convert it into parquet
-        df = pd.read_csv(dataset)
-
-
-        # ======== Dataset MetaData ==========
-        dataset_file_name = dataset_name  # Name of parquet file saved in the directory 
-        dataset_size = dataset.content_length / 1000000 # Size of the dataset in MB
-        _dataset_name, dataset_extension = dataset.filename.split(".") # Name of the dataset file and extension (Original)
-        n_rows,n_columns = df.shape # Number of rows in the dataset
-        n_values = n_rows * n_columns # Number of values in the dataset
-        column_list = list(df.columns) # List of columns in the dataset
-        column_datatypes = df.dtypes.astype(str).to_dict() # Dictionary of column name and its type
-        numerical_column_list = df.select_dtypes(exclude=['object', 'bool']).columns.tolist() # List of numerical columns
-        categorical_column_list = df.select_dtypes(include=['object', 'bool']).columns.tolist() # List of categorical columns
-        deleted_column_list =  [] # List of deleted columns
+        # Codec of the dataset and of its working copy, codec[:level]
+        compression = request.form.get("compression", app.config["DATASET_COMPRESSION"])
+        copy_compression = request.form.get("copy_compression", app.config["DATASET_COPY_COMPRESSION"])
+        try:
+            parse_compression(compression)
+            parse_compression(copy_compression)
+        except ValueError as v:
+            err = str(v)
+            raise
 
-        
-        # Create the metadata object
-        metadata_obj = MetaData(
-            user_id = user.id,
-            user_email = user.email,
-            is_copy = False,
-            is_copy_modified = False,
-            date_created = datetime.now(),
-            last_modified = datetime.now(),
-            dataset_name = _dataset_name,
-            dataset_extension = dataset_extension,
-            dataset_file_name = dataset_file_name,
-            dataset_size = dataset_size,
-            n_rows = n_rows,
-            n_columns = n_columns,
-            n_values = n_values,
-            column_list = column_list,
-            column_datatypes = column_datatypes,
-            numerical_column_list = numerical_column_list,
-            categorical_column_list = categorical_column_list,
-            deleted_column_list =  deleted_column_list
-        )
-        
-        # If Metadata already exists for the dataset then delete it and create a new one
-        existing_metadata = MetaData.objects(dataset_file_name=dataset_file_name).first()
-        if existing_metadata:
-            existing_metadata.delete()
+        optimize_types = request.form.get("optimize_types", str(app.config["OPTIMIZE_DATASET_TYPES"])).lower() == "true"
+
+        # The upload is spooled to disk and converted to parquet from there in chunks, so the whole csv is never in memory
+        csv_file = get_temporary_file_name(dataset.filename)
+        dataset.save(csv_file)
+        dataset_size = os.path.getsize(csv_file) / 1000000 # Size of the uploaded csv in MB
 
-        # Save the metadata object
-        metadata_obj.save()
-        app.logger.info("Dataset '%s' metadata saved successfully",str(dataset.filename))
+        if not app.config["ASYNC_DATASET_UPLOAD"]:
+            err = save_uploaded_dataset(user, csv_file, dataset.filename, dataset_size, compression, copy_compression, optimize_types)
+            if err:
+                raise
+
+            user.db_count = user.db_count + 1
+            user.save()
+
+            app.logger.info("Dataset '%s' uploaded successfully",str(dataset.filename))
 
-        # Saving the dataset as parquet file
-        df.to_parquet(dataset_file, compression="snappy", index=True)
+            res = {
+                "msg":"Dataset Uploaded Successfully"
+            }
+            return respond(data=res)
 
+        # The dataset is counted when it is queued so the pending uploads are within ALLOWED_DB_PER_USER,
+        # the task gives it back if the upload fails
         user.db_count = user.db_count + 1
         user.save()
-        
-        app.logger.info("Dataset '%s' uploaded successfully",str(dataset.filename))
-        
+        try:
+            job_id = create_upload_job(user.id, dataset.filename, os.path.getsize(csv_file))
+            process_dataset_upload.delay(job_id, user.id, csv_file, dataset.filename, dataset_size, compression, copy_compression, optimize_types)
+        except Exception:
+            release_dataset_count(user.id)
+            os.remove(csv_file)
+            raise
+
+        app.logger.info("Dataset '%s' queued for upload. Job id: %s", str(dataset.filename), job_id)
+
         res = {
-            "msg":"Dataset Uploaded Successfully"
+            "msg": "Dataset upload queued",
+            "job_id": job_id
         }
         return respond(data=res)
 
@@ -137,9 +171,93 @@ def upload_dataset():
         return respond(error=err)
 
 
+def release_dataset_count(user_id):
+    # Atomic decrement, the count may have changed since the upload was queued
+    Users.query.filter_by(id=user_id).update({Users.db_count: Users.db_count - 1})
+    db.session.commit()
+
+
+@celery_instance.task
+def process_dataset_upload(job_id, user_id, csv_file, filename, dataset_size, compression, copy_compression, optimize_types):
+    """
+    Celery task converting an uploaded csv to the dataset, the progress and the result are reported in the upload job
+    """
+    err = None
+    try:
+        user = Users.query.filter_by(id=user_id).first()
+        if not user:
+            err = "No such user exits"
+            raise
+
+        update_upload_job(job_id, status=UPLOAD_JOB_RUNNING)
+        try:
+            with dataset_lock([get_dataset_name(user.id, filename)], exclusive=True):
+                err = save_uploaded_dataset(
+                    user, csv_file, filename, dataset_size, compression, copy_compression, optimize_types,
+                    progress=lambda **fields: update_upload_job(job_id, **fields)
+                )
+        except DatasetLockTimeout:
+            err = "Dataset is busy with another request. Please try again"
+            raise
+        if err:
+            raise
+
+        update_upload_job(job_id, status=UPLOAD_JOB_SUCCESS)
+        app.logger.info("Dataset '%s' uploaded successfully. Job id: %s", filename, job_id)
+
+    except Exception as e:
+        log_error(err_msg="Error in processing the uploaded dataset", error=err, exception=e)
+        if not err:
+            err = "Error in uploading the dataset"
+        release_dataset_count(user_id)
+        update_upload_job(job_id, status=UPLOAD_JOB_FAILED, error=err)
+
+    finally:
+        if os.path.exists(csv_file):
+            os.remove(csv_file)
+
+
+# Api to get the status of a queued dataset upload
+@datasetAPI.route("/upload-status/<job_id>", methods=["GET"])
+@jwt_required()
+def get_upload_status(job_id):
+    """
+        TAKES the job id given by the upload dataset api as input
+        PERFORMS fetch the status of the upload job
+        RETURNS the status (queued, running, success or failed), the stage, the bytes parsed out of the total,
+                the rows written and the error if it failed as response
+    """
+    err = None
+    try:
+        current_user = get_jwt_identity()
+        job = get_upload_job(job_id)
+        if not job or job["user_id"] != current_user["id"]:
+            err = "No such upload job exists"
+            raise
+
+        res = {
+            "job_id": job_id,
+            "dataset_name": job["dataset_name"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "total_bytes": job["total_bytes"],
+            "bytes_parsed": job["bytes_parsed"],
+            "rows_written": job["rows_written"],
+            "error": job["error"] or None
+        }
+        return respond(data=res)
+
+    except Exception as e:
+        log_error(err_msg="Error in fetching the upload status", error=err, exception=e)
+        if not err:
+            err = "Error in fetching the upload status"
+        return respond(error=err)
+
+
 # Api to delete a dataset
 @datasetAPI.route("/delete-dataset", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def delete_dataset():
     """
         TAKES dataset name as input
@@ -175,6 +293,8 @@ def delete_dataset():
         
         # Delete the dataset
         Path(dataset_file).unlink()
+        dataset_cache.invalidate(dataset_file)
+        delete_column_statistics(dataset_name)
 
         user.db_count = user.db_count - 1
         user.save()
@@ -190,7 +310,7 @@ def delete_dataset():
         # Delete the metadata
         dataset_name_copy = dataset_name + "_copy" # iris_1_copy
 
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name).first()
+        metadata_obj = MetaData.objects(dataset_file_name=dataset_name).only("dataset_file_name").first()
         # if Metadata does not exists then log it and continue
         if metadata_obj:
             metadata_obj.delete()
@@ -198,7 +318,7 @@ def delete_dataset():
         else:
             app.logger.info(f"Metadata for '{dataset_name}' does not exists")
         
-        metadata_obj_copy = MetaData.objects(dataset_file_name=dataset_name_copy).first()
+        metadata_obj_copy = MetaData.objects(dataset_file_name=dataset_name_copy).only("dataset_file_name").first()
         # if Metadata does not exists then log it and continue
         if metadata_obj_copy:
             metadata_obj_copy.delete()
@@ -226,11 +346,13 @@ def delete_dataset():
 # Api to export a dataset
 @datasetAPI.route("/export-dataset", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def export_dataset():
     """
-        TAKES dataset name as input
+        TAKES dataset name, the format (csv, csv.gz, csv.zst, parquet or feather, csv by default) and optionally
+              the categorical_values/numerical_values filters of the rows and the list of columns to export as input
         PERFORMS export the dataset operations
-        RETURNS the csv dataset as response
+        RETURNS the dataset file (or the selected rows and columns of it) in that format as response
     """
     err = None
     try:
@@ -243,6 +365,7 @@ def export_dataset():
         dataset_name = request.json.get("dataset_name")
         if not dataset_name:
             err = "Dataset name is required"
+            raise
 
         dataset_name = get_dataset_name(user.id, dataset_name)
         dataset_file = get_parquet_dataset_file_name(dataset_name, user.email)
@@ -251,14 +374,44 @@ def export_dataset():
             err = "This dataset does not exists"
             raise
 
-        df = pd.read_parquet(dataset_file)
-        df = df.to_csv(index=False)
+        export_format = request.json.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            err = f"Format has to be one of {', '.join(EXPORT_FORMATS)}"
+            raise
+        mimetype, csv_compression = EXPORT_FORMATS[export_format]
+        download_name = f"filename.{export_format}"
+
+        # Same filters as the global data representation, evaluated while the file is scanned
+        filters = get_dataset_filters(request.json.get("categorical_values", None), request.json.get("numerical_values", None))
+        columns = request.json.get("columns", None)
+
+        # The stored file is sent as it is, without decoding it. Resuming it takes the GET api below.
+        if export_format == "parquet" and not filters and not columns:
+            return send_stored_dataset(dataset_file, dataset_name, download_name)
+
+        # The file is opened while the dataset is locked, the response is streamed from it after the lock is released.
+        # A dataset saved meanwhile is written to a new file, so the export stays consistent.
+        parquet_file = pq.ParquetFile(dataset_file)
+        dataset_columns = get_export_columns(parquet_file)
+        missing_columns = [column for column in (columns or []) + [column for column, _operator, _values in filters] if column not in dataset_columns]
+        if missing_columns:
+            parquet_file.close()
+            err = f"Columns {', '.join(map(str, missing_columns))} do not exist in the dataset"
+            raise
+
+        batch_size = app.config["DATASET_EXPORT_BATCH_SIZE"]
+        if export_format == "parquet":
+            chunks = iter_dataset_parquet(parquet_file, batch_size, get_dataset_compression(), columns, filters)
+        elif export_format == "feather":
+            chunks = iter_dataset_ipc(parquet_file, batch_size, columns, filters)
+        else:
+            chunks = iter_dataset_csv(parquet_file, batch_size, columns, filters, compression=csv_compression)
 
         return Response(
-            df,
-            mimetype="text/csv",
+            stream_with_context(chunks),
+            mimetype=mimetype,
             headers={"Content-disposition":
-            "attachment; filename=filename.csv"}
+            f"attachment; filename={download_name}"}
         )
 
     except Exception as e:
@@ -268,9 +421,44 @@ def export_dataset():
         return respond(error=err)
 
 
+# Api to download the stored file of a dataset, Range and If-None-Match requests are answered on GET only
+@datasetAPI.route("/export-dataset/<dataset_name>", methods=["GET"])
+@jwt_required()
+@lock_dataset()
+def download_dataset(dataset_name):
+    """
+        TAKES dataset name as input, and the Range, If-Range and If-None-Match headers of the request
+        PERFORMS send the stored parquet file of the dataset, or the requested part of it
+        RETURNS the dataset file (206 with a part of it, 304 if the ETag still matches) as response
+    """
+    err = None
+    try:
+        current_user = get_jwt_identity()
+        user = Users.query.filter_by(id=current_user["id"]).first()
+        if not user:
+            err = "No such user exits"
+            raise
+
+        dataset_name = get_dataset_name(user.id, dataset_name)
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user.email)
+
+        if not Path(dataset_file).is_file():
+            err = "This dataset does not exists"
+            raise
+
+        return send_stored_dataset(dataset_file, dataset_name, "filename.parquet")
+
+    except Exception as e:
+        log_error(err_msg="Error in downloading the dataset", error=err, exception=e)
+        if not err:
+            err = 'Error in downloading the dataset'
+        return respond(error=err)
+
+
 # Api to rename a dataset
 @datasetAPI.route("/rename-dataset", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True, fields=("dataset_name", "new_dataset_name"))
 def rename_dataset():
     """
         TAKES dataset name and new dataset name as input
@@ -304,10 +492,13 @@ def rename_dataset():
             raise
 
         new_dataset_file = get_parquet_dataset_file_name(new_dataset_name, user.email)
+        statistics_signature = get_statistics_signature(dataset_file)
         os.rename(dataset_file, new_dataset_file)
+        dataset_cache.invalidate(dataset_file)
+        rename_column_statistics(dataset_name, new_dataset_name, new_dataset_file, statistics_signature)
         
         # Update the metadata
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
+        metadata_obj = MetaData.objects(dataset_file_name=dataset_name).only("dataset_file_name").first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
         metadata_obj.update(dataset_name=new_dataset_name_inp, dataset_file_name=new_dataset_name)
         
         app.logger.info("Dataset '%s' renamed to '%s' successfully",str(dataset_name_inp), str(new_dataset_name_inp))
@@ -329,9 +520,10 @@ def rename_dataset():
 @jwt_required()
 def get_datasets():
     """
-        TAKES nothing as input
-        PERFORMS fetch all the datasets of the user
-        RETURNS the list of datasets as response
+        TAKES the page (0 by default), the datasets per page, the field to sort by (modified, name or size,
+              modified by default) and the order (asc or desc, desc by default) as query parameters
+        PERFORMS fetch the datasets of the user from their metadata
+        RETURNS the page of the list of datasets, the number of datasets and of pages as response
     """
     err = None
     try:
@@ -340,33 +532,44 @@ def get_datasets():
         if not user:
             err = "No such user exits"
             raise
-        
-        user_directory = get_user_directory(user.email)
-        Path(user_directory).mkdir(parents=True, exist_ok=True) # creates the directory if not present
 
-        all_datasets_list = os.listdir(user_directory)
-        all_datasets_dict = []
-        for dataset in all_datasets_list:
-            name = dataset.split(".")[0] # remove the .parquet extension
-            # split current name and check if there is word "copy" in it at the end
-            name_split = name.split("_")
-            if name_split[-1] == "copy":
-                continue
-            name = "_".join(name_split[:-1]) # remove the user id
-            temp = {
-                "name":name,
-                "modified": datetime.fromtimestamp(os.path.getmtime(os.path.join(user_directory, dataset))).strftime('%d %b, %Y %H:%M:%S'),
-                "size": round(os.path.getsize(os.path.join(user_directory, dataset)) / (1024), 2) # (KB) THIS IS WRONG WE NEED CSV SIZE NOT PARQUET SIZE
-            }
-            all_datasets_dict.append(temp)
+        page = request.args.get("page", 0, type=int)
+        per_page = request.args.get("per_page", DATASETS_PER_PAGE, type=int)
+        if page < 0 or per_page < 1:
+            err = "Page has to be 0 or more and per_page 1 or more"
+            raise
 
-        # sort the list by modified date
-        all_datasets_dict = sorted(all_datasets_dict, key=lambda k: datetime.strptime(k['modified'], '%d %b, %Y %H:%M:%S'), reverse=True)
+        sort_by = request.args.get("sort_by", "modified")
+        if sort_by not in DATASET_SORT_FIELDS:
+            err = f"Datasets can only be sorted by {', '.join(DATASET_SORT_FIELDS)}"
+            raise
+
+        order = request.args.get("order", "desc")
+        if order not in ("asc", "desc"):
+            err = "Order has to be asc or desc"
+            raise
+
+        # The saved datasets are listed from their metadata, the working copies have metadata of their own
+        datasets = MetaData.objects(user_id=user.id, is_copy=False)
+        n_datasets = datasets.count()
+        sort_field = ("-" if order == "desc" else "") + DATASET_SORT_FIELDS[sort_by]
+        datasets = datasets.only("dataset_name", "last_modified", "dataset_size").order_by(sort_field).skip(page * per_page).limit(per_page)
+
+        all_datasets_dict = []
+        for metadata in datasets:
+            all_datasets_dict.append({
+                "name": metadata.dataset_name,
+                "modified": metadata.last_modified.strftime('%d %b, %Y %H:%M:%S'),
+                "size": round(metadata.dataset_size * 1000, 2) # (KB) size of the uploaded csv
+            })
 
         res = {
             "email": user.email,
             "datasets":all_datasets_dict,
-            "db_count":user.db_count
+            "db_count":user.db_count,
+            "n_datasets": n_datasets,
+            "page": page,
+            "n_pages": math.ceil(n_datasets / per_page)
         }
 
         return respond(data=res)
@@ -376,15 +579,12 @@ def get_datasets():
         if not err:
             err = 'Error in getting the datasets'
         return respond(error=err)
-    finally:
-        # If directory is empty, delete the directory
-        if not os.listdir(user_directory):
-            os.rmdir(user_directory)
-            
+
 
 # Api to get the categorical columns of the dataset
 @datasetAPI.route("/get-columns-info", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def get_all_columns_info():
     """
         TAKES dataset name as input
@@ -415,10 +615,16 @@ def get_all_columns_info():
         # Look if the copy of dataset exists and if it does, load dataset copy otherwise load the original dataset
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
             df,err = load_dataset_copy(dataset_name, user.id, user.email)
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name+"_copy").first_or_404(message=f"Dataset Metadata for {dataset_file_name}_copy not found")
+            metadata = get_metadata_record(dataset_file_name+"_copy", fields=["column_list", "numerical_column_list", "categorical_column_list", "deleted_column_list", "column_datatypes", "n_rows", "n_columns"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name}_copy not found"
+                raise
         else:
             df,err = load_dataset(dataset_name, user.id, user.email)
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name).first_or_404(message=f"Dataset Metadata for {dataset_file_name} not found")
+            metadata = get_metadata_record(dataset_file_name, fields=["column_list", "numerical_column_list", "categorical_column_list", "deleted_column_list", "column_datatypes", "n_rows", "n_columns"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name} not found"
+                raise
         
         if err: 
             raise
@@ -427,7 +633,7 @@ def get_all_columns_info():
         #todo: Give all the categorical values in the response and give top 100 unique values in the frontend. As soon as someone types something we give next top 100
         values = {}
         for column in metadata.categorical_column_list:
-            values[column] = df[column].unique().tolist()[0:100]
+            values[column] = dates_to_strings(df[column]).unique().tolist()[0:100]
 
 
         res = {
@@ -450,6 +656,33 @@ def get_all_columns_info():
         return respond(error=err)
 
 
+# Api to fetch the hit/miss counters of the dataset cache of this worker
+@datasetAPI.route("/dataset-cache-stats", methods=["GET"])
+@jwt_required()
+def get_dataset_cache_stats():
+    """
+        TAKES nothing as input
+        PERFORMS fetch the counters of the in-process dataset and metadata caches
+        RETURNS the hits, misses, evictions, memory usage and decode times of the caches as response
+    """
+    err = None
+    try:
+        res = {
+            "pid": os.getpid(),
+            "dataset_cache": dataset_cache.stats(),
+            "metadata_cache": metadata_cache.stats(),
+            "decode_threads": pa.cpu_count(),
+            "io_threads": pa.io_thread_count()
+        }
+        return respond(data=res)
+
+    except Exception as e:
+        log_error(err_msg="Error in fetching the dataset cache stats", error=err, exception=e)
+        if not err:
+            err = "Error in fetching the dataset cache stats"
+        return respond(error=err)
+
+
 # Api to test redis functionality
 @celery_instance.task
 def keep_alive():
@@ -465,6 +698,7 @@ def keep_alive():
 # Api to get the categorical columns of the dataset
 @datasetAPI.route("/get-categorical-columns-info", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def get_categorical_columns_info():
     """
         TAKES dataset name as input
@@ -493,9 +727,15 @@ def get_categorical_columns_info():
         metadata = None
          # Look if the copy of dataset exists and if it does, load dataset copy metadata otherwise load the original dataset metadata
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name+"_copy").first_or_404(message=f"Dataset Metadata for {dataset_file_name}_copy not found")
+            metadata = get_metadata_record(dataset_file_name+"_copy", fields=["categorical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name}_copy not found"
+                raise
         else:
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name).first_or_404(message=f"Dataset Metadata for {dataset_file_name} not found")
+            metadata = get_metadata_record(dataset_file_name, fields=["categorical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name} not found"
+                raise
 
         res = {
             "categorical_columns":metadata.categorical_column_list,
@@ -514,6 +754,7 @@ def get_categorical_columns_info():
 # Api to get the numerical columns of the dataset
 @datasetAPI.route("/get-numerical-columns-info", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def get_numerical_columns_info():
     """
         TAKES dataset name as input
@@ -542,9 +783,15 @@ def get_numerical_columns_info():
         metadata = None
          # Look if the copy of dataset exists and if it does, load dataset copy metadata otherwise load the original dataset metadata
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name+"_copy").first_or_404(message=f"Dataset Metadata for {dataset_file_name}_copy not found")
+            metadata = get_metadata_record(dataset_file_name+"_copy", fields=["numerical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name}_copy not found"
+                raise
         else:
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name).first_or_404(message=f"Dataset Metadata for {dataset_file_name} not found")
+            metadata = get_metadata_record(dataset_file_name, fields=["numerical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name} not found"
+                raise
 
         res = {
             "numerical_columns":metadata.numerical_column_list,
@@ -563,6 +810,7 @@ def get_numerical_columns_info():
 # Api to save the current dataset copy as the new dataset
 @datasetAPI.route("/save-changes", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def save_changes():
     """
         TAKES dataset name as input
@@ -592,6 +840,9 @@ def save_changes():
             raise
         else:
 
+            # Write the logged edits of the copy to its file before it replaces the original
+            materialise_dataset_copy(dataset_name, user.id, user.email)
+
             directory = get_user_directory(user.email)
 
             # delete the current dataset
@@ -631,7 +882,19 @@ def save_changes():
               
             # rename the copy dataset as new dataset
             copy_dataset_file = get_parquet_dataset_file_name(copy_dataset_name, user.email)
+            statistics_signature = get_statistics_signature(copy_dataset_file)
             os.rename(copy_dataset_file, dataset_file) # dataset_file is the og dataset file
+            dataset_cache.invalidate(dataset_file)
+            dataset_cache.invalidate(copy_dataset_file)
+            clear_operation_log(copy_dataset_file) # empty, the edits were written to the file above
+            # Signed for the saved file, which has no log
+            rename_column_statistics(copy_dataset_name, dataset_name, dataset_file, statistics_signature)
+
+            # The copy is written with the codec of the working copies, the saved dataset goes back to its own codec
+            compression = get_dataset_compression(copy_metadata_obj)
+            if compression != get_dataset_compression(copy_metadata_obj, is_copy=True):
+                write_dataset_file(read_dataset_file(dataset_file), dataset_file, index=False, compression=compression)
+                refresh_column_statistics_signature(dataset_name, dataset_file)
             
             res = {
                 "msg":"Dataset changes Saved Successfully"
@@ -650,6 +913,7 @@ def save_changes():
 
 @datasetAPI.route("/revert-changes", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def revert_changes():
     """
     """
@@ -676,11 +940,14 @@ def revert_changes():
 
         if Path(dataset_file_copy).is_file():
             Path(dataset_file_copy).unlink()
+            dataset_cache.invalidate(dataset_file_copy)
+            clear_operation_log(dataset_file_copy)
+            delete_column_statistics(dataset_name)
         else:
             err = "No changes detected in the current dataset"
             raise
         
-        copy_metadata_obj = MetaData.objects(dataset_file_name=dataset_name).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
+        copy_metadata_obj = MetaData.objects(dataset_file_name=dataset_name).only("dataset_file_name").first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
         
         copy_metadata_obj.delete()
                 
@@ -701,6 +968,7 @@ def revert_changes():
 # Api to search the for a specific value in the dataset using the pattern matching
 @datasetAPI.route("/search-categorical-value", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def search_categorical_value():
     """
         NEED API TRHOTELLING FOR THIS API : https://www.section.io/engineering-education/implementing-rate-limiting-in-flask/
@@ -740,26 +1008,27 @@ def search_categorical_value():
             err = "Search value is required"
             raise
         
-        # Check if dataset copy exists
+        # Check if dataset copy exists. Only the searched column is read from the dataset
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
+            df, err = load_dataset_copy(dataset_name, user.id, user.email, columns=[column_name])
             if err:
                 raise
         else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
+            df, err = load_dataset(dataset_name, user.id, user.email, columns=[column_name])
             if err:
                 raise
             
         # print(dataset_name, column_name, search_value)
         # fetch the categorical columns
-        categorical_columns = df.select_dtypes(include=['object', 'bool']).columns.tolist()
+        categorical_columns = df.select_dtypes(include=CATEGORICAL_DTYPES).columns.tolist()
         if column_name not in categorical_columns:
             err = "Column is not a categorical column"
             raise
 
         # check if the value is present in the column and if yes then return the values
         values = []
-        values = df[df[column_name].apply(str.lower).str.contains(f'^{search_value.lower()}.*')][column_name].unique().tolist()
+        column_values = dates_to_strings(df[column_name])
+        values = column_values[column_values.apply(str.lower).str.contains(f'^{search_value.lower()}.*')].unique().tolist()
 
         res = {
             "search_result":values
@@ -779,6 +1048,7 @@ def search_categorical_value():
 # Api to fetch the metadata of the dataset using the copy flag
 @datasetAPI.route("/get-metadata", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def get_metadata():
     """
         TAKES the dataset name and copy flag returns the metadata of the dataset
@@ -810,8 +1080,11 @@ def get_metadata():
         else:
             dataset_name = get_dataset_name(user.id, dataset_name)
         
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-        metadata = metadata_obj.to_mongo().to_dict()
+        metadata_obj = get_metadata_record(dataset_name)
+        if not metadata_obj:
+            err = f"Metadata for '{dataset_name}' does not exists"
+            raise
+        metadata = metadata_obj.to_dict()
 
         res = {
             "metadata":metadata
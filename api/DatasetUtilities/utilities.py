@@ -1 +1,488 @@
-"""Common Methods, Constants, and Utilities for Dataset API"""
\ No newline at end of file
+"""Common Methods, Constants, and Utilities for Dataset API"""
+
+# Import
+import os
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from flask import current_app as app, send_file
+from pandas.api.types import infer_dtype, is_bool_dtype, is_categorical_dtype
+from models.dataset_metadata_model import MetaData
+from utilities.methods import (
+    get_dataset_name,
+    get_parquet_dataset_file_name,
+    get_user_directory,
+    get_temporary_file_name,
+    is_categorical_dtype_name
+)
+from utilities.metadata_reads import get_metadata_record
+from utilities.column_statistics import (
+    save_computed_column_statistics,
+    compute_column_statistics,
+    merge_column_statistics,
+    get_distinct_sketch,
+    merge_distinct_sketches,
+    get_distinct_estimate
+)
+from utilities.constants import ALLOWED_DB_PER_USER, CATEGORICAL_MAX_UNIQUE_RATIO
+from utilities.dataset_filters import get_full_read_dtypes, iter_matching_tables
+from utilities.parquet_compression import get_parquet_write_options
+from utilities.type_optimization import (
+    profile_column_types,
+    merge_type_profiles,
+    get_optimized_dtypes,
+    apply_optimized_dtypes,
+    merge_dtypes
+)
+
+# =========METHODS================
+
+def _is_bool_chunk(series):
+    # bool columns with nulls are parsed as object columns of True/False, and the chunks with only nulls as float
+    values = series.dropna()
+    return is_bool_dtype(series.dtype) or values.empty or infer_dtype(values, skipna=True) == "boolean"
+
+
+def get_arrow_csv_options(csv_file):
+    """
+        TAKES the csv file
+        PERFORMS the inference of the column types by arrow over the first block of the file (DATASET_INGEST_BLOCK_SIZE bytes),
+                 keeping the types pandas would give and reading the others as strings
+        RETURNS the read and convert options of the arrow csv reader, or None if the file has to be read by pandas
+    """
+    read_options = pa_csv.ReadOptions(block_size=app.config["DATASET_INGEST_BLOCK_SIZE"], use_threads=True)
+    convert_options = pa_csv.ConvertOptions(null_values=CSV_NULL_VALUES, strings_can_be_null=True)
+    with open(csv_file, "rb") as csv:
+        reader = pa_csv.open_csv(csv, read_options=read_options, convert_options=convert_options)
+        schema = reader.schema
+        try:
+            reader.read_next_batch()
+        except StopIteration:
+            return None # no rows, pandas reads the columns as object where arrow has no type for them
+
+    # pandas renames the duplicate and the unnamed columns
+    if len(set(schema.names)) != len(schema.names) or "" in schema.names:
+        return None
+
+    column_types = {}
+    for field in schema:
+        if field.type in ARROW_CSV_TYPES:
+            column_types[field.name] = field.type
+        elif pa.types.is_null(field.type):
+            column_types[field.name] = pa.float64() # no values in the first block, pandas reads the empty columns as float
+        else:
+            column_types[field.name] = pa.string() # dates and times, which pandas leaves as text
+    convert_options.column_types = column_types
+    return read_options, convert_options
+
+
+def read_csv_chunks(csv, arrow_options=None, dtypes=None):
+    """
+        TAKES the opened csv file, the options given by get_arrow_csv_options (None to read with pandas)
+              and the dtypes the columns are read as
+        RETURNS the iterator of the DataFrames of the consecutive chunks of the csv, indexed by the row number.
+                Arrow parses the blocks of the file on all the cores, pandas parses DATASET_INGEST_CHUNK_SIZE rows at a time on one.
+    """
+    if arrow_options is None:
+        yield from pd.read_csv(csv, chunksize=app.config["DATASET_INGEST_CHUNK_SIZE"], dtype=dtypes)
+        return
+
+    read_options, convert_options = arrow_options
+    n_rows = 0
+    # A value which does not fit the type of its column raises ArrowInvalid
+    for batch in pa_csv.open_csv(csv, read_options=read_options, convert_options=convert_options):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(n_rows, n_rows + chunk.shape[0])
+        n_rows += chunk.shape[0]
+        for column, dtype in (dtypes or {}).items():
+            # The text columns are already strings and the integer columns are float in the chunks with nulls
+            if dtype is not str and str(chunk[column].dtype) != dtype:
+                chunk[column] = chunk[column].astype(dtype)
+        yield chunk
+
+
+def profile_csv_file(csv_file, arrow_options=None, optimize_types=False, categorical_storage=False, progress=None):
+    """
+        TAKES the csv file, the options of the arrow csv reader (None to read with pandas) and the function the progress is reported to
+        PERFORMS the first pass over the csv, which only keeps the summaries of the chunks in memory
+        RETURNS the number of rows and chunks, the dtype of each column over the whole file, the type profiles of the columns
+                (if optimize_types), their distinct sketches (if categorical_storage) and the object columns holding booleans
+    """
+    n_rows = 0
+    n_chunks = 0
+    dtypes = None
+    profiles = None
+    sketches = {}
+    bool_columns = None
+    valued_columns = set()
+    with open(csv_file, "rb") as csv:
+        for chunk in read_csv_chunks(csv, arrow_options):
+            n_rows += chunk.shape[0]
+            n_chunks += 1
+            chunk_dtypes = chunk.dtypes.astype(str).to_dict()
+            chunk_bool_columns = {column for column in chunk.columns if _is_bool_chunk(chunk[column])}
+            valued_columns |= {column for column in chunk.columns if chunk[column].notna().any()}
+            if dtypes is None:
+                dtypes = chunk_dtypes
+                bool_columns = chunk_bool_columns
+            else:
+                dtypes = {column: merge_dtypes(dtype, chunk_dtypes[column]) for column, dtype in dtypes.items()}
+                bool_columns &= chunk_bool_columns
+
+            if optimize_types:
+                chunk_profiles = profile_column_types(chunk)
+                profiles = chunk_profiles if profiles is None else merge_type_profiles(profiles, chunk_profiles)
+
+            if categorical_storage:
+                for column in chunk.columns:
+                    sketch = get_distinct_sketch(chunk[column].dropna().astype(str))
+                    sketches[column] = merge_distinct_sketches(sketches.get(column, []), sketch)
+
+            if progress:
+                progress(stage="profiling", bytes_parsed=csv.tell(), rows_written=0)
+
+    return n_rows, n_chunks, dtypes, profiles, sketches, bool_columns & valued_columns
+
+
+def _get_writer_schema(chunk, string_columns, bool_columns, categorical_columns):
+    # The types of the object and category columns can not be inferred from a single chunk,
+    # a column could be all nulls in it and its categories change from chunk to chunk
+    schema = pa.Schema.from_pandas(chunk, preserve_index=True)
+    for columns, arrow_type in (
+        (string_columns, pa.string()),
+        (bool_columns, pa.bool_()),
+        (categorical_columns, pa.dictionary(pa.int32(), pa.string())),
+    ):
+        for column in columns:
+            schema = schema.set(schema.get_field_index(column), pa.field(column, arrow_type))
+    return schema
+
+
+def ingest_csv_file(csv_file, parquet_file, compression, optimize_types=False, categorical_storage=False, progress=None):
+    """
+        TAKES the csv file of the uploaded dataset, the parquet file to write it to, the options of the upload
+              and the function the progress (stage, bytes_parsed, rows_written) is reported to
+        PERFORMS the conversion of the csv to parquet in chunks, so the memory used depends on the chunk size
+                 and not on the size of the file. The csv is read twice, first for the dtypes of the columns over
+                 the whole file, then for the conversion with those dtypes. It is parsed by the DATASET_INGEST_ENGINE
+                 (arrow or pandas), arrow falls back to pandas for a file whose values do not fit the types of its first block.
+        RETURNS the dtype of each column as written, the number of rows and the statistics of the columns
+    """
+    if app.config["DATASET_INGEST_ENGINE"] == "arrow":
+        try:
+            arrow_options = get_arrow_csv_options(csv_file)
+            return _convert_csv_file(csv_file, parquet_file, compression, arrow_options, optimize_types, categorical_storage, progress)
+        except pa.ArrowInvalid as e:
+            app.logger.info("Reading the csv with pandas, arrow could not read it. Exception=> %s", str(e))
+    return _convert_csv_file(csv_file, parquet_file, compression, None, optimize_types, categorical_storage, progress)
+
+
+def _convert_csv_file(csv_file, parquet_file, compression, arrow_options, optimize_types, categorical_storage, progress):
+    n_rows, n_chunks, dtypes, profiles, sketches, bool_like_columns = profile_csv_file(
+        csv_file, arrow_options, optimize_types=optimize_types, categorical_storage=categorical_storage, progress=progress
+    )
+
+    # Object columns are read as strings, so a column with numbers in some chunks and text in others is all text.
+    # Object columns of True/False (bool columns with nulls) are left to pandas.
+    bool_columns = [column for column, dtype in dtypes.items() if dtype == "object" and column in bool_like_columns]
+    read_dtypes = {column: (str if dtype == "object" else dtype) for column, dtype in dtypes.items() if column not in bool_columns}
+    optimized_dtypes = get_optimized_dtypes(profiles) if optimize_types else {}
+
+    string_columns = [
+        column for column, dtype in dtypes.items()
+        if dtype == "object" and column not in bool_columns and column not in optimized_dtypes
+    ]
+    categorical_columns = []
+    if categorical_storage:
+        # String columns with at most CATEGORICAL_MAX_UNIQUE_RATIO distinct values per row, estimated from the sketches
+        categorical_columns = [
+            column for column in string_columns
+            if get_distinct_estimate(sketches[column]) <= CATEGORICAL_MAX_UNIQUE_RATIO * n_rows
+        ]
+        string_columns = [column for column in string_columns if column not in categorical_columns]
+
+    writer = None
+    schema = None
+    column_datatypes = dtypes
+    column_statistics = None
+    rows_written = 0
+    try:
+        with open(csv_file, "rb") as csv:
+            for chunk in read_csv_chunks(csv, arrow_options, dtypes=read_dtypes):
+                for column in bool_columns:
+                    chunk[column] = chunk[column].astype(object)
+                chunk = apply_optimized_dtypes(chunk, optimized_dtypes)
+                for column in categorical_columns:
+                    chunk[column] = chunk[column].astype("category")
+
+                if writer is None:
+                    column_datatypes = chunk.dtypes.astype(str).to_dict()
+                    schema = _get_writer_schema(chunk, string_columns, bool_columns, categorical_columns)
+                    writer = pq.ParquetWriter(parquet_file, schema, **get_parquet_write_options(compression))
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=True)
+                writer.write_table(table, row_group_size=app.config["DATASET_ROW_GROUP_SIZE"])
+                rows_written += chunk.shape[0]
+
+                # Quantiles can not be combined, so they are only kept when the whole file was a single chunk
+                chunk_statistics = compute_column_statistics(chunk, quantiles=n_chunks == 1)
+                column_statistics = chunk_statistics if column_statistics is None else \
+                    merge_column_statistics(column_statistics, chunk_statistics)
+
+                if progress:
+                    progress(stage="converting", bytes_parsed=csv.tell(), rows_written=rows_written)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return column_datatypes, n_rows, column_statistics
+
+
+def save_uploaded_dataset(user, csv_file, filename, dataset_size, compression, copy_compression, optimize_types=False, progress=None):
+    """
+        TAKES the user, the csv file the upload was saved to, the name of the uploaded file, its size in MB,
+              the options of the upload and the function the progress is reported to
+        PERFORMS the conversion of the csv to the parquet file of the dataset and the saving of its metadata and statistics.
+                 The csv file is removed afterwards. The caller holds the exclusive lock of the dataset.
+        RETURNS the error if any
+    """
+    temporary_file = None
+    try:
+        dataset_name = get_dataset_name(user.id, filename)
+
+        # Check if you have the directory for the user
+        directory = get_user_directory(user.email)
+        Path(directory).mkdir(parents=True, exist_ok=True) # creates the directory if not present
+
+        # Checked again, another upload of the same dataset could have finished while this one was queued
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user.email)
+        if Path(dataset_file).is_file():
+            return "This dataset already exists"
+
+        # Optional pass converting the columns to the smallest dtypes which hold their values exactly, and
+        # low cardinality string columns stored dictionary encoded and loaded back as category
+        temporary_file = get_temporary_file_name(dataset_file)
+        column_datatypes, n_rows, column_statistics = ingest_csv_file(
+            csv_file,
+            temporary_file,
+            compression,
+            optimize_types=optimize_types,
+            categorical_storage=app.config["CATEGORICAL_STORAGE"],
+            progress=progress
+        )
+
+        # ======== Dataset MetaData ==========
+        dataset_file_name = dataset_name  # Name of parquet file saved in the directory 
+        _dataset_name, dataset_extension = filename.split(".") # Name of the dataset file and extension (Original)
+        n_columns = len(column_datatypes) # Number of columns in the dataset
+        n_values = n_rows * n_columns # Number of values in the dataset
+        column_list = list(column_datatypes.keys()) # List of columns in the dataset
+        numerical_column_list = [column for column, dtype in column_datatypes.items() if not is_categorical_dtype_name(dtype)] # List of numerical columns
+        categorical_column_list = [column for column, dtype in column_datatypes.items() if is_categorical_dtype_name(dtype)] # List of categorical columns
+        deleted_column_list =  [] # List of deleted columns
+
+        # Create the metadata object
+        metadata_obj = MetaData(
+            user_id = user.id,
+            user_email = user.email,
+            is_copy = False,
+            is_copy_modified = False,
+            date_created = datetime.now(),
+            last_modified = datetime.now(),
+            dataset_name = _dataset_name,
+            dataset_extension = dataset_extension,
+            dataset_file_name = dataset_file_name,
+            dataset_size = dataset_size,
+            n_rows = n_rows,
+            n_columns = n_columns,
+            n_values = n_values,
+            column_list = column_list,
+            column_datatypes = column_datatypes,
+            numerical_column_list = numerical_column_list,
+            categorical_column_list = categorical_column_list,
+            deleted_column_list =  deleted_column_list,
+            compression = compression,
+            copy_compression = copy_compression
+        )
+
+        # If Metadata already exists for the dataset then delete it and create a new one
+        existing_metadata = MetaData.objects(dataset_file_name=dataset_file_name).first()
+        if existing_metadata:
+            existing_metadata.delete()
+
+        # Save the metadata object
+        metadata_obj.save()
+        app.logger.info("Dataset '%s' metadata saved successfully", filename)
+
+        # Moving the parquet file in place
+        os.replace(temporary_file, dataset_file)
+        save_computed_column_statistics(dataset_file_name, dataset_file, n_rows, column_statistics)
+        return None
+
+    finally:
+        for file in (csv_file, temporary_file):
+            if file and os.path.exists(file):
+                os.remove(file)
+
+
+class _StreamBuffer:
+    """
+        File object the arrow writers write the response to, the bytes written are drained after each batch.
+        The position keeps counting the drained bytes, the arrow ipc writer uses it for the offsets in the footer.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def send_stored_dataset(dataset_file, dataset_file_name, download_name):
+    """
+        TAKES the parquet file of the saved dataset, its dataset file name (iris_1) and the name of the download
+        RETURNS the response sending the stored file as it is. Its ETag is tied to the last modification of the
+                dataset, so If-None-Match is answered with 304 while the dataset is unchanged, and Range (with
+                If-Range) requests get the requested part of the file, so an interrupted download can resume.
+    """
+    etag = True # werkzeug's own from the file, if the dataset has no modification time
+    metadata = get_metadata_record(dataset_file_name, fields=["last_modified"])
+    if metadata and metadata.last_modified:
+        etag = f"{dataset_file_name}-{int(metadata.last_modified.timestamp() * 1000)}"
+    return send_file(
+        dataset_file,
+        mimetype=EXPORT_FORMATS["parquet"][0],
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=etag
+    )
+
+
+def get_export_columns(parquet_file):
+    """RETURNS the columns of the dataset, without the index column of the stored file"""
+    return parquet_file.schema_arrow.empty_table().to_pandas().columns.tolist()
+
+
+def _get_export_schema(parquet_file, columns):
+    # The pandas metadata of the stored file describes its index and all its columns, the export has neither
+    return pa.schema([parquet_file.schema_arrow.field(column) for column in columns])
+
+
+def iter_dataset_csv(parquet_file, batch_size, columns=None, filters=None, compression=None):
+    """
+        TAKES the opened parquet file of the dataset, the number of rows converted at a time, the columns and the
+              filters of the rows to export (all of them by default) and the codec (gzip or zstd) of the csv, if any
+        RETURNS the generator of the csv text of the dataset, one batch of rows at a time, which is the same text
+                as the csv of the whole DataFrame. The file is closed once the generator is exhausted or closed.
+    """
+    buffer = _StreamBuffer()
+    stream = pa.CompressedOutputStream(pa.PythonFile(buffer, mode="w"), compression) if compression else None
+    try:
+        columns = columns or get_export_columns(parquet_file)
+        # A batch without nulls would write the integers of a column which has nulls elsewhere without the decimal point
+        dtypes = get_full_read_dtypes(parquet_file, columns)
+        header = True
+        for table in iter_matching_tables(parquet_file, filters or [], columns, batch_size):
+            df = table.to_pandas()
+            mismatched = {column: dtype for column, dtype in dtypes.items() if df[column].dtype != dtype and not is_categorical_dtype(dtype)}
+            if mismatched:
+                df = df.astype(mismatched)
+            text = df.to_csv(index=False, header=header)
+            header = False
+            if stream is None:
+                yield text
+            else:
+                stream.write(text.encode())
+                yield buffer.drain()
+
+        if header:
+            text = pd.DataFrame(columns=columns).to_csv(index=False) # only the header when there are no rows
+            if stream is None:
+                yield text
+            else:
+                stream.write(text.encode())
+        if stream is not None:
+            stream.close()
+            yield buffer.drain()
+    finally:
+        parquet_file.close()
+
+
+def iter_dataset_ipc(parquet_file, batch_size, columns=None, filters=None):
+    """
+        TAKES the opened parquet file of the dataset, the number of rows converted at a time and the columns and
+              the filters of the rows to export (all of them by default)
+        RETURNS the generator of the Arrow IPC file (Feather v2) of the dataset, one record batch at a time.
+                The batches are decoded from the parquet file into Arrow, they are never converted to pandas.
+    """
+    buffer = _StreamBuffer()
+    try:
+        columns = columns or get_export_columns(parquet_file)
+        schema = _get_export_schema(parquet_file, columns)
+        with pa.ipc.new_file(pa.PythonFile(buffer, mode="w"), schema) as writer:
+            for table in iter_matching_tables(parquet_file, filters or [], columns, batch_size):
+                writer.write_table(table.replace_schema_metadata(None))
+                yield buffer.drain()
+        yield buffer.drain()
+    finally:
+        parquet_file.close()
+
+
+def iter_dataset_parquet(parquet_file, batch_size, compression, columns=None, filters=None):
+    """
+        TAKES the opened parquet file of the dataset, the number of rows read at a time, the codec[:level] the
+              export is written with and the columns and the filters of the rows to export
+        RETURNS the generator of the parquet file of the selected part of the dataset, one batch of rows at a time.
+                The whole dataset does not need this, the stored file is sent as it is.
+    """
+    buffer = _StreamBuffer()
+    try:
+        columns = columns or get_export_columns(parquet_file)
+        schema = _get_export_schema(parquet_file, columns)
+        with pq.ParquetWriter(pa.PythonFile(buffer, mode="w"), schema, **get_parquet_write_options(compression)) as writer:
+            for table in iter_matching_tables(parquet_file, filters or [], columns, batch_size):
+                writer.write_table(table.replace_schema_metadata(None))
+                yield buffer.drain()
+        yield buffer.drain()
+    finally:
+        parquet_file.close()
+
+
+# =========CONSTANTS================
+DATASETS_PER_PAGE = ALLOWED_DB_PER_USER # all of the datasets of a user on the first page by default
+DATASET_SORT_FIELDS = {"modified": "last_modified", "name": "dataset_name", "size": "dataset_size"}
+# format => (mimetype, codec of the csv), the file extension is the format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", None),
+    "csv.gz": ("application/gzip", "gzip"),
+    "csv.zst": ("application/zstd", "zstd"),
+    "parquet": ("application/vnd.apache.parquet", None),
+    "feather": ("application/vnd.apache.arrow.file", None),
+}
+ARROW_CSV_TYPES = [pa.int64(), pa.float64(), pa.bool_(), pa.string()] # types arrow infers the same way as pandas
+# Default na_values of pandas.read_csv, so both engines read the same values as null
+CSV_NULL_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]
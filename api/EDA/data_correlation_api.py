@@ -15,13 +15,17 @@ import seaborn as sns
 from flask_restful import Api
 from models.user_model import Users
 from utilities.respond import respond
-from utilities.methods import check_dataset_copy_exists, load_dataset, load_dataset_copy, log_error
+from utilities.locks import lock_dataset
+from utilities.methods import check_dataset_copy_exists, get_dataset_name, load_dataset, load_dataset_copy, log_error
+from utilities.metadata_reads import get_metadata_record
+from utilities.constants import CATEGORICAL_DTYPES
 
 dataCorrelationAPI = Blueprint("dataCorrelationAPI", __name__)
 dataCorrelationAPI_restful = Api(dataCorrelationAPI)
 
 @dataCorrelationAPI.route("/numerical-columns", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def numerical_columns():
     """
         TAKES dataset name as input
@@ -57,7 +61,7 @@ def numerical_columns():
                 raise
 
         # numerical columns
-        numerical_columns = df.select_dtypes(exclude=['bool', 'object']).columns.tolist()
+        numerical_columns = df.select_dtypes(exclude=CATEGORICAL_DTYPES).columns.tolist()
         
         res = {
             "n_numerical_columns": len(numerical_columns),
@@ -76,6 +80,7 @@ def numerical_columns():
     
 @dataCorrelationAPI.route("/correlation-matrix", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def correlation_matrix():
     """
         TAKES dataset name and column list as input
@@ -105,15 +110,24 @@ def correlation_matrix():
         #     raise
 
         
-        # check if copy of the dataset exists
+        dataset_file_name = get_dataset_name(user.id, dataset_name) # dataset_name = iris_1
+
+        # check if copy of the dataset exists. Only the included columns are read from the dataset
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
-            if err:
+            df, err = load_dataset_copy(dataset_name, user.id, user.email, columns=included_column_list)
+            metadata = get_metadata_record(dataset_file_name+"_copy", fields=["numerical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name}_copy not found"
                 raise
         else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
-            if err:
+            df, err = load_dataset(dataset_name, user.id, user.email, columns=included_column_list)
+            metadata = get_metadata_record(dataset_file_name, fields=["numerical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name} not found"
                 raise
+
+        if err:
+            raise
         
         # Correlation Matrix && Column List
         column_list = []
@@ -136,7 +150,7 @@ def correlation_matrix():
             
         
         # Not Included Numerical Columns List
-        numerical_columns = df.select_dtypes(exclude=['bool', 'object']).columns.tolist()
+        numerical_columns = metadata.numerical_column_list
         non_included_numerical_columns = list(set(numerical_columns) - set(included_column_list))
         
         for column in non_included_numerical_columns:
@@ -168,6 +182,7 @@ def correlation_matrix():
 # Create Scatter plot
 @dataCorrelationAPI.route("/scatter-plot", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def scatter_plot():
     """
         TAKES dataset name, column1 and column2 as input
@@ -202,13 +217,13 @@ def scatter_plot():
             raise
 
         
-        # check if copy of the dataset exists
+        # check if copy of the dataset exists. Only the plotted columns are read from the dataset
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
+            df, err = load_dataset_copy(dataset_name, user.id, user.email, columns=[coulmn1, coulmn2])
             if err:
                 raise
         else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
+            df, err = load_dataset(dataset_name, user.id, user.email, columns=[coulmn1, coulmn2])
             if err:
                 raise
         
@@ -234,6 +249,7 @@ def scatter_plot():
         
 @dataCorrelationAPI.route("/correlation-heatmap", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def correlation_heatmap():
     """
         TAKES dataset name and column list as input
@@ -263,13 +279,13 @@ def correlation_heatmap():
             raise
 
         
-        # check if copy of the dataset exists
+        # check if copy of the dataset exists. Only the included columns are read from the dataset
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
+            df, err = load_dataset_copy(dataset_name, user.id, user.email, columns=included_column_list)
             if err:
                 raise
         else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
+            df, err = load_dataset(dataset_name, user.id, user.email, columns=included_column_list)
             if err:
                 raise
         
@@ -12,15 +12,32 @@ import json
 from flask_restful import Api
 from models.user_model import Users
 from utilities.respond import respond
-from utilities.methods import get_dataset_name, load_dataset_copy, load_dataset, log_error, check_dataset_copy_exists
+from utilities.locks import lock_dataset
+from utilities.methods import (
+    get_dataset_name,
+    load_dataset_table,
+    load_dataset_copy_table,
+    load_dataset_table_head,
+    get_table_schema_frame,
+    table_to_dataframe,
+    load_dataset_column_statistics,
+    log_error,
+    check_dataset_copy_exists,
+    is_categorical_dtype_name,
+    dates_to_strings
+)
+from utilities.metadata_reads import get_metadata_record
+from utilities.constants import CATEGORICAL_DTYPES
+from utilities.column_statistics import get_describe_statistics
+import pandas as pd
 
-from models.dataset_metadata_model import MetaData
 
 datasetOverviewAPI = Blueprint("datasetOverviewAPI", __name__)
 datasetOverviewAPI_restful = Api(datasetOverviewAPI)
 
 @datasetOverviewAPI.route("/basic-information", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def basic_information():
     """
         TAKES dataset name as input
@@ -44,23 +61,19 @@ def basic_information():
             err = "Dataset name is required"
             raise
 
-        # check if copy of the dataset exists
-        if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
-            if err:
-                raise
-        else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
-            if err:
-                raise
+        # Only the first row groups are read for the head, the number of rows is in the parquet footer
+        is_copy = check_dataset_copy_exists(dataset_name, user.id, user.email)
+        table, n_rows, err = load_dataset_table_head(dataset_name, user.id, user.email, 5, is_copy=is_copy)
+        if err:
+            raise
+
+        schema_df = get_table_schema_frame(table)
 
         # n_columns, n_rows
-        shape = df.shape
-        n_rows = shape[0]
-        n_columns = shape[1]
+        n_columns = schema_df.shape[1]
         
         # columns with data types
-        temp_col_dtypes = df.dtypes.to_dict()
+        temp_col_dtypes = schema_df.dtypes.to_dict()
 
         col_with_dtypes = []
 
@@ -72,7 +85,7 @@ def basic_information():
             col_with_dtypes.append(temp)
 
         # head
-        head = df.head().to_json(orient='split')
+        head = table_to_dataframe(table).to_json(orient='split', date_format='iso')
         head = json.loads(head)
         
         res = {
@@ -94,6 +107,7 @@ def basic_information():
 
 @datasetOverviewAPI.route("/describe-numerical-data", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def describe_numerical_data():
     """
         TAKES dataset name, get_all_columns (BOOLEAN) and Column Name as input
@@ -130,40 +144,66 @@ def describe_numerical_data():
         dataset_file_name = get_dataset_name(user.id, dataset_name) # dataset_name = iris_1
         
         # ======= Get Metada =======
-        # Look if the copy of dataset exists and if it does, load dataset copy otherwise load the original dataset
-        if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df,err = load_dataset_copy(dataset_name, user.id, user.email)
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name+"_copy").first_or_404(message=f"Dataset Metadata for {dataset_file_name}_copy not found")
-            
+        # Look if the copy of dataset exists and if it does, use dataset copy otherwise use the original dataset
+        is_copy = check_dataset_copy_exists(dataset_name, user.id, user.email)
+        if is_copy:
+            metadata = get_metadata_record(dataset_file_name+"_copy", fields=["column_list", "numerical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name}_copy not found"
+                raise
         else:
-            df,err = load_dataset(dataset_name, user.id, user.email)
-            metadata = MetaData.objects(dataset_file_name=dataset_file_name).first_or_404(message=f"Dataset Metadata for {dataset_file_name} not found")
-        
-        if err: 
-            raise
+            metadata = get_metadata_record(dataset_file_name, fields=["column_list", "numerical_column_list"])
+            if not metadata:
+                err = f"Dataset Metadata for {dataset_file_name} not found"
+                raise
         
         if get_all_columns == False and (column_name not in metadata.numerical_column_list or column_name not in metadata.column_list):
             err = "Column not Found"
             raise
-            
+
         if get_all_columns == False:
-            df_numerical = df[[column_name]]
             numerical_columns = [column_name]
         else:
-            df_numerical = df[metadata.numerical_column_list]
             numerical_columns = metadata.numerical_column_list
+
+        # The description is answered from the column statistics saved with the dataset when all the columns have them
+        statistics, _n_rows = load_dataset_column_statistics(dataset_name, user.id, user.email, is_copy=is_copy)
+        described = None
+        if statistics is not None:
+            described = {}
+            for col in numerical_columns:
+                describe_statistics = get_describe_statistics(statistics[col]) if col in statistics else None
+                if describe_statistics is None:
+                    described = None
+                    break
+                described[col] = describe_statistics
+
+        if described is not None:
+            data_types = {col: statistics[col]["data_type"] for col in numerical_columns}
+            df_numerical_described = pd.DataFrame(described, columns=numerical_columns)
+        else:
+            # Only the numerical columns are read from the dataset
+            if is_copy:
+                table,err = load_dataset_copy_table(dataset_name, user.id, user.email, columns=numerical_columns)
+            else:
+                table,err = load_dataset_table(dataset_name, user.id, user.email, columns=numerical_columns)
             
-        df_numerical_described = {}
+            if err: 
+                raise
+
+            df_numerical = table_to_dataframe(table)
+            data_types = {col: str(df_numerical[col].dtype) for col in numerical_columns}
+            df_numerical_described = df_numerical.describe() if len(numerical_columns) > 0 else None
         
         if len(numerical_columns) > 0:
-            df_numerical_described = df_numerical.describe().to_json(orient='columns')
+            df_numerical_described = df_numerical_described.to_json(orient='columns')
             df_numerical_described = json.loads(df_numerical_described) 
 
         col_sorted_desciption = []
         for col in numerical_columns:
             temp = df_numerical_described[col]
             temp["name"] = col
-            temp["data_type"] = str(df_numerical[col].dtype)
+            temp["data_type"] = data_types[col]
             col_sorted_desciption.append(temp)
             
         res = {}
@@ -171,8 +211,8 @@ def describe_numerical_data():
         if get_all_columns:
             res = {
                 "columns":col_sorted_desciption,
-                "n_numerical_columns": df_numerical.shape[1],
-                "n_categorical_columns" : df.shape[1] - df_numerical.shape[1]
+                "n_numerical_columns": len(numerical_columns),
+                "n_categorical_columns" : len(metadata.column_list) - len(numerical_columns)
             }
         else:
             res = col_sorted_desciption[0]
@@ -189,6 +229,7 @@ def describe_numerical_data():
 
 @datasetOverviewAPI.route("/describe-categorical-data", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def describe_categorical_data():
     """
         TAKES dataset name as input
@@ -215,15 +256,22 @@ def describe_categorical_data():
         
         # check if copy of the dataset exists
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
+            table, err = load_dataset_copy_table(dataset_name, user.id, user.email)
             if err:
                 raise
         else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
+            table, err = load_dataset_table(dataset_name, user.id, user.email)
             if err:
                 raise
 
-        df_categorical = df.select_dtypes(include=['bool', 'object']) # https://note.nkmk.me/en/python-pandas-dtype-astype/#:~:text=Sponsored%20Link-,List%20of%20basic%20data%20types%20(dtype)%20in%20pandas,-The%20following%20is
+        # Only the categorical columns of the table are converted to pandas
+        schema_df = get_table_schema_frame(table)
+        categorical_columns = schema_df.select_dtypes(include=CATEGORICAL_DTYPES).columns.tolist() # https://note.nkmk.me/en/python-pandas-dtype-astype/#:~:text=Sponsored%20Link-,List%20of%20basic%20data%20types%20(dtype)%20in%20pandas,-The%20following%20is
+        df_categorical = table_to_dataframe(table.select(categorical_columns))
+        categorical_dtypes = df_categorical.dtypes.astype(str).to_dict()
+        # Date columns are described by their text, like the string columns
+        for col in df_categorical.columns:
+            df_categorical[col] = dates_to_strings(df_categorical[col])
 
         df_categorical_described = {}
         categorical_column = []
@@ -238,7 +286,7 @@ def describe_categorical_data():
             temp["mode"] = temp["top"]
             temp["mode_count"] = temp["freq"]
             temp["unique_count"] = temp["unique"]
-            temp["data_type"] = str(df_categorical[col].dtype)
+            temp["data_type"] = categorical_dtypes[col]
 
             del temp['top']
             del temp['unique']
@@ -249,7 +297,7 @@ def describe_categorical_data():
         res = {
             "columns":col_sorted_desciption,
             "n_categorical_columns": df_categorical.shape[1],
-            "n_numerical_columns": df.shape[1] - df_categorical.shape[1]
+            "n_numerical_columns": schema_df.shape[1] - df_categorical.shape[1]
         }
 
         return respond(data=res)
@@ -263,6 +311,7 @@ def describe_categorical_data():
 
 @datasetOverviewAPI.route("/graphical-representation", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def graphical_representation():
     """
         TAKES dataset name as input
@@ -287,20 +336,32 @@ def graphical_representation():
             raise
 
         
-        # check if copy of the dataset exists
-        if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
-            if err:
-                raise
+        # The column statistics saved with the dataset have the dtypes and null counts,
+        # the Arrow table (schema and null counts only, no data is converted) is only used when they are missing
+        is_copy = check_dataset_copy_exists(dataset_name, user.id, user.email)
+        statistics, n_rows = load_dataset_column_statistics(dataset_name, user.id, user.email, is_copy=is_copy)
+        if statistics is not None:
+            column_dtypes = {column: column_statistics["data_type"] for column, column_statistics in statistics.items()}
+            null_counts = {column: column_statistics["null_count"] for column, column_statistics in statistics.items()}
         else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
-            if err:
-                raise
+            if is_copy:
+                table, err = load_dataset_copy_table(dataset_name, user.id, user.email)
+                if err:
+                    raise
+            else:
+                table, err = load_dataset_table(dataset_name, user.id, user.email)
+                if err:
+                    raise
+
+            schema_df = get_table_schema_frame(table)
+            column_dtypes = schema_df.dtypes.astype(str).to_dict()
+            null_counts = {column: table.column(column).null_count for column in schema_df.columns}
+            n_rows = table.num_rows
         
         # Columns
-        n_columns = len(df.columns)
-        n_numerical_columns = len(df.select_dtypes(exclude=['bool', 'object']).columns)
-        n_categorical_columns = len(df.select_dtypes(include=['bool', 'object']).columns)
+        n_columns = len(column_dtypes)
+        n_categorical_columns = len([dtype for dtype in column_dtypes.values() if is_categorical_dtype_name(dtype)])
+        n_numerical_columns = n_columns - n_categorical_columns
         percent_numerical_columns = round(n_numerical_columns/n_columns*100, 2)
         percent_categorical_columns = round(n_categorical_columns/n_columns*100, 2)
 
@@ -319,11 +380,10 @@ def graphical_representation():
         ]
 
         # Shape
-        shape = df.shape
-        n_values = shape[0]*shape[1]
+        n_values = n_rows*n_columns
 
         # Count of null values in a dataset
-        n_null_values = int(df.isnull().sum().sum())
+        n_null_values = int(sum(null_counts.values()))
         n_non_null_values = n_values - n_null_values
 
         percent_null_values = round(n_null_values/n_values*100, 2)
@@ -1,6 +1,6 @@
 """ Graphs for EDA"""
 
-from api.EDA.utilities_eda import get_image
+from api.EDA.utilities_eda import get_image, get_value_counts
 from flask import (
     Blueprint,
     request,
@@ -14,6 +14,7 @@ import seaborn as sns
 from flask_restful import Api
 from models.user_model import Users
 from utilities.respond import respond
+from utilities.locks import lock_dataset
 from utilities.methods import check_dataset_copy_exists, load_dataset, load_dataset_copy, log_error
 
 graphsAPI = Blueprint("graphsAPI", __name__)
@@ -22,6 +23,7 @@ graphsAPI_restful = Api(graphsAPI)
 # Generate Graph
 @graphsAPI.route("/generate-graph", methods=['POST'])
 @jwt_required()
+@lock_dataset()
 def generate_graph():
     """
         TAKES dataset name, column1, column2 and type of graph as input
@@ -65,13 +67,16 @@ def generate_graph():
             err = "Column2 is required"
             raise
 
+        # Only the plotted columns are read from the dataset
+        columns = [column1] if n_columns == 1 else [column1, column2]
+
         # check if copy of the dataset exists
         if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
+            df, err = load_dataset_copy(dataset_name, user.id, user.email, columns=columns)
             if err:
                 raise
         else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
+            df, err = load_dataset(dataset_name, user.id, user.email, columns=columns)
             if err:
                 raise
         
@@ -82,9 +87,9 @@ def generate_graph():
         # Generating Graph
         if n_columns == 1:
             if graph_type == "bar":
-                df[column1].value_counts().plot(kind=graph_type,xlabel=column1,ylabel="count")
+                get_value_counts(df[column1]).plot(kind=graph_type,xlabel=column1,ylabel="count")
             elif graph_type == "pie":
-                df[column1].value_counts().plot(kind=graph_type, autopct='%.1f%%', startangle=45,  wedgeprops={'linewidth': 6})
+                get_value_counts(df[column1]).plot(kind=graph_type, autopct='%.1f%%', startangle=45,  wedgeprops={'linewidth': 6})
             elif graph_type == "hist" or graph_type == "density":
                 df.plot(kind=graph_type,y=column1,xlabel=column1)
             elif graph_type == "line":
@@ -8,16 +8,27 @@ from api.EDA.utilities_eda import ROW_END
 
 # UTILITIES
 from utilities.respond import respond
-from utilities.methods import check_dataset_copy_exists, get_dataset_name, load_dataset, load_dataset_copy, log_error
+from utilities.locks import lock_dataset
+from utilities.methods import get_dataset_file, categories_to_object, log_error
+from utilities.constants import CATEGORICAL_DTYPES
+from utilities.dataset_filters import (
+    get_dataset_filters,
+    get_matching_row_positions,
+    get_matching_frame_positions,
+    read_dataset_rows,
+    read_frame_rows,
+    get_full_read_dtypes
+)
 
 # MODELS
 from models.user_model import Users
 
 # CONTANTS
-from api.EDA.utilities_eda import ROWS_PER_PAGE, get_row_index
+from api.EDA.utilities_eda import ROWS_PER_PAGE, get_row_positions
 
 # OTHER
 import json
+import pyarrow.parquet as pq
 
 
 # BLUEPRINT
@@ -27,6 +38,7 @@ tabularRepresentationAPI_restful = Api(tabularRepresentationAPI)
 # ROUTES
 @tabularRepresentationAPI.route("/filtered-tabular-representation", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def tabular_representation():
     """
         TAKES dataset name as input
@@ -51,19 +63,16 @@ def tabular_representation():
             err = "Dataset name is required"
             raise
 
-        # check if copy of the dataset exists
-        if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
-            if err:
-                raise
-        else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
-            if err:
-                raise
+        dataset_file, edited_df, err = get_dataset_file(dataset_name, user.id, user.email)
+        if err:
+            raise
 
         # ================== Business Logic Start ==================
 
-        temp_df = df.copy()    
+        # The rows are never all loaded. Searching scans only the searched columns, skipping the row groups
+        # ruled out by their statistics, sorting reads only the sort columns of the matching rows
+        # and only the rows which are sent back are read in full.
+        # A copy with logged edits is read from its edited DataFrame instead, which is already loaded.
 
         # 1. SEARCHING 2. SORTING 3. FILTERING it haas to be in this order only
         
@@ -78,14 +87,13 @@ def tabular_representation():
             #      }
             # },
         search = request.json.get("search", None)
+        filters = []
         if search:
-            # categorical columns
-            for col, values in search['categorical_col'].items():
-                temp_df = temp_df[temp_df[col].isin(values)]
-
-            # numerical columns
-            for col, values in search['numerical_col'].items():
-                temp_df = temp_df[temp_df[col].between(float(values[0]), float(values[1]))]
+            filters = get_dataset_filters(search['categorical_col'], search['numerical_col'])
+        if edited_df is not None:
+            positions = get_matching_frame_positions(edited_df, filters)
+        else:
+            positions = get_matching_row_positions(dataset_file, filters)
                 
         # 2. SORTING
             # "sort": {
@@ -96,7 +104,14 @@ def tabular_representation():
         if sort:
             columns = list(sort.keys())
             order = list(sort.values())
-            temp_df = temp_df.sort_values(by=columns, ascending=order)
+            if edited_df is not None:
+                sort_df = read_frame_rows(edited_df, positions, columns=columns)
+            else:
+                sort_df = read_dataset_rows(dataset_file, positions, columns=columns)
+            sort_df.index = positions
+            # category columns sort by the order of their categories, the values are sorted instead
+            sort_df = categories_to_object(sort_df)
+            positions = sort_df.sort_values(by=columns, ascending=order).index.to_numpy()
 
         # 3. FILTERING
             # "filter":{
@@ -106,32 +121,38 @@ def tabular_representation():
             #     "row_end": 10
             # }
         filter_obj = request.json.get("filter", None)
+        columns = None
         if filter_obj:
             # if no columns are given then consider all columns
-            if not filter_obj["columns"]:
-                filter_obj["columns"] = df.columns.tolist()
+            if filter_obj["columns"]:
+                columns = filter_obj["columns"]
 
             if filter_obj["row_end"] == ROW_END:
-                temp_df = temp_df[filter_obj["columns"]].iloc[int(filter_obj["row_start"]):]
+                positions = positions[int(filter_obj["row_start"]):]
             else:
-                temp_df = temp_df[filter_obj["columns"]].iloc[int(filter_obj["row_start"]):int(filter_obj["row_end"])]
+                positions = positions[int(filter_obj["row_start"]):int(filter_obj["row_end"])]
 
-        
+        # Only the head and tail are sent for more than 50 rows
+        n_rows = len(positions)
+        if n_rows > 50:
+            positions = list(positions[:5]) + list(positions[-5:])
+        if edited_df is not None:
+            temp_df = read_frame_rows(edited_df, positions, columns=columns)
+        else:
+            temp_df = read_dataset_rows(dataset_file, positions, columns=columns)
 
         # Preparing the dataframe for sending as response
-        shape = temp_df.shape
-        n_rows = shape[0]
-        n_columns = shape[1]
+        n_columns = temp_df.shape[1]
         dataframe = None
 
         from flask import current_app as app
         if n_rows > 50:
             head = temp_df.head(5)
-            head = head.to_json(orient='split')
+            head = head.to_json(orient='split', date_format='iso')
             head = json.loads(head)
 
             tail = temp_df.tail(5)
-            tail = tail.to_json(orient='split')
+            tail = tail.to_json(orient='split', date_format='iso')
             tail = json.loads(tail)
 
             # we are sending head + 2 dotted rows + tail
@@ -146,7 +167,7 @@ def tabular_representation():
         else:
             head = None
             tail = None
-            temp_df = temp_df.to_json(orient='split')
+            temp_df = temp_df.to_json(orient='split', date_format='iso')
             temp_df = json.loads(temp_df)
             dataframe = temp_df
 
@@ -170,6 +191,7 @@ def tabular_representation():
 # Api for gloabl data representation
 @tabularRepresentationAPI.route("/global-data-representation", methods=["POST"])
 @jwt_required()
+@lock_dataset()
 def global_data_representation():
     """
         TAKES dataset name and the parameters for global data representation as input
@@ -208,15 +230,9 @@ def global_data_representation():
 
             }
         '''
-        # check if copy of the dataset exists
-        if check_dataset_copy_exists(dataset_name, user.id, user.email):
-            df, err = load_dataset_copy(dataset_name, user.id, user.email)
-            if err:
-                raise
-        else:
-            df, err = load_dataset(dataset_name, user.id, user.email)
-            if err:
-                raise
+        dataset_file, edited_df, err = get_dataset_file(dataset_name, user.id, user.email)
+        if err:
+            raise
         
         # ================== Business Logic Start ==================
 
@@ -224,40 +240,43 @@ def global_data_representation():
         numerical_values = request.json.get("numerical_values", None)
         page = request.json.get("page", 0)
 
-
-        # categorical columns
-        if categorical_values:
-            for col, values in categorical_values.items():
-                df = df[df[col].isin(values)]
-        # numerical columns
-        if numerical_values:
-            for col, values in numerical_values.items():
-                df = df[df[col].between(float(values[0]), float(values[1]))]
+        # The filters are evaluated while scanning the file, reading only the filter columns
+        # and skipping the row groups ruled out by their statistics
+        # A copy with logged edits is read from its edited DataFrame instead, which is already loaded
+        filters = get_dataset_filters(categorical_values, numerical_values)
+        if edited_df is not None:
+            positions = get_matching_frame_positions(edited_df, filters)
+            full_read_dtypes = edited_df.dtypes.to_dict()
+        else:
+            positions = get_matching_row_positions(dataset_file, filters)
+            full_read_dtypes = get_full_read_dtypes(pq.ParquetFile(dataset_file, memory_map=True))
 
         # calculate the total number of pages
-        n_rows = df.shape[0]
-        n_columns = df.shape[1]
+        n_rows = len(positions)
+        n_columns = len(full_read_dtypes)
         n_pages = n_rows//ROWS_PER_PAGE + 1
-        column_list = df.columns.tolist()
+        column_list = list(full_read_dtypes.keys())
 
-        temp_dtypes = df.dtypes.to_dict()
         dtypes = {}
-        for key, value in temp_dtypes.items():
+        for key, value in full_read_dtypes.items():
             dtypes[key]=str(value)
 
-        # get the row indices of the dataframe for the current page
-        row_indices = get_row_index(df, page, ROWS_PER_PAGE)
-        df = df.loc[row_indices]
+        # read only the rows of the current page
+        page_positions = get_row_positions(positions, page, ROWS_PER_PAGE)
+        if edited_df is not None:
+            df = read_frame_rows(edited_df, page_positions)
+        else:
+            df = read_dataset_rows(dataset_file, page_positions)
 
         n_datapoints_this_page = df.shape[0]
 
         # cateogrical columns and numerical columns
         categorical_columns = []
         numerical_columns = []
-        categorical_columns = df.select_dtypes(include=['object', 'bool']).columns.tolist()
-        numerical_columns = df.select_dtypes(exclude=['object', 'bool']).columns.tolist()
+        categorical_columns = df.select_dtypes(include=CATEGORICAL_DTYPES).columns.tolist()
+        numerical_columns = df.select_dtypes(exclude=CATEGORICAL_DTYPES).columns.tolist()
 
-        result = df.to_json(orient='split', index=True, )
+        result = df.to_json(orient='split', index=True, date_format='iso')
         result = json.loads(result)
 
         # Inserting the index column. Doing manually because the index column is not included in the data,
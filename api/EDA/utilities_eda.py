@@ -17,6 +17,15 @@ def get_row_index(df, page, rows_per_page):
     end = start + rows_per_page
     return df.index[start:end]
 
+def get_row_positions(positions, page, rows_per_page):
+    start = page * rows_per_page
+    end = start + rows_per_page
+    return positions[start:end]
+
+def get_value_counts(series):
+    value_counts = series.value_counts()
+    return value_counts[value_counts > 0] # a category column also counts its unused categories
+
 
 # =========CONSTANTS================
 ROW_END = "end"
@@ -7,17 +7,15 @@ from flask import current_app as app
 
 # UTILITIES
 from utilities.respond import respond
+from utilities.locks import lock_dataset
 from utilities.methods import get_dataset_name, load_dataset_copy, log_error, make_dataset_copy, check_dataset_copy_exists, save_dataset_copy, get_row_column_metadata
+from utilities.operation_log import apply_operation
 
 # MODELS
 from models.user_model import Users
 from models.dataset_metadata_model import MetaData
 # constants
 
-# OTHER
-import pandas as pd
-from sklearn.preprocessing import KBinsDiscretizer
-
 # BLUEPRINT
 dataDiscretizationAPI = Blueprint("dataDiscretizationAPI", __name__)
 dataDiscretizationAPI_restful = Api(dataDiscretizationAPI)
@@ -26,6 +24,7 @@ dataDiscretizationAPI_restful = Api(dataDiscretizationAPI)
 # Api to perform data discretization
 @dataDiscretizationAPI.route("/data-discretization", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def data_discretization():
     """
         TAKES dataset_name, column_name, descritization_strategy, number_of_bins, encoding_type, prefix, default_category, range_list as input
@@ -143,32 +142,7 @@ def data_discretization():
         # If Descritization Strategy is "uniform" or "quantile" or "kmeans"
         if strategy in ["uniform", "quantile", "kmeans"]:
             
-            # If user wants onehot encoding. we will use "onehot-dense" encoding
-            if encoding_type == "onehot":
-                encoding_type = "onehot-dense"
-                
-            # Create an instance of KBinsDiscretizer
-            kbins = KBinsDiscretizer(n_bins=n_bins, encode=encoding_type, strategy=strategy)
-            # Fit n Transfomrm the KBinsDiscretizer
-            descretised_data = kbins.fit_transform(df[[column_name]])
-            
-            # Column names of the new discretized columns
-            new_column_names = []
-            if encoding_type == "onehot" or encoding_type == "onehot-dense":
-                for i in range(n_bins):
-                    new_column_names.append(prefix+str(i))
-            else:
-                new_column_names.append(column_name)
-            
-            # Create a new dataframe with the discretized data
-            new_df = pd.DataFrame(descretised_data, columns=new_column_names)
-            new_df = new_df.astype(int)
-            
-            # Drop the original column from the dataframe
-            df = df.drop(column_name, axis=1)
-
-            # Concatenate the original dataframe with the new dataframe
-            df = pd.concat([df, new_df], axis=1)
+            operation = ("kbins_discretization", {"column_name": column_name, "strategy": strategy, "n_bins": n_bins, "encoding_type": encoding_type, "prefix": prefix})
             
         # If Descritization Strategy is "custom"
         elif strategy == "custom":
@@ -181,7 +155,6 @@ def data_discretization():
                     raise
             
             sorted_range_list = sorted(range_list, key=lambda x: x["start"]["value"])
-            min_to_max_range_list = []
         
             min_value = int(df[column_name].min())
             max_value = int(df[column_name].max())
@@ -191,83 +164,9 @@ def data_discretization():
                 err = "Range List should contain range between Column Min and Column Max"
                 raise
             
-            start_value = sorted_range_list[0]["start"]["value"]
-            start_included = sorted_range_list[0]["start"]["included"]
-            
-            index = 0
-            # IF first range does not start from min_value, then add a range from min_value to start_value, else add the first range
-            if not (start_value == min_value and start_included == True):
-                min_to_max_range_list.append({"start": {"value": min_value, "included": True}, "end": {"value": start_value, "included": not start_included}, "category": default_category})
-            else :
-                min_to_max_range_list.append(sorted_range_list[0])
-                index = 1
-                
-            total_range_items = len(sorted_range_list)
-            
-            while index < total_range_items:
-                
-                prev_end_value = min_to_max_range_list[-1]["end"]["value"]
-                prev_end_included = min_to_max_range_list[-1]["end"]["included"]
-                
-                curr_start_value = sorted_range_list[index]["start"]["value"]
-                curr_start_included = sorted_range_list[index]["start"]["included"]
-                
-                # If Prev ending and current starting values are same, 
-                if prev_end_value == curr_start_value:
-                    # if one of them is included and other is not included, then add the current range
-                    if prev_end_included != curr_start_included:
-                        min_to_max_range_list.append(sorted_range_list[index])
-                        index += 1
-                    # if both are not included, then add the an range with curr_start/prev_end value and included as True in both start and end with default category
-                    else:
-                        min_to_max_range_list.append({"start": {"value": curr_start_value, "included": True}, "end": {"value": curr_start_value, "included": True}, "category": default_category})
-                
-                # if prev ending is smaller than current starting, that means there is a gap between them, so add a range from prev_end to curr_start with default category        
-                elif prev_end_value < curr_start_value:
-                    min_to_max_range_list.append({"start": {"value": prev_end_value, "included": not prev_end_included}, "end": {"value": curr_start_value, "included": not curr_start_included}, "category": default_category})
-            
-            # Check if last range ends with max_value, if not, then add a range from last range end to max_value with default category
-            last_range_end_value = min_to_max_range_list[-1]["end"]["value"]
-            last_range_end_included = min_to_max_range_list[-1]["end"]["included"]
-            if not (last_range_end_value == max_value and last_range_end_included == True):
-                min_to_max_range_list.append({"start": {"value": last_range_end_value, "included": not last_range_end_included}, "end": {"value": max_value, "included": True}, "category": default_category})
-         
-            
-            # Convert column to categorical column based on range_list
-            def get_category(x, min_to_max_range_list, default_category):
-                for i in range(len(min_to_max_range_list)):
-                    
-                    start_value = min_to_max_range_list[i]["start"]["value"]
-                    start_included = min_to_max_range_list[i]["start"]["included"]
-                    end_value = min_to_max_range_list[i]["end"]["value"]
-                    end_included = min_to_max_range_list[i]["end"]["included"]
-                    
-                    if start_included and end_included:
-                        if start_value <= x <= end_value:
-                            return min_to_max_range_list[i]["category"]
-                    elif start_included and not end_included:
-                        if start_value <= x < end_value:
-                            return min_to_max_range_list[i]["category"]
-                    elif not start_included and end_included:
-                        if start_value < x <= end_value:
-                            return min_to_max_range_list[i]["category"]
-                    elif not start_included and not end_included:
-                        if start_value < x < end_value:
-                            return min_to_max_range_list[i]["category"]
-                        
-                return default_category
-            
-            df[column_name] = df[column_name].apply(lambda x: get_category(x, min_to_max_range_list, default_category))
-                
-            # If user wants onehot encoding
-            if encoding_type == "onehot":
-                # Create a new dataframe with the onehot encoding of the new column
-                new_df = pd.get_dummies(df[column_name], prefix=prefix)
-                # Concatenate the original dataframe with the new dataframe
-                df = pd.concat([df, new_df], axis=1)
-                # Drop the original column
-                df = df.drop(column_name, axis=1)
-                
+            operation = ("custom_discretization", {"column_name": column_name, "range_list": range_list, "default_category": default_category, "encoding_type": encoding_type, "prefix": prefix})
+        
+        df = apply_operation(df, *operation)
         
         # ================================================ # Data Discretization Logic End Here ================================================
         
@@ -281,7 +180,7 @@ def data_discretization():
         metadata.save()
         
         # Save the dataset copy
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
         
         res={
             "msg": "Data Discretization Successful",
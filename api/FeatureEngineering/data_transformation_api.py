@@ -7,18 +7,15 @@ from flask import current_app as app
 
 # UTILITIES
 from utilities.respond import respond
+from utilities.locks import lock_dataset
 from utilities.methods import get_dataset_name, load_dataset_copy, log_error, make_dataset_copy, check_dataset_copy_exists, save_dataset_copy, get_row_column_metadata
+from utilities.operation_log import apply_operation
 
 # MODELS
 from models.user_model import Users
 from models.dataset_metadata_model import MetaData
 # constants
 
-# OTHER
-import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-
 # BLUEPRINT
 dataTransformationAPI = Blueprint("dataTransformationAPI", __name__)
 dataTransformationAPI_restful = Api(dataTransformationAPI)
@@ -27,6 +24,7 @@ dataTransformationAPI_restful = Api(dataTransformationAPI)
 # Api to perform data transformation
 @dataTransformationAPI.route("/data-transformation", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def data_transformation():
     """
         TAKES dataset_name, transformation_method, column_list as input
@@ -94,24 +92,13 @@ def data_transformation():
 
         # ================================Main logic starts here==============================
 
-        if transformation_method == "log-transformation":
-            df[column_list]=np.log(df[column_list])
-
-        elif transformation_method == "exponential-transformation":
-            df[column_list]=np.exp(df[column_list])
-            
-        elif transformation_method == "standardization":
-            scaler = StandardScaler()  
-            df[column_list] = scaler.fit_transform(df[column_list])
-
-        elif transformation_method == "normalization":
-            scaler = MinMaxScaler()
-            df[column_list] = scaler.fit_transform(df[column_list])
+        operation = ("data_transformation", {"transformation_method": transformation_method, "column_list": column_list})
+        df = apply_operation(df, *operation)
 
         # ================================Main logic ends here==============================
 
         #Saving updated dataset
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         # Metadata updation
         updated_row_column_metadata = get_row_column_metadata(df)
@@ -7,6 +7,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 # UTILITIES
 from utilities.respond import respond
+from utilities.locks import lock_dataset
 from utilities.methods import (
     get_dataset_name, 
     load_dataset_copy, 
@@ -16,21 +17,13 @@ from utilities.methods import (
     save_dataset_copy, 
     get_row_column_metadata
 )
+from utilities.operation_log import apply_operation
+from utilities.metadata_updates import MetadataUpdate, ROW_COLUMN_FIELDS
 
 # MODELS
 from models.user_model import Users
 from models.dataset_metadata_model import MetaData
 
-# OTHERS
-from category_encoders import (
-    OneHotEncoder,
-    OrdinalEncoder,
-    BinaryEncoder,
-    TargetEncoder,
-    LeaveOneOutEncoder,
-    CountEncoder
-)
-
 # BLUEPRINT
 featureEncodingAPI = Blueprint("fetatureEncodingAPI", __name__)
 featureEncodingAPI_restful = Api(featureEncodingAPI)
@@ -38,6 +31,7 @@ featureEncodingAPI_restful = Api(featureEncodingAPI)
 # Api for one hot encoding
 @featureEncodingAPI.route("/one-hot-encoding", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def one_hot_encoding():
     """
         TAKES dataset_name, column list and dummy column name rule as input
@@ -110,12 +104,13 @@ def one_hot_encoding():
                 err = f"Column '{col}' does not exists in the dataset"
                 raise
 
-        df = OneHotEncoder(cols=column_list, use_cat_names=use_cat_name, return_df=True).fit(df).transform(df)
+        operation = ("one_hot_encoding", {"column_list": column_list, "use_cat_name": use_cat_name})
+        df = apply_operation(df, *operation)
 
         # ===================== Business Logic Ends Here =====================
 
         # Save the dataset copy and update the metadata
-        update_metadata(user, dataset_name, df)
+        update_metadata(user, dataset_name, df, operation)
 
         res = {
             "msg": "One hot encoding successful"
@@ -132,6 +127,7 @@ def one_hot_encoding():
 # Api for target encoding
 @featureEncodingAPI.route("/target-encoding", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def target_encoding():
     """
         TAKES dataset_name, column list and target column name and method as input
@@ -214,15 +210,13 @@ def target_encoding():
             err = f"Target column '{target_column}' does not exists in the dataset"
             raise
         
-        if not leaveOneOut:
-            df = TargetEncoder(cols=column_list, return_df=True).fit(df, df[target_column]).transform(df)
-        else:
-            df = LeaveOneOutEncoder(cols=column_list, return_df=True).fit(df, df[target_column]).transform(df)
+        operation = ("target_encoding", {"column_list": column_list, "target_column": target_column, "leaveOneOut": leaveOneOut})
+        df = apply_operation(df, *operation)
         
         # ===================== Business Logic Ends Here =====================
 
         # Save the dataset copy and update the metadata
-        update_metadata(user, dataset_name, df)
+        update_metadata(user, dataset_name, df, operation)
 
         res = {
             "msg": "Target encoding successful"
@@ -239,6 +233,7 @@ def target_encoding():
 # Api for binary encoding
 @featureEncodingAPI.route("/binary-encoding", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def binary_encoding():
     """
         TAKES dataset_name, column list aas input
@@ -305,12 +300,13 @@ def binary_encoding():
                 err = f"Column '{col}' does not exists in the dataset"
                 raise
         
-        df = BinaryEncoder(cols=column_list, return_df=True).fit(df).transform(df)
+        operation = ("binary_encoding", {"column_list": column_list})
+        df = apply_operation(df, *operation)
         
         # ===================== Business Logic Ends Here =====================
 
         # Save the dataset copy and update the metadata
-        update_metadata(user, dataset_name, df)
+        update_metadata(user, dataset_name, df, operation)
 
         res = {
             "msg": "Binary encoding successful"
@@ -327,6 +323,7 @@ def binary_encoding():
 # Api for binary encoding
 @featureEncodingAPI.route("/frequency-encoding", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def frequency_encoding():
     """
         TAKES dataset_name, column list and normalize status as input
@@ -399,12 +396,13 @@ def frequency_encoding():
                 err = f"Column '{col}' does not exists in the dataset"
                 raise
         
-        df = CountEncoder(cols=column_list, normalize=normalize, return_df=True).fit(df).transform(df)
+        operation = ("frequency_encoding", {"column_list": column_list, "normalize": normalize})
+        df = apply_operation(df, *operation)
         
         # ===================== Business Logic Ends Here =====================
 
         # Save the dataset copy and update the metadata
-        update_metadata(user, dataset_name, df)
+        update_metadata(user, dataset_name, df, operation)
 
         res = {
             "msg": "Frequency encoding successful"
@@ -421,6 +419,7 @@ def frequency_encoding():
 # Api for ordinal  encoding
 @featureEncodingAPI.route("/ordinal-encoding", methods=["POST"])
 @jwt_required()
+@lock_dataset(exclusive=True)
 def ordinal_encoding():
     """
         TAKES dataset_name, column list and mapping status as input
@@ -501,23 +500,13 @@ def ordinal_encoding():
             err = f"Column '{column_name}' does not exists in the dataset"
             raise
 
-        if custom_mapping:
-            custom_mapping_obj = [
-                {
-                    'col': column_name, 
-                    'mapping': mapping
-                }
-            ]
-            df = OrdinalEncoder(mapping=custom_mapping_obj, return_df=True).fit(df).transform(df)
-        
-        else: 
-            from sklearn.preprocessing import OrdinalEncoder as sklearn_OrdinalEncoder
-            df[column_name] = sklearn_OrdinalEncoder().fit(df[[column_name]]).transform(df[[column_name]])
+        operation = ("ordinal_encoding", {"column_name": column_name, "custom_mapping": custom_mapping, "mapping": mapping})
+        df = apply_operation(df, *operation)
         
         # ===================== Business Logic Ends Here =====================
 
         # Save the dataset copy and update the metadata
-        update_metadata(user, dataset_name, df)
+        update_metadata(user, dataset_name, df, operation)
 
         res = {
             "msg": "Ordinal encoding successful"
@@ -530,36 +519,20 @@ def ordinal_encoding():
             err = "Error in ordinal encoding"
         return respond(error=err)
 
-def update_metadata(user, dataset_name, df):
+def update_metadata(user, dataset_name, df, operation=None):
     try:
-        # get new column data
-        new_column_list = df.columns.tolist()
-        new_column_datatypes = df.dtypes.astype(str).to_dict() # Dictionary of column name and its type
-        new_numerical_column_list = df.select_dtypes(exclude=['object', 'bool']).columns.tolist() # List of numerical columns
-        new_categorical_column_list = df.select_dtypes(include=['object', 'bool']).columns.tolist() # List of categorical columns
-        new_n_columns = len(new_column_list)
-        new_n_rows = len(df)
-        new_n_values = new_n_columns * new_n_rows
-
         dataset_name_copy = get_dataset_name( user.id, dataset_name) + "_copy"
-        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
-        metadata_dict = metadata_obj.to_mongo().to_dict()
+        metadata_obj = MetaData.objects(dataset_file_name=dataset_name_copy).only(*ROW_COLUMN_FIELDS).first_or_404(message=f"Metadata for '{dataset_name}' does not exists")
 
-        metadata_dict["column_list"] = new_column_list
-        metadata_dict["column_datatypes"] = new_column_datatypes
-        metadata_dict["numerical_column_list"] = new_numerical_column_list
-        metadata_dict["categorical_column_list"] = new_categorical_column_list
-        metadata_dict["n_columns"] = new_n_columns
-        metadata_dict["n_rows"] = new_n_rows
-        metadata_dict["n_values"] = new_n_values
+        # Only the changed fields are sent, the encoded columns are pulled and the new ones pushed
+        metadata_update = MetadataUpdate(dataset_name_copy).set_row_column_metadata(metadata_obj, get_row_column_metadata(df))
 
         # ===== save the metadata and dataframe =====
-        save_dataset_copy(df, dataset_name, user.id, user.email)
+        save_dataset_copy(df, dataset_name, user.id, user.email, operation=operation)
 
         # Update the metadata of the copy
-        metadata_dict["is_copy_modified"] = True
-        del metadata_dict["_id"]
-        metadata_obj.update(**metadata_dict)
+        if not metadata_update.set(is_copy_modified=True).apply():
+            raise Exception(f"Metadata for '{dataset_name}' does not exists")
     
     except Exception as e:
         log_error(err_msg="Error in updating metadata", exception=e)
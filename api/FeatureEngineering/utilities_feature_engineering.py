@@ -1,7 +1,201 @@
 """Common methods, constants, and utilities for Feature Engineering API"""
 
 # Import
+import pandas as pd
+import numpy as np
+from sklearn.preprocessing import StandardScaler, MinMaxScaler, KBinsDiscretizer
+from category_encoders import (
+    OneHotEncoder,
+    OrdinalEncoder,
+    BinaryEncoder,
+    TargetEncoder,
+    LeaveOneOutEncoder,
+    CountEncoder
+)
+from utilities.operation_log import register_operation
+from utilities.methods import categories_to_object
 
 # =========METHODS================
 
+# Operations of the Feature Engineering APIs, these are replayed from the operation log of the dataset copy.
+# The inputs are validated by the APIs before the operation is applied.
+# The encoders take the categories of a category column as its values, so the encoded columns are converted to object first.
+
+@register_operation("data_transformation")
+def data_transformation(df, transformation_method, column_list):
+    if transformation_method == "log-transformation":
+        df[column_list]=np.log(df[column_list].astype("float64")) # numpy gives float16 for the log of an int8 column
+
+    elif transformation_method == "exponential-transformation":
+        df[column_list]=np.exp(df[column_list].astype("float64"))
+        
+    elif transformation_method == "standardization":
+        scaler = StandardScaler()  
+        df[column_list] = scaler.fit_transform(df[column_list])
+
+    elif transformation_method == "normalization":
+        scaler = MinMaxScaler()
+        df[column_list] = scaler.fit_transform(df[column_list])
+    return df
+
+@register_operation("kbins_discretization")
+def kbins_discretization(df, column_name, strategy, n_bins, encoding_type, prefix=None):
+    # If user wants onehot encoding. we will use "onehot-dense" encoding
+    if encoding_type == "onehot":
+        encoding_type = "onehot-dense"
+        
+    # Create an instance of KBinsDiscretizer
+    kbins = KBinsDiscretizer(n_bins=n_bins, encode=encoding_type, strategy=strategy)
+    # Fit n Transfomrm the KBinsDiscretizer
+    descretised_data = kbins.fit_transform(df[[column_name]])
+    
+    # Column names of the new discretized columns
+    new_column_names = []
+    if encoding_type == "onehot" or encoding_type == "onehot-dense":
+        for i in range(n_bins):
+            new_column_names.append(prefix+str(i))
+    else:
+        new_column_names.append(column_name)
+    
+    # Create a new dataframe with the discretized data
+    new_df = pd.DataFrame(descretised_data, columns=new_column_names)
+    new_df = new_df.astype(int)
+    
+    # Drop the original column from the dataframe
+    df = df.drop(column_name, axis=1)
+
+    # Concatenate the original dataframe with the new dataframe
+    df = pd.concat([df, new_df], axis=1)
+    return df
+
+def get_min_to_max_range_list(range_list, default_category, min_value, max_value):
+    """
+        TAKES the ranges given by the user and the min and max value of the column
+        RETURNS the ranges covering the column from min to max, the gaps are filled with the default category
+    """
+    sorted_range_list = sorted(range_list, key=lambda x: x["start"]["value"])
+    min_to_max_range_list = []
+
+    start_value = sorted_range_list[0]["start"]["value"]
+    start_included = sorted_range_list[0]["start"]["included"]
+    
+    index = 0
+    # IF first range does not start from min_value, then add a range from min_value to start_value, else add the first range
+    if not (start_value == min_value and start_included == True):
+        min_to_max_range_list.append({"start": {"value": min_value, "included": True}, "end": {"value": start_value, "included": not start_included}, "category": default_category})
+    else :
+        min_to_max_range_list.append(sorted_range_list[0])
+        index = 1
+        
+    total_range_items = len(sorted_range_list)
+    
+    while index < total_range_items:
+        
+        prev_end_value = min_to_max_range_list[-1]["end"]["value"]
+        prev_end_included = min_to_max_range_list[-1]["end"]["included"]
+        
+        curr_start_value = sorted_range_list[index]["start"]["value"]
+        curr_start_included = sorted_range_list[index]["start"]["included"]
+        
+        # If Prev ending and current starting values are same, 
+        if prev_end_value == curr_start_value:
+            # if one of them is included and other is not included, then add the current range
+            if prev_end_included != curr_start_included:
+                min_to_max_range_list.append(sorted_range_list[index])
+                index += 1
+            # if both are not included, then add the an range with curr_start/prev_end value and included as True in both start and end with default category
+            else:
+                min_to_max_range_list.append({"start": {"value": curr_start_value, "included": True}, "end": {"value": curr_start_value, "included": True}, "category": default_category})
+        
+        # if prev ending is smaller than current starting, that means there is a gap between them, so add a range from prev_end to curr_start with default category        
+        elif prev_end_value < curr_start_value:
+            min_to_max_range_list.append({"start": {"value": prev_end_value, "included": not prev_end_included}, "end": {"value": curr_start_value, "included": not curr_start_included}, "category": default_category})
+    
+    # Check if last range ends with max_value, if not, then add a range from last range end to max_value with default category
+    last_range_end_value = min_to_max_range_list[-1]["end"]["value"]
+    last_range_end_included = min_to_max_range_list[-1]["end"]["included"]
+    if not (last_range_end_value == max_value and last_range_end_included == True):
+        min_to_max_range_list.append({"start": {"value": last_range_end_value, "included": not last_range_end_included}, "end": {"value": max_value, "included": True}, "category": default_category})
+    return min_to_max_range_list
+
+# Convert column to categorical column based on range_list
+def get_category(x, min_to_max_range_list, default_category):
+    for i in range(len(min_to_max_range_list)):
+        
+        start_value = min_to_max_range_list[i]["start"]["value"]
+        start_included = min_to_max_range_list[i]["start"]["included"]
+        end_value = min_to_max_range_list[i]["end"]["value"]
+        end_included = min_to_max_range_list[i]["end"]["included"]
+        
+        if start_included and end_included:
+            if start_value <= x <= end_value:
+                return min_to_max_range_list[i]["category"]
+        elif start_included and not end_included:
+            if start_value <= x < end_value:
+                return min_to_max_range_list[i]["category"]
+        elif not start_included and end_included:
+            if start_value < x <= end_value:
+                return min_to_max_range_list[i]["category"]
+        elif not start_included and not end_included:
+            if start_value < x < end_value:
+                return min_to_max_range_list[i]["category"]
+            
+    return default_category
+
+@register_operation("custom_discretization")
+def custom_discretization(df, column_name, range_list, default_category, encoding_type, prefix=None):
+    min_value = int(df[column_name].min())
+    max_value = int(df[column_name].max())
+    min_to_max_range_list = get_min_to_max_range_list(range_list, default_category, min_value, max_value)
+
+    df[column_name] = df[column_name].apply(lambda x: get_category(x, min_to_max_range_list, default_category))
+        
+    # If user wants onehot encoding
+    if encoding_type == "onehot":
+        # Create a new dataframe with the onehot encoding of the new column
+        new_df = pd.get_dummies(df[column_name], prefix=prefix)
+        # Concatenate the original dataframe with the new dataframe
+        df = pd.concat([df, new_df], axis=1)
+        # Drop the original column
+        df = df.drop(column_name, axis=1)
+    return df
+
+@register_operation("one_hot_encoding")
+def one_hot_encoding(df, column_list, use_cat_name):
+    df = categories_to_object(df, column_list)
+    return OneHotEncoder(cols=column_list, use_cat_names=use_cat_name, return_df=True).fit(df).transform(df)
+
+@register_operation("target_encoding")
+def target_encoding(df, column_list, target_column, leaveOneOut):
+    df = categories_to_object(df, column_list)
+    if not leaveOneOut:
+        return TargetEncoder(cols=column_list, return_df=True).fit(df, df[target_column]).transform(df)
+    return LeaveOneOutEncoder(cols=column_list, return_df=True).fit(df, df[target_column]).transform(df)
+
+@register_operation("binary_encoding")
+def binary_encoding(df, column_list):
+    df = categories_to_object(df, column_list)
+    return BinaryEncoder(cols=column_list, return_df=True).fit(df).transform(df)
+
+@register_operation("frequency_encoding")
+def frequency_encoding(df, column_list, normalize):
+    df = categories_to_object(df, column_list)
+    return CountEncoder(cols=column_list, normalize=normalize, return_df=True).fit(df).transform(df)
+
+@register_operation("ordinal_encoding")
+def ordinal_encoding(df, column_name, custom_mapping, mapping=None):
+    df = categories_to_object(df, [column_name])
+    if custom_mapping:
+        custom_mapping_obj = [
+            {
+                'col': column_name, 
+                'mapping': mapping
+            }
+        ]
+        return OrdinalEncoder(mapping=custom_mapping_obj, return_df=True).fit(df).transform(df)
+    
+    from sklearn.preprocessing import OrdinalEncoder as sklearn_OrdinalEncoder
+    df[column_name] = sklearn_OrdinalEncoder().fit(df[[column_name]]).transform(df[[column_name]])
+    return df
+
 # =========CONSTANTS================
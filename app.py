@@ -5,7 +5,21 @@ import logging
 from logging.config import dictConfig
 from dotenv import load_dotenv
 import os
-from utilities.constants import ONE_GB
+from utilities.constants import (
+    ONE_GB,
+    DEFAULT_DATASET_CACHE_MAX_BYTES,
+    DEFAULT_METADATA_CACHE_MAX_ENTRIES,
+    DEFAULT_DATASET_LOCK_TIMEOUT,
+    DEFAULT_DATASET_COMPRESSION,
+    DEFAULT_DATASET_COPY_COMPRESSION,
+    DEFAULT_DATASET_ROW_GROUP_SIZE,
+    DEFAULT_DATASET_INGEST_CHUNK_SIZE,
+    DEFAULT_DATASET_INGEST_ENGINE,
+    DEFAULT_DATASET_INGEST_BLOCK_SIZE,
+    DEFAULT_DATASET_EXPORT_BATCH_SIZE,
+    DEFAULT_DATASET_IO_THREADS
+)
+import pyarrow as pa
 from flask_jwt_extended import get_current_user
 
 # Models
@@ -18,6 +32,8 @@ from manage.mongodb_setup import db as mongo_db
 from manage.db_setup import migrate
 from manage.celery_setup import celery_instance
 from manage.jwt_extension import jwt
+from manage.dataset_cache import dataset_cache
+from manage.metadata_cache import metadata_cache
 
 # APIs
 from api.User import user_api
@@ -127,12 +143,32 @@ def set_logger():
 
     logging.setLogRecordFactory(record_factory)
 
+def set_decode_threads(app):
+    '''
+    Function to size the Arrow thread pools which decode the parquet files of this worker
+    '''
+    pa.set_cpu_count(app.config["DATASET_DECODE_THREADS"])
+    pa.set_io_thread_count(app.config["DATASET_IO_THREADS"])
+
+def get_default_decode_threads():
+    # Every gunicorn worker has its own pool, so the cores are split between the workers (WEB_CONCURRENCY is read by gunicorn too)
+    n_workers = max(int(os.getenv("WEB_CONCURRENCY", 1)), 1)
+    return max((os.cpu_count() or 1) // n_workers, 1)
+
 def set_celery(app):
     '''
     Function to setup the celery
     '''
     celery_instance.conf.update(app.config)
 
+    # The tasks use the models and the config, so they run in an app context like the requests
+    class ContextTask(celery_instance.Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery_instance.Task = ContextTask
+
 def add_end_points(app):
     '''
     Function to register the api end points
@@ -167,6 +203,21 @@ def configure_app(app):
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=5)
     app.config['MONGODB_SETTINGS'] = [{'host': os.getenv("MONGODB_DATABASE_URL")}]
+    app.config["DATASET_CACHE_MAX_BYTES"] = int(os.getenv("DATASET_CACHE_MAX_BYTES", DEFAULT_DATASET_CACHE_MAX_BYTES)) # per worker, 0 disables the cache
+    app.config["METADATA_CACHE_MAX_ENTRIES"] = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", DEFAULT_METADATA_CACHE_MAX_ENTRIES)) # per worker, 0 disables the cache
+    app.config["OPTIMIZE_DATASET_TYPES"] = os.getenv("OPTIMIZE_DATASET_TYPES", "false").lower() == "true" # default of the upload form field optimize_types
+    app.config["CATEGORICAL_STORAGE"] = os.getenv("CATEGORICAL_STORAGE", "false").lower() == "true"
+    app.config["DATASET_COMPRESSION"] = os.getenv("DATASET_COMPRESSION", DEFAULT_DATASET_COMPRESSION) # codec[:level], e.g. zstd:9
+    app.config["DATASET_COPY_COMPRESSION"] = os.getenv("DATASET_COPY_COMPRESSION", DEFAULT_DATASET_COPY_COMPRESSION) # codec[:level], e.g. lz4 or none
+    app.config["DATASET_ROW_GROUP_SIZE"] = int(os.getenv("DATASET_ROW_GROUP_SIZE", DEFAULT_DATASET_ROW_GROUP_SIZE))
+    app.config["ASYNC_DATASET_UPLOAD"] = os.getenv("ASYNC_DATASET_UPLOAD", "false").lower() == "true" # uploads are converted by the celery workers, needs a worker running
+    app.config["DATASET_INGEST_ENGINE"] = os.getenv("DATASET_INGEST_ENGINE", DEFAULT_DATASET_INGEST_ENGINE)
+    app.config["DATASET_INGEST_CHUNK_SIZE"] = int(os.getenv("DATASET_INGEST_CHUNK_SIZE", DEFAULT_DATASET_INGEST_CHUNK_SIZE))
+    app.config["DATASET_INGEST_BLOCK_SIZE"] = int(os.getenv("DATASET_INGEST_BLOCK_SIZE", DEFAULT_DATASET_INGEST_BLOCK_SIZE))
+    app.config["DATASET_EXPORT_BATCH_SIZE"] = int(os.getenv("DATASET_EXPORT_BATCH_SIZE", DEFAULT_DATASET_EXPORT_BATCH_SIZE))
+    app.config["DATASET_LOCK_TIMEOUT"] = float(os.getenv("DATASET_LOCK_TIMEOUT", DEFAULT_DATASET_LOCK_TIMEOUT))
+    app.config["DATASET_DECODE_THREADS"] = int(os.getenv("DATASET_DECODE_THREADS", get_default_decode_threads())) # per worker
+    app.config["DATASET_IO_THREADS"] = int(os.getenv("DATASET_IO_THREADS", DEFAULT_DATASET_IO_THREADS)) # per worker
 
 def create_app():
     '''
@@ -182,9 +233,12 @@ def create_app():
     migrate.init_app(app, db)
     jwt.init_app(app)
     mongo_db.init_app(app)
+    dataset_cache.init_app(app)
+    metadata_cache.init_app(app)
     # with app.app_context():
     #     db.create_all()
 
+    set_decode_threads(app)
     set_celery(app)
     add_end_points(app)
     set_logger()
@@ -0,0 +1,131 @@
+"""
+MetaData lookup benchmark
+
+Measures the latency of the metadata queries of the apis as the MetaData collection grows: the lookup of a
+dataset by dataset_file_name returning the whole document, the same lookup with an .only() projection, the
+lookup with the index ignored (a collection scan, what every lookup was before the indexes were declared)
+and the listing of the datasets of a user. The indexes are the ones declared on the MetaData model.
+
+Run from the backend directory against a scratch database, the documents are inserted into it and dropped afterwards:
+    python -m benchmarks.metadata_lookup_benchmark --host mongodb://localhost:27017/rbl_benchmark
+    python -m benchmarks.metadata_lookup_benchmark --host mongodb://localhost:27017/rbl_benchmark --sizes 10000 1000000 --columns 500
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+import mongoengine
+import pandas as pd
+from models.dataset_metadata_model import MetaData
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DATASETS_PER_USER = 3
+INSERT_BATCH_SIZE = 10000
+
+
+def make_document(i, n_columns):
+    """RETURNS the raw document of the i-th dataset, every DATASETS_PER_USER-th one is a working copy"""
+    user_id = i // DATASETS_PER_USER
+    is_copy = i % DATASETS_PER_USER == DATASETS_PER_USER - 1
+    columns = [f"column_{j}" for j in range(n_columns)]
+    return {
+        "_id": i + 1,
+        "user_id": user_id,
+        "user_email": f"user{user_id}@example.com",
+        "is_copy": is_copy,
+        "is_copy_modified": False,
+        "date_created": datetime(2023, 1, 1) + timedelta(seconds=i),
+        "last_modified": datetime(2023, 1, 1) + timedelta(seconds=i),
+        "dataset_name": f"dataset{i}",
+        "dataset_extension": "csv",
+        "dataset_file_name": f"dataset{i}_{user_id}" + ("_copy" if is_copy else ""),
+        "dataset_size": 1.5,
+        "n_rows": 10000,
+        "n_columns": n_columns,
+        "n_values": 10000 * n_columns,
+        "column_list": columns,
+        "column_datatypes": {column: "float64" for column in columns},
+        "numerical_column_list": columns,
+        "categorical_column_list": [],
+        "deleted_column_list": [],
+    }
+
+
+def grow_collection(collection, current_size, size, n_columns):
+    """PERFORMS the insert of the documents current_size to size"""
+    for start in range(current_size, size, INSERT_BATCH_SIZE):
+        end = min(start + INSERT_BATCH_SIZE, size)
+        collection.insert_many([make_document(i, n_columns) for i in range(start, end)], ordered=False)
+
+
+def time_queries(query, arguments):
+    """RETURNS the median and the 95th percentile of the wall clock times of the queries in milliseconds"""
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        query(argument)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(0.95 * (len(timings) - 1))]
+
+
+def benchmark_size(size, lookups, scan_lookups):
+    """
+        TAKES the number of documents in the collection, the number of indexed lookups and of collection scans
+        RETURNS the measurements of each query
+    """
+    names = [make_document(i, 0)["dataset_file_name"] for i in random.sample(range(size), min(lookups, size))]
+    users = [make_document(i, 0)["user_id"] for i in random.sample(range(size), min(lookups, size))]
+
+    queries = {
+        "lookup_full": (lambda name: MetaData.objects(dataset_file_name=name).first(), names),
+        "lookup_only": (lambda name: MetaData.objects(dataset_file_name=name).only("numerical_column_list").first(), names),
+        "lookup_scan": (lambda name: MetaData.objects(dataset_file_name=name).hint([("$natural", 1)]).first(), names[:scan_lookups]),
+        "list_datasets": (lambda user_id: list(
+            MetaData.objects(user_id=user_id, is_copy=False).only("dataset_name", "last_modified", "dataset_size").order_by("-last_modified")
+        ), users),
+    }
+    rows = []
+    for name, (query, arguments) in queries.items():
+        if not arguments:
+            continue
+        median, p95 = time_queries(query, arguments)
+        rows.append({"documents": size, "query": name, "median_ms": median, "p95_ms": p95})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of the MetaData queries as the collection grows")
+    parser.add_argument("--host", required=True, help="mongodb uri of a scratch database")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="collection sizes measured, ascending")
+    parser.add_argument("--columns", type=int, default=50, help="columns of each dataset, the size of the column lists")
+    parser.add_argument("--lookups", type=int, default=200, help="indexed queries measured at each size")
+    parser.add_argument("--scan-lookups", type=int, default=10, help="collection scans measured at each size")
+    args = parser.parse_args()
+
+    mongoengine.connect(host=args.host)
+    collection = MetaData._get_collection() # creates the declared indexes
+    if collection.estimated_document_count():
+        sys.exit(f"The {collection.name} collection of {args.host} is not empty, use a scratch database")
+
+    rows = []
+    current_size = 0
+    try:
+        for size in sorted(args.sizes):
+            grow_collection(collection, current_size, size, args.columns)
+            current_size = size
+            rows.extend(benchmark_size(size, args.lookups, args.scan_lookups))
+            print(f"{size} documents measured", file=sys.stderr)
+    finally:
+        MetaData.drop_collection()
+
+    pd.set_option("display.width", 200)
+    results = pd.DataFrame(rows).pivot(index="documents", columns="query")
+    print(results.round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+MetaData read benchmark
+
+Compares the read only lookup of a metadata document through mongoengine (the whole document, and with an
+.only() projection) with the raw pymongo read of utilities/metadata_reads.py (the whole document, and with the
+same projection), and the cost of building the result from the raw document alone: a MetaData document
+(what a metadata cache hit did) against a MetadataRecord.
+
+The hydration is measured without a database. With --host the lookups are measured too, against a scratch
+database the document is inserted into and dropped afterwards:
+    python -m benchmarks.metadata_read_benchmark
+    python -m benchmarks.metadata_read_benchmark --host mongodb://localhost:27017/rbl_benchmark --columns 50 500 5000
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import mongoengine
+import pandas as pd
+from models.dataset_metadata_model import MetaData
+from utilities.metadata_reads import MetadataRecord, get_metadata_record
+from benchmarks.metadata_lookup_benchmark import make_document
+
+DEFAULT_COLUMNS = [10, 100, 1000]
+# The fields get-columns-info reads
+PROJECTED_FIELDS = ["column_list", "numerical_column_list", "categorical_column_list", "deleted_column_list", "column_datatypes", "n_rows", "n_columns"]
+
+
+def time_it(function, repeat):
+    """RETURNS the median wall clock time of the calls in microseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000000)
+    return statistics.median(timings)
+
+
+def benchmark_hydration(document, repeat):
+    """RETURNS the time to build the result of a lookup from the raw document"""
+    return {
+        "hydrate_mongoengine": time_it(lambda: MetaData._from_son(document), repeat),
+        "hydrate_record": time_it(lambda: MetadataRecord(document), repeat),
+        "hydrate_record_projected": time_it(lambda: MetadataRecord(document, PROJECTED_FIELDS), repeat),
+    }
+
+
+def benchmark_lookups(dataset_file_name, repeat):
+    """RETURNS the time of each lookup of the document, the metadata cache is disabled in this process"""
+    return {
+        "lookup_mongoengine": time_it(lambda: MetaData.objects(dataset_file_name=dataset_file_name).first(), repeat),
+        "lookup_mongoengine_only": time_it(lambda: MetaData.objects(dataset_file_name=dataset_file_name).only(*PROJECTED_FIELDS).first(), repeat),
+        "lookup_record": time_it(lambda: get_metadata_record(dataset_file_name), repeat),
+        "lookup_record_projected": time_it(lambda: get_metadata_record(dataset_file_name, fields=PROJECTED_FIELDS), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of the mongoengine and raw pymongo reads of a MetaData document")
+    parser.add_argument("--host", help="mongodb uri of a scratch database, the lookups are not measured without it")
+    parser.add_argument("--columns", nargs="+", type=int, default=DEFAULT_COLUMNS, help="columns of the dataset, the size of the column lists")
+    parser.add_argument("--repeat", type=int, default=1000, help="calls measured for each way")
+    args = parser.parse_args()
+
+    collection = None
+    if args.host:
+        mongoengine.connect(host=args.host)
+        collection = MetaData._get_collection()
+        if collection.estimated_document_count():
+            sys.exit(f"The {collection.name} collection of {args.host} is not empty, use a scratch database")
+
+    rows = []
+    try:
+        for n_columns in args.columns:
+            document = make_document(0, n_columns)
+            row = {"columns": n_columns, **benchmark_hydration(document, args.repeat)}
+            if collection is not None:
+                collection.delete_many({})
+                collection.insert_one(document)
+                row.update(benchmark_lookups(document["dataset_file_name"], args.repeat))
+            rows.append(row)
+            print(f"{n_columns} columns measured", file=sys.stderr)
+    finally:
+        if collection is not None:
+            MetaData.drop_collection()
+
+    pd.set_option("display.width", 200)
+    results = pd.DataFrame(rows).set_index("columns")
+    print("median microseconds per call")
+    print(results.round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
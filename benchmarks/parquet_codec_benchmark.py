@@ -0,0 +1,81 @@
+"""
+Parquet codec benchmark
+
+Measures the encode time, decode time and size on disk of datasets written with each compression setting,
+to choose DATASET_COMPRESSION (uploaded datasets) and DATASET_COPY_COMPRESSION (working copies).
+
+Run from the backend directory with csv or parquet files of real datasets:
+    python -m benchmarks.parquet_codec_benchmark assets/user_datasets/<email>/iris_1.parquet data/sales.csv
+    python -m benchmarks.parquet_codec_benchmark data/sales.csv --compressions none snappy lz4 zstd:1 zstd:9 --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import pandas as pd
+from utilities.parquet_compression import get_parquet_write_options
+
+DEFAULT_COMPRESSIONS = ["none", "snappy", "lz4", "zstd:1", "zstd:3", "zstd:9", "zstd:19"]
+
+
+def load_dataset(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def time_it(function, repeat):
+    """RETURNS the median of the wall clock times of the calls in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def benchmark_dataset(df, compressions, repeat):
+    """
+        TAKES the DataFrame, the compression settings and the number of runs of each measurement
+        RETURNS one row of measurements per compression setting
+    """
+    rows = []
+    first_column = df.columns[0]
+    with tempfile.TemporaryDirectory() as directory:
+        for compression in compressions:
+            dataset_file = os.path.join(directory, "dataset.parquet")
+            write_options = get_parquet_write_options(compression)
+
+            encode = time_it(lambda: df.to_parquet(dataset_file, index=False, **write_options), repeat)
+            decode = time_it(lambda: pd.read_parquet(dataset_file), repeat)
+            decode_column = time_it(lambda: pd.read_parquet(dataset_file, columns=[first_column]), repeat)
+
+            rows.append({
+                "compression": compression,
+                "size_mb": os.path.getsize(dataset_file) / 1000000,
+                "encode_ms": encode * 1000,
+                "decode_ms": decode * 1000,
+                "decode_one_column_ms": decode_column * 1000,
+            })
+    return pd.DataFrame(rows).set_index("compression")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode/decode time and size of the datasets for each parquet codec")
+    parser.add_argument("datasets", nargs="+", help="csv or parquet files of the datasets to measure")
+    parser.add_argument("--compressions", nargs="+", default=DEFAULT_COMPRESSIONS, help="codec[:level] settings to compare")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each measurement, the median is reported")
+    args = parser.parse_args()
+
+    pd.set_option("display.width", 200)
+    for path in args.datasets:
+        df = load_dataset(path)
+        in_memory_mb = df.memory_usage(deep=True).sum() / 1000000
+        print(f"\n{path}: {df.shape[0]} rows x {df.shape[1]} columns, {in_memory_mb:.2f} MB in memory")
+        print(benchmark_dataset(df, args.compressions, args.repeat).round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Process wide cache of the decoded datasets"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class DatasetCache:
+    """
+        LRU cache of the DataFrames read from the parquet files.
+        Entries are keyed by the file path (and the projected columns, if any) and validated against
+        the mtime and size of the file, so a file rewritten by any other worker is never served stale.
+        The version is the generation and the length of the log of edits applied on top of the file, for working copies.
+        Frames are copied on the way out as the APIs mutate the loaded frames in place.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decodes = 0
+        self.decode_seconds = 0.0
+        self.max_decode_seconds = 0.0
+        self._entries = OrderedDict() # (dataset_file, columns) => (file_signature, df, n_bytes)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get("DATASET_CACHE_MAX_BYTES", 0)
+
+    @staticmethod
+    def get_file_signature(dataset_file):
+        stat = os.stat(dataset_file)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _get_key(dataset_file, columns):
+        return (dataset_file, tuple(columns) if columns is not None else None)
+
+    def get(self, dataset_file, columns=None, version=0):
+        try:
+            signature = (self.get_file_signature(dataset_file), version)
+        except OSError:
+            self.invalidate(dataset_file)
+            return None
+
+        with self._lock:
+            # A cached full frame can answer any column projection
+            df = self._lookup(self._get_key(dataset_file, None), signature)
+            if df is not None and columns is not None:
+                df = df[list(columns)]
+            elif df is None and columns is not None:
+                df = self._lookup(self._get_key(dataset_file, columns), signature)
+
+            if df is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return df.copy()
+
+    def put(self, dataset_file, df, signature, columns=None, version=0):
+        """
+            signature has to be taken before the file was read,
+            otherwise a concurrent rewrite could be cached under the new signature
+        """
+        signature = (signature, version)
+        if self.max_bytes <= 0:
+            return
+
+        n_bytes = int(df.memory_usage(index=True, deep=True).sum())
+        # Frames bigger than the whole budget would only evict everything else
+        if n_bytes > self.max_bytes:
+            return
+
+        key = self._get_key(dataset_file, columns)
+        df = df.copy()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            while self._entries and self.current_bytes + n_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+            self._entries[key] = (signature, df, n_bytes)
+            self.current_bytes += n_bytes
+
+    def invalidate(self, dataset_file):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == dataset_file]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def record_decode(self, seconds):
+        """Counts a read of a parquet file which was not served from the cache"""
+        with self._lock:
+            self.decodes += 1
+            self.decode_seconds += seconds
+            self.max_decode_seconds = max(self.max_decode_seconds, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "n_entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "decodes": self.decodes,
+                "decode_seconds": round(self.decode_seconds, 3),
+                "max_decode_seconds": round(self.max_decode_seconds, 3),
+            }
+
+    def _lookup(self, key, signature):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != signature:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _remove(self, key):
+        _signature, _df, n_bytes = self._entries.pop(key)
+        self.current_bytes -= n_bytes
+
+
+dataset_cache = DatasetCache()
@@ -0,0 +1,117 @@
+"""Process wide cache of the dataset metadata documents"""
+
+import threading
+from collections import OrderedDict
+from flask import current_app as app
+from redis.exceptions import RedisError
+from manage.redis_conf import redis
+
+
+class MetadataCache:
+    """
+        LRU cache of the raw MetaData documents, keyed by dataset_file_name.
+        Every write of a document bumps its version (models/dataset_metadata_model.py). The writer removes the
+        published version from redis before writing and publishes the new one afterwards, so a cached document is
+        only served while its version is the published one and no worker serves it stale after an edit.
+        Without a published version (or without redis) the document is read from Mongo.
+    """
+
+    def __init__(self, max_entries=0):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # dataset_file_name => (version, son)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("METADATA_CACHE_MAX_ENTRIES", 0)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def _get_version_key(dataset_file_name):
+        return f"metadata_version:{dataset_file_name}"
+
+    def get(self, dataset_file_name):
+        """RETURNS the raw document if the cached version is the published one, None otherwise"""
+        if not self.enabled:
+            return None
+        try:
+            version = redis.get(self._get_version_key(dataset_file_name))
+        except RedisError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(dataset_file_name)
+            if version is None or entry is None or entry[0] != int(version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(dataset_file_name)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, dataset_file_name, version, son):
+        """
+            Caches the document read from Mongo. Its version is published if none is, for the documents
+            written before the versions or after redis lost the key, the document is not cached if another is.
+        """
+        if not self.enabled:
+            return
+        key = self._get_version_key(dataset_file_name)
+        try:
+            redis.set(key, version, nx=True)
+            published = redis.get(key)
+        except RedisError:
+            return
+        if published is None or int(published) != version:
+            return
+
+        with self._lock:
+            self._entries[dataset_file_name] = (version, son)
+            self._entries.move_to_end(dataset_file_name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, dataset_file_name):
+        """
+            Called by the writers before the document is written. The write goes on if redis can not be reached,
+            the other workers go to Mongo while it is down and the version published afterwards outdates their copies.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries.pop(dataset_file_name, None)
+        try:
+            redis.delete(self._get_version_key(dataset_file_name))
+        except RedisError as e:
+            app.logger.error("Error in invalidating the cached metadata of %s. Exception=> %s", dataset_file_name, str(e))
+
+    def publish(self, dataset_file_name, version):
+        """Called by the writers once the document is written, until then the document is read from Mongo"""
+        if not self.enabled:
+            return
+        try:
+            redis.set(self._get_version_key(dataset_file_name), version)
+        except RedisError:
+            pass # stays unpublished, the readers go to Mongo
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "n_entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+metadata_cache = MetadataCache()
@@ -0,0 +1,12 @@
+from manage.mongodb_setup import db
+
+class ColumnStatistics(db.Document): # <dataset_name>_<user_id> OR <dataset_name>_<user_id>_copy
+    dataset_file_name = db.StringField()
+    file_signature = db.ListField() # [mtime_ns, size, "log_generation:n_logged_edits"] of the parquet file the statistics were computed for
+    n_rows = db.IntField()
+    columns = db.ListField() # [{"column_name": ..., "null_count": ..., "min": ..., ...}] column names can contain dots, so they are not used as keys
+    date_computed = db.DateTimeField()
+
+    meta = {
+        "indexes": ["dataset_file_name"]
+    }
@@ -1,4 +1,6 @@
+from pymongo import ReturnDocument
 from manage.mongodb_setup import db
+from manage.metadata_cache import metadata_cache
 
 class MetaData(db.Document): # <dataset_name>_<user_id> OR <dataset_name>_<user_id>_copy
     id = db.SequenceField(primary_key=True,)
@@ -19,4 +21,51 @@ class MetaData(db.Document): # <dataset_name>_<user_id> OR <dataset_name>_<user_
     column_datatypes = db.DictField()
     numerical_column_list = db.ListField()
     categorical_column_list = db.ListField()
-    deleted_column_list =  db.ListField()
\ No newline at end of file
+    deleted_column_list =  db.ListField()
+    compression = db.StringField() # codec[:level] of the dataset file, the deployment default if not set
+    copy_compression = db.StringField() # codec[:level] of the working copy file, the deployment default if not set
+    version = db.IntField() # bumped by every write, validates the cached copies of the document (manage/metadata_cache.py)
+
+    meta = {
+        # Created by mongoengine on the first use of the collection in each process, if missing
+        "indexes": [
+            "dataset_file_name", # lookup of a dataset or its copy, nearly every api
+            ("user_id", "is_copy", "-last_modified"), # listing of the datasets of a user, newest first
+        ]
+    }
+    # The writes of the documents go through these, queryset updates would bypass the version and the metadata cache
+
+    def save(self, *args, **kwargs):
+        metadata_cache.invalidate(self.dataset_file_name)
+        self.version = get_next_metadata_version()
+        document = super().save(*args, **kwargs)
+        metadata_cache.publish(self.dataset_file_name, self.version)
+        return document
+
+    def update(self, **kwargs):
+        # A rename moves the document to another dataset_file_name, both names are invalidated
+        dataset_file_name = kwargs.get("dataset_file_name", self.dataset_file_name)
+        for name in {self.dataset_file_name, dataset_file_name}:
+            metadata_cache.invalidate(name)
+        kwargs["version"] = get_next_metadata_version() # even if the fields of another document are copied in
+        updated = super().update(**kwargs)
+        metadata_cache.publish(dataset_file_name, kwargs["version"])
+        return updated
+
+    def delete(self, *args, **kwargs):
+        metadata_cache.invalidate(self.dataset_file_name)
+        return super().delete(*args, **kwargs)
+
+
+def get_next_metadata_version():
+    """
+        RETURNS the next version of the metadata documents, from the counters collection of the ids.
+        One sequence for all the documents, so a document deleted and created again never gets back a version it had.
+    """
+    counter = MetaData._get_db()["mongoengine.counters"].find_one_and_update(
+        {"_id": "meta_data.version"},
+        {"$inc": {"next": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["next"]
@@ -0,0 +1,245 @@
+"""Per column statistics computed when a dataset is written, so the overview APIs can answer without reading the data"""
+
+import math
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype, is_bool_dtype
+from flask import current_app as app
+from models.column_statistics_model import ColumnStatistics
+from manage.dataset_cache import dataset_cache
+from utilities.constants import DISTINCT_SKETCH_SIZE
+from utilities.operation_log import read_operation_log, get_operation_log_version
+
+QUANTILES = [0.25, 0.5, 0.75]
+DESCRIBE_FIELDS = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+
+def _to_python(value):
+    # Mongo can not store the numpy scalars
+    if value is None or value is pd.NaT:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def get_distinct_sketch(series):
+    """
+        K minimum values sketch of the non null values of the column.
+        Hashes are shifted to 63 bits so they fit in a Mongo integer.
+    """
+    hashes = pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy() >> np.uint64(1)
+    hashes = np.unique(hashes)[:DISTINCT_SKETCH_SIZE]
+    return [int(value) for value in hashes]
+
+
+def merge_distinct_sketches(*sketches):
+    """Sketch of the union of the columns the sketches were computed for"""
+    return sorted(set().union(*sketches))[:DISTINCT_SKETCH_SIZE]
+
+
+def get_distinct_estimate(sketch):
+    if len(sketch) < DISTINCT_SKETCH_SIZE:
+        return len(sketch) # fewer distinct values than the sketch size, the count is exact
+    return int(round((DISTINCT_SKETCH_SIZE - 1) / ((sketch[DISTINCT_SKETCH_SIZE - 1] + 1) / 2**63)))
+
+
+def compute_column_statistics(df, quantiles=True):
+    """
+        TAKES the DataFrame which is written to the parquet file, or a chunk of it if quantiles is False
+        RETURNS the list of statistics of each column
+    """
+    columns = []
+    for column_name in df.columns:
+        series = df[column_name]
+        null_count = int(series.isna().sum())
+        sketch = get_distinct_sketch(series)
+        statistics = {
+            "column_name": column_name,
+            "data_type": str(series.dtype),
+            "count": int(series.shape[0] - null_count),
+            "null_count": null_count,
+            "distinct_sketch": sketch,
+            "distinct_estimate": get_distinct_estimate(sketch),
+        }
+
+        # Same operations as DataFrame.describe, so the numbers are identical
+        if is_numeric_dtype(series.dtype) and not is_bool_dtype(series.dtype):
+            values = series.astype("float64")
+            statistics.update({
+                "min": _to_python(series.min()),
+                "max": _to_python(series.max()),
+                "sum": _to_python(values.sum()),
+                "sum_of_squares": _to_python((values**2).sum()),
+                "mean": _to_python(series.mean()),
+                "std": _to_python(series.std()),
+            })
+            if quantiles:
+                values = series.quantile(QUANTILES).tolist()
+                statistics["quantiles"] = {f"{int(q*100)}%": _to_python(value) for q, value in zip(QUANTILES, values)}
+
+        columns.append(statistics)
+    return columns
+
+
+def _merge_numeric_statistics(statistics, other):
+    count = statistics["count"] + other["count"]
+    if not statistics["count"] or not other["count"]:
+        values = statistics if statistics["count"] else other
+        return {key: values[key] for key in ("min", "max", "sum", "sum_of_squares", "mean", "std")}
+
+    # Mean and variance of the union from those of the parts (Chan et al.), the variance is the sample variance like pandas
+    delta = other["mean"] - statistics["mean"]
+    mean = statistics["mean"] + delta * other["count"] / count
+    squared_deviations = sum(
+        (values["std"] or 0.0)**2 * (values["count"] - 1) for values in (statistics, other)
+    ) + delta**2 * statistics["count"] * other["count"] / count
+    return {
+        "min": min(statistics["min"], other["min"]),
+        "max": max(statistics["max"], other["max"]),
+        "sum": statistics["sum"] + other["sum"],
+        "sum_of_squares": statistics["sum_of_squares"] + other["sum_of_squares"],
+        "mean": mean,
+        "std": math.sqrt(squared_deviations / (count - 1)),
+    }
+
+
+def merge_column_statistics(columns, other_columns):
+    """
+        TAKES the statistics of two chunks of the same dataset, computed without quantiles
+        RETURNS the statistics of both chunks together
+    """
+    merged = []
+    for statistics, other in zip(columns, other_columns):
+        sketch = merge_distinct_sketches(statistics["distinct_sketch"], other["distinct_sketch"])
+        merged_statistics = {
+            "column_name": statistics["column_name"],
+            "data_type": statistics["data_type"],
+            "count": statistics["count"] + other["count"],
+            "null_count": statistics["null_count"] + other["null_count"],
+            "distinct_sketch": sketch,
+            "distinct_estimate": get_distinct_estimate(sketch),
+        }
+        if "mean" in statistics and "mean" in other:
+            merged_statistics.update(_merge_numeric_statistics(statistics, other))
+        merged.append(merged_statistics)
+    return merged
+
+
+def get_statistics_signature(dataset_file):
+    """
+        The mtime and size of the file along with the generation and the length of its log of edits
+    """
+    return list(dataset_cache.get_file_signature(dataset_file)) + [get_operation_log_version(*read_operation_log(dataset_file))]
+
+
+def save_column_statistics(dataset_file_name, dataset_file, df):
+    """
+        TAKES the dataset file name (iris_1 or iris_1_copy), the parquet file just written and the DataFrame written to it
+        PERFORMS the computation and saving of the column statistics, replacing the previous ones
+    """
+    try:
+        columns = compute_column_statistics(df)
+    except Exception as e:
+        app.logger.error("Error in computing the column statistics of %s. Exception=> %s", dataset_file_name, str(e))
+        return
+    save_computed_column_statistics(dataset_file_name, dataset_file, int(df.shape[0]), columns)
+
+
+def save_computed_column_statistics(dataset_file_name, dataset_file, n_rows, columns):
+    """
+        TAKES the dataset file name, the parquet file just written, its number of rows and the statistics of its columns
+        PERFORMS the saving of the column statistics, replacing the previous ones
+    """
+    try:
+        ColumnStatistics.objects(dataset_file_name=dataset_file_name).delete()
+        ColumnStatistics(
+            dataset_file_name=dataset_file_name,
+            file_signature=get_statistics_signature(dataset_file),
+            n_rows=n_rows,
+            columns=columns,
+            date_computed=datetime.now(),
+        ).save()
+    except Exception as e:
+        # The APIs fall back to reading the data when there are no statistics
+        app.logger.error("Error in saving the column statistics of %s. Exception=> %s", dataset_file_name, str(e))
+
+
+def copy_column_statistics(dataset_file_name, new_dataset_file_name, new_dataset_file):
+    """Copies the statistics for a byte identical copy of the dataset file"""
+    statistics = ColumnStatistics.objects(dataset_file_name=dataset_file_name).first()
+    ColumnStatistics.objects(dataset_file_name=new_dataset_file_name).delete()
+    if not statistics:
+        return
+    ColumnStatistics(
+        dataset_file_name=new_dataset_file_name,
+        file_signature=get_statistics_signature(new_dataset_file),
+        n_rows=statistics.n_rows,
+        columns=statistics.columns,
+        date_computed=statistics.date_computed,
+    ).save()
+
+
+def refresh_column_statistics_signature(dataset_file_name, dataset_file):
+    """Points the statistics of the dataset to its file rewritten with the same data, called after the rewrite"""
+    ColumnStatistics.objects(dataset_file_name=dataset_file_name).update(
+        set__file_signature=get_statistics_signature(dataset_file)
+    )
+
+
+def rename_column_statistics(dataset_file_name, new_dataset_file_name, new_dataset_file, previous_signature):
+    """
+        TAKES the dataset file names, the moved file once it is in place (and the log of a copy removed)
+              and the signature of the file before it was moved
+        PERFORMS the move of the statistics to the new name, signed for the moved file. Only the statistics
+                 which were up to date with the file before it was moved are kept.
+    """
+    ColumnStatistics.objects(dataset_file_name=new_dataset_file_name).delete()
+    ColumnStatistics.objects(dataset_file_name=dataset_file_name, file_signature=previous_signature).update(
+        set__dataset_file_name=new_dataset_file_name,
+        set__file_signature=get_statistics_signature(new_dataset_file)
+    )
+    ColumnStatistics.objects(dataset_file_name=dataset_file_name).delete()
+
+
+def delete_column_statistics(dataset_file_name):
+    ColumnStatistics.objects(dataset_file_name=dataset_file_name).delete()
+
+
+def load_column_statistics(dataset_file_name, dataset_file):
+    """
+        RETURNS the statistics as {column_name: statistics} along with the number of rows,
+        or (None, None) if there are none or they were computed for a different version of the file
+    """
+    statistics = ColumnStatistics.objects(dataset_file_name=dataset_file_name).first()
+    if not statistics:
+        return None, None
+    try:
+        if get_statistics_signature(dataset_file) != list(statistics.file_signature):
+            return None, None
+    except OSError:
+        return None, None
+    return {column["column_name"]: column for column in statistics.columns}, statistics.n_rows
+
+
+def get_describe_statistics(column_statistics):
+    """
+        RETURNS the values DataFrame.describe gives for a numerical column, or None if they are not in the statistics
+    """
+    if "quantiles" not in column_statistics:
+        return None
+    quantiles = column_statistics["quantiles"]
+    values = [
+        column_statistics["count"],
+        column_statistics["mean"],
+        column_statistics["std"],
+        column_statistics["min"],
+        quantiles.get("25%"),
+        quantiles.get("50%"),
+        quantiles.get("75%"),
+        column_statistics["max"],
+    ]
+    return pd.Series([np.nan if value is None else float(value) for value in values], index=DESCRIBE_FIELDS)
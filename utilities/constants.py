@@ -1,3 +1,20 @@
 ALLOWED_DB_PER_USER=3
 DEFAULT_FILL_METHOD="mode"
-ONE_GB=1024*1024*1024
\ No newline at end of file
+ONE_GB=1024*1024*1024
+DEFAULT_DATASET_CACHE_MAX_BYTES=ONE_GB//2
+DEFAULT_METADATA_CACHE_MAX_ENTRIES=1024 # metadata documents cached per worker
+DISTINCT_SKETCH_SIZE=256 # number of smallest hashes kept per column for the distinct count estimate
+OPERATION_LOG_CHECKPOINT_INTERVAL=10 # the working copy is written to its file after this many logged edits
+DEFAULT_DATASET_LOCK_TIMEOUT=60 # seconds a request waits for the lock on a dataset before giving up
+CATEGORICAL_DTYPES=['object', 'bool', 'category', 'datetime64[ns]'] # pandas dtypes of the categorical columns, dates are grouped with them
+CATEGORICAL_MAX_UNIQUE_RATIO=0.5 # string columns with at most this ratio of distinct values to rows are stored as category
+PARQUET_CODECS=["none", "snappy", "lz4", "zstd"] # compression codecs the datasets can be written with
+DEFAULT_DATASET_COMPRESSION="snappy" # codec[:level] of the uploaded datasets
+DEFAULT_DATASET_COPY_COMPRESSION="snappy" # codec[:level] of the working copies
+DEFAULT_DATASET_ROW_GROUP_SIZE=128*1024 # rows per parquet row group, the unit the readers decode and skip
+DEFAULT_DATASET_INGEST_CHUNK_SIZE=64*1024 # rows of the uploaded csv parsed and written at a time by pandas
+DEFAULT_DATASET_INGEST_ENGINE="arrow" # arrow (multi-threaded) or pandas
+DEFAULT_DATASET_INGEST_BLOCK_SIZE=16*1024*1024 # bytes of the uploaded csv parsed at a time by arrow, the column types are inferred from the first block
+DEFAULT_DATASET_EXPORT_BATCH_SIZE=64*1024 # rows of the dataset converted to csv at a time by the export
+UPLOAD_JOB_TTL=24*60*60 # seconds the status of an upload is kept in redis
+DEFAULT_DATASET_IO_THREADS=4 # threads per worker reading the parquet files from disk
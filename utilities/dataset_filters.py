@@ -0,0 +1,243 @@
+"""Filters evaluated while scanning the parquet datasets"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import is_integer_dtype, is_bool_dtype, is_categorical_dtype
+
+ISIN = "isin"
+BETWEEN = "between"
+
+
+def get_dataset_filters(categorical_values=None, numerical_values=None):
+    """
+        TAKES the categorical values ({column: [values]}) and numerical ranges ({column: [low, high]}) of a request
+        RETURNS the list of (column, operator, values) filters, all of which have to match for a row to be kept
+    """
+    filters = []
+    for column, values in (categorical_values or {}).items():
+        filters.append((column, ISIN, list(values)))
+    for column, values in (numerical_values or {}).items():
+        filters.append((column, BETWEEN, (float(values[0]), float(values[1]))))
+    return filters
+
+
+def _value_in_range(value, minimum, maximum):
+    try:
+        return minimum <= value <= maximum
+    except TypeError:
+        # Not comparable with the statistics, the row group can not be ruled out
+        return True
+
+
+def _row_group_may_match(row_group, column_positions, filters):
+    """
+        Uses the min/max statistics of the column chunks to rule out the row groups that can not contain a matching row.
+        Only ever answers False when it is certain, the rows are filtered exactly by _get_filter_mask afterwards.
+    """
+    for column, operator, values in filters:
+        statistics = row_group.column(column_positions[column]).statistics
+        if statistics is None:
+            continue
+
+        if not statistics.has_min_max:
+            # Only nulls in this chunk, which are never inside a numerical range
+            if operator == BETWEEN and statistics.has_null_count and statistics.null_count == row_group.num_rows:
+                return False
+            continue
+
+        minimum, maximum = statistics.min, statistics.max
+        if operator == ISIN:
+            if None in values:
+                continue
+            if not any(_value_in_range(value, minimum, maximum) for value in values):
+                return False
+        elif operator == BETWEEN:
+            low, high = values
+            try:
+                if maximum < low or minimum > high:
+                    return False
+            except TypeError:
+                continue
+    return True
+
+
+def _get_filter_mask(df, filters):
+    # Same pandas operations as filtering the whole DataFrame, so the results are identical
+    mask = np.ones(df.shape[0], dtype=bool)
+    for column, operator, values in filters:
+        if operator == ISIN:
+            mask &= df[column].isin(values).to_numpy()
+        elif operator == BETWEEN:
+            mask &= df[column].between(values[0], values[1]).to_numpy()
+    return mask
+
+
+def get_matching_row_positions(dataset_file, filters):
+    """
+        TAKES the parquet file and the filters
+        PERFORMS a scan of only the filter columns, skipping the row groups ruled out by their statistics
+        RETURNS the sorted positions of the matching rows in the file
+    """
+    parquet_file = pq.ParquetFile(dataset_file, memory_map=True)
+    metadata = parquet_file.metadata
+    if not filters:
+        return np.arange(metadata.num_rows, dtype=np.int64)
+
+    column_positions = {name: i for i, name in enumerate(metadata.schema.names)}
+    filter_columns = list(dict.fromkeys(column for column, _operator, _values in filters))
+    for column in filter_columns:
+        if column not in column_positions:
+            raise KeyError(column)
+
+    positions = []
+    offset = 0
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        if _row_group_may_match(row_group, column_positions, filters):
+            df = parquet_file.read_row_group(i, columns=filter_columns).to_pandas()
+            positions.append(np.flatnonzero(_get_filter_mask(df, filters)) + offset)
+        offset += row_group.num_rows
+
+    if not positions:
+        return np.array([], dtype=np.int64)
+    return np.concatenate(positions).astype(np.int64)
+
+
+def get_matching_frame_positions(df, filters):
+    """
+        TAKES the DataFrame and the filters
+        RETURNS the sorted positions of the matching rows, as get_matching_row_positions gives them for a file
+    """
+    for column, _operator, _values in filters:
+        if column not in df.columns:
+            raise KeyError(column)
+    if not filters:
+        return np.arange(df.shape[0], dtype=np.int64)
+    return np.flatnonzero(_get_filter_mask(df, filters)).astype(np.int64)
+
+
+def iter_matching_tables(parquet_file, filters, columns, batch_size):
+    """
+        TAKES the opened parquet file, the filters, the columns to keep and the number of rows read at a time
+        PERFORMS a scan of the row groups which can contain matching rows, skipping the others by their statistics
+        RETURNS the generator of the Arrow tables of the matching rows of each batch, with only the given columns
+    """
+    metadata = parquet_file.metadata
+    column_positions = {name: i for i, name in enumerate(metadata.schema.names)}
+    filter_columns = list(dict.fromkeys(column for column, _operator, _values in filters))
+    for column in filter_columns + list(columns):
+        if column not in column_positions:
+            raise KeyError(column)
+
+    read_columns = list(dict.fromkeys(list(columns) + filter_columns))
+    for i in range(metadata.num_row_groups):
+        if filters and not _row_group_may_match(metadata.row_group(i), column_positions, filters):
+            continue
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[i], columns=read_columns):
+            table = pa.Table.from_batches([batch])
+            if filters:
+                df = table.select(filter_columns).to_pandas()
+                table = table.filter(pa.array(_get_filter_mask(df, filters)))
+            yield table.select(columns)
+
+
+def _get_index_labels(parquet_file, positions):
+    """
+        Row labels the rows at the given positions have when the whole file is read with pandas.
+        Index columns stored in the file are restored by to_pandas itself, so None is returned for them.
+    """
+    pandas_metadata = parquet_file.schema_arrow.pandas_metadata or {}
+    index_columns = pandas_metadata.get("index_columns", [])
+    if not index_columns:
+        return positions
+    if len(index_columns) == 1 and isinstance(index_columns[0], dict) and index_columns[0].get("kind") == "range":
+        return index_columns[0]["start"] + positions * index_columns[0]["step"]
+    return None
+
+
+def get_full_read_dtypes(parquet_file, columns=None):
+    """
+        RETURNS the pandas dtypes the columns get when the whole file is read.
+        Integer and bool columns with nulls are converted to float/object by pandas, which a subset of the rows without nulls would not be.
+    """
+    df = parquet_file.schema_arrow.empty_table().to_pandas()
+    if columns is not None:
+        df = df[columns]
+    dtypes = df.dtypes.to_dict()
+
+    metadata = parquet_file.metadata
+    column_positions = {name: i for i, name in enumerate(metadata.schema.names)}
+    for column, dtype in dtypes.items():
+        if not (is_integer_dtype(dtype) or is_bool_dtype(dtype)) or column not in column_positions:
+            continue
+
+        has_nulls = False
+        for i in range(metadata.num_row_groups):
+            statistics = metadata.row_group(i).column(column_positions[column]).statistics
+            if statistics is None or not statistics.has_null_count:
+                has_nulls = parquet_file.read(columns=[column]).column(0).null_count > 0
+                break
+            if statistics.null_count > 0:
+                has_nulls = True
+                break
+
+        if has_nulls:
+            dtypes[column] = np.dtype("float64") if is_integer_dtype(dtype) else np.dtype("object")
+    return dtypes
+
+
+def read_dataset_rows(dataset_file, positions, columns=None):
+    """
+        TAKES the parquet file, the row positions (in any order) and optionally the columns to read
+        PERFORMS a read of only the row groups containing those rows
+        RETURNS the DataFrame of those rows, in the given order, with the labels and dtypes they have in the whole dataset
+    """
+    parquet_file = pq.ParquetFile(dataset_file, memory_map=True)
+    metadata = parquet_file.metadata
+    if columns is None:
+        columns = parquet_file.schema_arrow.empty_table().to_pandas().columns.tolist()
+    columns = list(dict.fromkeys(columns)) # remove the duplicate columns, keeping the order
+
+    positions = np.asarray(positions, dtype=np.int64)
+    order = np.argsort(positions, kind="stable")
+    sorted_positions = positions[order]
+
+    row_group_offsets = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    tables = []
+    row_group_ids = np.searchsorted(row_group_offsets, sorted_positions, side="right") - 1
+    for i in np.unique(row_group_ids):
+        local_positions = sorted_positions[row_group_ids == i] - row_group_offsets[i]
+        table = parquet_file.read_row_group(int(i), columns=columns, use_pandas_metadata=True)
+        tables.append(table.take(pa.array(local_positions)))
+
+    if tables:
+        table = pa.concat_tables(tables)
+    else:
+        index_columns = (parquet_file.schema_arrow.pandas_metadata or {}).get("index_columns", [])
+        table = parquet_file.schema_arrow.empty_table()
+        table = table.select([name for name in table.column_names if name in columns or name in index_columns])
+    df = table.to_pandas()
+
+    labels = _get_index_labels(parquet_file, sorted_positions)
+    if labels is not None:
+        df.index = labels
+
+    # Undo the sorting, so the rows are in the order they were asked for
+    df = df.iloc[np.argsort(order, kind="stable")]
+
+    dtypes = get_full_read_dtypes(parquet_file, columns)
+    # The categories of a category column depend on the rows read, the values are the same
+    mismatched = {column: dtype for column, dtype in dtypes.items() if df[column].dtype != dtype and not is_categorical_dtype(dtype)}
+    if mismatched:
+        df = df.astype(mismatched)
+    return df[columns]
+
+
+def read_frame_rows(df, positions, columns=None):
+    """
+        TAKES the DataFrame, the row positions (in any order) and optionally the columns to read
+        RETURNS the DataFrame of those rows in the given order, as read_dataset_rows gives them for a file
+    """
+    columns = list(df.columns) if columns is None else list(dict.fromkeys(columns)) # remove the duplicate columns, keeping the order
+    return df.iloc[np.asarray(positions, dtype=np.int64)][columns]
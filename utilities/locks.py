@@ -0,0 +1,100 @@
+"""Reader/writer locks on the datasets shared by all the workers on the machine"""
+
+import fcntl
+import os
+import time
+from contextlib import contextmanager, ExitStack
+from functools import wraps
+from pathlib import Path
+from flask import current_app as app, request
+from flask_jwt_extended import get_jwt_identity
+from utilities.respond import respond
+
+LOCK_POLL_INTERVAL = 0.05 # seconds
+
+
+class DatasetLockTimeout(Exception):
+    pass
+
+
+def get_dataset_lock_file(dataset_file_name):
+    # One lock for the dataset and its copy, both are read and written by the same APIs
+    return app.config["UPLOAD_FOLDER"] + f"/.locks/{dataset_file_name}.lock" # .locks/iris_1.lock
+
+
+@contextmanager
+def _flock(lock_file, exclusive, timeout):
+    Path(lock_file).parent.mkdir(parents=True, exist_ok=True)
+    operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise DatasetLockTimeout(lock_file)
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def dataset_lock(dataset_file_names, exclusive=False, timeout=None):
+    """
+        TAKES the dataset file names (iris_1) to lock, exclusive for the APIs which write the dataset or its copy
+        PERFORMS the locking of the datasets, any number of readers or a single writer hold the lock at a time
+    """
+    if timeout is None:
+        timeout = app.config["DATASET_LOCK_TIMEOUT"]
+    with ExitStack() as stack:
+        # Always locked in the same order so two requests locking the same datasets can not deadlock
+        for dataset_file_name in sorted(set(dataset_file_names)):
+            stack.enter_context(_flock(get_dataset_lock_file(dataset_file_name), exclusive, timeout))
+        yield
+
+
+def _get_request_dataset_names(fields):
+    json_body = request.get_json(silent=True) if request.is_json else None
+    dataset_names = []
+    for field in fields:
+        dataset_name = (request.view_args or {}).get(field)
+        if not dataset_name and isinstance(json_body, dict):
+            dataset_name = json_body.get(field)
+        if not dataset_name and field in request.files:
+            dataset_name = request.files[field].filename
+        if dataset_name and isinstance(dataset_name, str):
+            dataset_names.append(dataset_name)
+    return dataset_names
+
+
+def lock_dataset(exclusive=False, fields=("dataset_name",)):
+    """
+        Decorator for the APIs, placed after jwt_required. Locks the datasets named in the request fields
+        (url, JSON body or uploaded file) for the whole request. Reads are shared and writes are exclusive.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            dataset_names = _get_request_dataset_names(fields)
+            if not dataset_names:
+                # The API itself responds with the missing dataset name error
+                return function(*args, **kwargs)
+
+            current_user = get_jwt_identity()
+            # same naming as get_dataset_name, so iris.csv and iris lock the same dataset
+            dataset_file_names = [f'{dataset_name.split(".")[0]}_{current_user["id"]}' for dataset_name in dataset_names]
+            try:
+                with dataset_lock(dataset_file_names, exclusive=exclusive):
+                    return function(*args, **kwargs)
+            except DatasetLockTimeout:
+                app.logger.error("Timed out waiting for the lock on %s", dataset_file_names)
+                return respond(error="Dataset is busy with another request. Please try again")
+        return wrapper
+    return decorator
@@ -0,0 +1,50 @@
+"""Read only access to the metadata documents straight from pymongo, without hydrating mongoengine documents"""
+
+from manage.metadata_cache import metadata_cache
+from models.dataset_metadata_model import MetaData
+
+# name of the field => key of the stored document, id is stored as _id
+METADATA_DB_FIELDS = {name: field.db_field for name, field in MetaData._fields.items()}
+
+
+class MetadataRecord:
+    """
+        The fields of a metadata document for the read only APIs, built from the raw document.
+        Fields left out of the projection are not set and raise AttributeError. The lists and dicts are the ones
+        of the raw document, which can be the one in the metadata cache, so the records are never modified.
+    """
+    __slots__ = tuple(METADATA_DB_FIELDS)
+
+    def __init__(self, document, fields=None):
+        for field in fields or self.__slots__:
+            setattr(self, field, document.get(METADATA_DB_FIELDS[field]))
+
+    def to_dict(self):
+        """RETURNS the loaded fields under their stored names, without the unset ones, as to_mongo().to_dict() does"""
+        document = {}
+        for field in self.__slots__:
+            value = getattr(self, field, None)
+            if value is not None:
+                document[METADATA_DB_FIELDS[field]] = value
+        return document
+
+
+def get_metadata_record(dataset_file_name, fields=None):
+    """
+        TAKES the dataset file name (iris_1 or iris_1_copy) and the fields needed, all of them by default
+        RETURNS the MetadataRecord of the dataset, from the metadata cache of the worker while it is the current
+                version, None if there is no such dataset. The writers load the MetaData document instead.
+    """
+    if not metadata_cache.enabled:
+        projection = [METADATA_DB_FIELDS[field] for field in fields] if fields else None
+        document = MetaData._get_collection().find_one({"dataset_file_name": dataset_file_name}, projection)
+        return MetadataRecord(document, fields) if document else None
+
+    # The whole document is cached, any projection is answered from it
+    document = metadata_cache.get(dataset_file_name)
+    if document is None:
+        document = MetaData._get_collection().find_one({"dataset_file_name": dataset_file_name})
+        if document is None:
+            return None
+        metadata_cache.put(dataset_file_name, document.get("version") or 0, document)
+    return MetadataRecord(document, fields)
@@ -0,0 +1,108 @@
+"""Partial updates of the metadata documents, only the changed fields are sent to Mongo"""
+
+from pymongo import ReturnDocument
+from manage.metadata_cache import metadata_cache
+from models.dataset_metadata_model import MetaData, get_next_metadata_version
+
+# Fields of the document get_row_column_metadata recomputes, loaded with .only() to diff against
+ROW_COLUMN_FIELDS = ["n_rows", "n_columns", "n_values", "column_list", "column_datatypes", "numerical_column_list", "categorical_column_list"]
+
+
+def _is_path_key(key):
+    # The keys of a dict field are joined into a dotted path, the column names can hold anything
+    return isinstance(key, str) and key != "" and "." not in key and not key.startswith("$")
+
+
+class MetadataUpdate:
+    """
+        The changes a request makes to a metadata document, applied with one atomic find_one_and_update carrying
+        only the changed fields: $set of the fields and of the changed values of the dict fields, $unset of the
+        removed keys, $push of the items appended to a list and $pull of the items removed from it.
+        The version of the document is bumped and the metadata cache invalidated as for the other writes.
+    """
+
+    def __init__(self, dataset_file_name):
+        self.dataset_file_name = dataset_file_name
+        self._set = {}
+        self._unset = {}
+        self._push = {}
+        self._pull = {}
+
+    def set(self, **fields):
+        self._set.update(fields)
+        return self
+
+    def set_list(self, field, old_values, new_values):
+        """
+            Changes the list field from old_values to new_values, with $pull if items were only removed,
+            $push if items were only appended and $set of the whole list otherwise
+        """
+        old_values, new_values = list(old_values), list(new_values)
+        if old_values == new_values:
+            return self
+
+        new_items = set(new_values)
+        kept = [value for value in old_values if value in new_items]
+        if kept == new_values:
+            self._pull[field] = {"$in": [value for value in old_values if value not in new_items]}
+        elif new_values[:len(old_values)] == old_values:
+            self._push[field] = {"$each": new_values[len(old_values):]}
+        else:
+            self._set[field] = new_values
+        return self
+
+    def set_items(self, field, old_items, new_items):
+        """
+            Changes the dict field from old_items to new_items, with $set of the changed keys and $unset of the
+            removed ones. Added keys would be appended at the end of the stored dict, the whole dict is set then.
+        """
+        changed = {key: value for key, value in new_items.items() if key in old_items and old_items[key] != value}
+        removed = [key for key in old_items if key not in new_items]
+        if any(key not in old_items for key in new_items) or not all(_is_path_key(key) for key in list(changed) + removed):
+            self._set[field] = dict(new_items)
+            return self
+
+        for key, value in changed.items():
+            self._set[f"{field}.{key}"] = value
+        for key in removed:
+            self._unset[f"{field}.{key}"] = ""
+        return self
+
+    def set_row_column_metadata(self, metadata, row_column_metadata):
+        """
+            TAKES the loaded metadata document (the row and column fields at least)
+                  and the get_row_column_metadata of the changed DataFrame
+        """
+        for field, value in row_column_metadata.items():
+            current = metadata[field]
+            if isinstance(value, dict):
+                self.set_items(field, current or {}, value)
+            elif isinstance(value, list):
+                self.set_list(field, current or [], value)
+            elif current != value:
+                self._set[field] = value
+        return self
+
+    def apply(self):
+        """
+            PERFORMS the update of the document, in one round trip once the version is taken
+            RETURNS False if there is no such document
+        """
+        version = get_next_metadata_version()
+        update = {"$set": {**self._set, "version": version}}
+        for operator, fields in (("$unset", self._unset), ("$push", self._push), ("$pull", self._pull)):
+            if fields:
+                update[operator] = fields
+
+        metadata_cache.invalidate(self.dataset_file_name)
+        document = MetaData._get_collection().find_one_and_update(
+            {"dataset_file_name": self.dataset_file_name},
+            update,
+            projection={"_id": True},
+            return_document=ReturnDocument.AFTER
+        )
+        if document is None:
+            return False
+        metadata_cache.publish(self.dataset_file_name, version)
+        return True
+
@@ -1,11 +1,39 @@
 """Common Methods among all the APIs"""
 
+import os
 import re
+import shutil
+import time
+import uuid
 from sqlalchemy import text
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from flask import current_app as app
 from pathlib import Path
+from pandas.api.types import is_datetime64_any_dtype
 from models.dataset_metadata_model import MetaData
+from manage.dataset_cache import dataset_cache
+from utilities.column_statistics import (
+    save_column_statistics,
+    copy_column_statistics,
+    delete_column_statistics,
+    load_column_statistics
+)
+from utilities.operation_log import (
+    read_operation_log,
+    get_operation_count,
+    get_operation_log_version,
+    get_checkpoint_metadata,
+    get_pending_operations,
+    start_operation_log,
+    append_operation,
+    clear_operation_log,
+    replay_operations
+)
+from utilities.constants import OPERATION_LOG_CHECKPOINT_INTERVAL, CATEGORICAL_DTYPES
+from utilities.locks import dataset_lock
+from utilities.parquet_compression import get_parquet_write_options
 
 
 def is_email_valid(email):
@@ -15,6 +43,24 @@ def is_email_valid(email):
     else:
         return False
 
+def is_categorical_dtype_name(dtype_name):
+    """Whether a dtype (or its name, as stored in the metadata) is of a categorical column"""
+    return str(dtype_name) in CATEGORICAL_DTYPES
+
+def dates_to_strings(series):
+    """The text of the values of a date column, for the APIs listing the categorical values. Other columns are returned as they are"""
+    if not is_datetime64_any_dtype(series.dtype):
+        return series
+    return series.astype(str).where(series.notna())
+
+def categories_to_object(df, columns=None):
+    """Converts the category columns back to object, for the operations which would see the unused categories"""
+    columns = df.columns if columns is None else columns
+    for column in columns:
+        if str(df[column].dtype) == "category":
+            df[column] = df[column].astype(object)
+    return df
+
 def get_dataset_name(user_id, dataset_name):
     dataset_name = f'{dataset_name.split(".")[0]}_{user_id}'
     return dataset_name
@@ -31,7 +77,118 @@ def get_user_directory(user_email):
     user_directory = app.config['UPLOAD_FOLDER'] + f'/{user_email}'
     return user_directory
 
-def load_dataset(dataset_name, user_id, user_email):
+def get_temporary_file_name(dataset_file):
+    """
+        Temporary files are kept in the upload folder, so they are on the same filesystem and can be atomically moved in place
+    """
+    temporary_directory = app.config['UPLOAD_FOLDER'] + '/.tmp'
+    Path(temporary_directory).mkdir(parents=True, exist_ok=True)
+    return temporary_directory + f'/{uuid.uuid4().hex}_{Path(dataset_file).name}'
+
+def get_dataset_compression(metadata=None, is_copy=False):
+    """
+        TAKES the metadata of the dataset and whether the setting of its working copy is needed
+        RETURNS the codec[:level] the file is written with, the deployment default if the dataset has none
+    """
+    if is_copy:
+        return (metadata and metadata.copy_compression) or app.config["DATASET_COPY_COMPRESSION"]
+    return (metadata and metadata.compression) or app.config["DATASET_COMPRESSION"]
+
+def write_dataset_file(df, dataset_file, index=False, compression=None, metadata=None):
+    """
+        Writes the DataFrame to a temporary file and moves it in place of the dataset file.
+        The file is never rewritten in place, which would also change the original dataset the copy is hardlinked to,
+        and readers never see a partially written file. metadata is added to the key-value metadata of the file.
+    """
+    temporary_file = get_temporary_file_name(dataset_file)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=index)
+        if metadata:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        pq.write_table(
+            table,
+            temporary_file,
+            row_group_size=app.config["DATASET_ROW_GROUP_SIZE"],
+            **get_parquet_write_options(compression or get_dataset_compression())
+        )
+        os.replace(temporary_file, dataset_file)
+    finally:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+    dataset_cache.invalidate(dataset_file)
+
+def link_dataset_file(dataset_file, new_dataset_file):
+    """
+        Creates the new file as a hardlink of the dataset file, so no data is read or written.
+        Falls back to copying the bytes where hardlinks are not supported.
+    """
+    if Path(new_dataset_file).is_file():
+        Path(new_dataset_file).unlink()
+    try:
+        os.link(dataset_file, new_dataset_file)
+    except OSError:
+        temporary_file = get_temporary_file_name(new_dataset_file)
+        shutil.copyfile(dataset_file, temporary_file)
+        os.replace(temporary_file, new_dataset_file)
+    dataset_cache.invalidate(new_dataset_file)
+
+def log_decode_time(dataset_file, start_time, n_rows, n_columns):
+    """
+        TAKES the parquet file, the perf_counter value taken before it was read and the shape read
+        PERFORMS the logging of the decode time, which is also added to the decode counters of the dataset cache
+    """
+    seconds = time.perf_counter() - start_time
+    dataset_cache.record_decode(seconds)
+    app.logger.info("Decoded %s (%d rows x %d columns) in %.1f ms, decode threads: %d",
+                    Path(dataset_file).name, n_rows, n_columns, seconds * 1000, pa.cpu_count())
+
+def read_dataset_file(dataset_file, columns=None):
+    """
+        Reads the parquet file through the process wide dataset cache.
+        If columns is given only those columns are decoded from the file.
+        The returned DataFrame is owned by the caller and can be mutated freely.
+    """
+    if columns is not None:
+        columns = list(dict.fromkeys(columns)) # remove the duplicate columns, keeping the order
+    df = dataset_cache.get(dataset_file, columns=columns)
+    if df is None:
+        signature = dataset_cache.get_file_signature(dataset_file)
+        start_time = time.perf_counter()
+        # Decoded on the Arrow thread pool sized by DATASET_DECODE_THREADS
+        df = pd.read_parquet(dataset_file, columns=columns, use_threads=True)
+        log_decode_time(dataset_file, start_time, df.shape[0], df.shape[1])
+        dataset_cache.put(dataset_file, df, signature, columns=columns)
+    return df
+
+def read_dataset_copy_file(dataset_file, columns=None):
+    """
+        Reads the working copy, replaying the logged edits on top of the last checkpoint written to the file.
+        The edited DataFrame is cached under the generation and the length of the log, so the replay only happens once per version.
+    """
+    # The log and the file are read together, a reader materialising the copy can not change them in between
+    with dataset_lock([Path(dataset_file).stem], exclusive=False):
+        return _read_dataset_copy_file(dataset_file, columns=columns)
+
+def _read_dataset_copy_file(dataset_file, columns=None):
+    generation, operations = read_operation_log(dataset_file)
+    if not operations:
+        return read_dataset_file(dataset_file, columns=columns)
+
+    if columns is not None:
+        columns = list(dict.fromkeys(columns)) # remove the duplicate columns, keeping the order
+    version = get_operation_log_version(generation, operations)
+    df = dataset_cache.get(dataset_file, columns=columns, version=version)
+    if df is None:
+        # The edits can depend on any column, so the whole frame is replayed and then projected
+        signature = dataset_cache.get_file_signature(dataset_file)
+        operations = get_pending_operations(dataset_file, generation, operations)
+        df = replay_operations(read_dataset_file(dataset_file), operations)
+        dataset_cache.put(dataset_file, df, signature, version=version)
+        if columns is not None:
+            df = df[columns]
+    return df
+
+def load_dataset(dataset_name, user_id, user_email, columns=None):
     try:
         dataset_name = get_dataset_name(user_id, dataset_name)
         dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
@@ -40,20 +197,43 @@ def load_dataset(dataset_name, user_id, user_email):
             err = f"'{dataset_name}' dataset does not exists"
             return None, err
 
-        df = pd.read_parquet(dataset_file)
+        df = read_dataset_file(dataset_file, columns=columns)
         return df, None
 
     except Exception as e:
         app.logger.error("Error in loading the dataset")
         raise Exception(e)
 
-def save_dataset_copy(df, dataset_name, user_id, user_email):
+def save_dataset_copy(df, dataset_name, user_id, user_email, operation=None):
+    """
+        TAKES the edited DataFrame and the (name, params) of the operation it was edited with
+        PERFORMS an append of the operation to the log of the copy, keeping the edited DataFrame in the cache.
+                 The DataFrame is written to the file instead (a checkpoint), along with its column statistics,
+                 when there is no operation or the log has reached OPERATION_LOG_CHECKPOINT_INTERVAL operations.
+    """
     try:
         dataset_name = get_dataset_name(user_id, dataset_name)
         dataset_name = dataset_name + "_copy"
         dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
         # print(df.dtypes)
-        df.to_parquet(dataset_file, compression="snappy", index=False)
+        generation, operations = read_operation_log(dataset_file)
+        if operation is None or len(operations) + 1 >= OPERATION_LOG_CHECKPOINT_INTERVAL:
+            metadata = MetaData.objects(dataset_file_name=dataset_name).only("copy_compression").first()
+            write_dataset_file(
+                df, dataset_file, index=False, compression=get_dataset_compression(metadata, is_copy=True),
+                metadata=get_checkpoint_metadata(generation, operations)
+            )
+            start_operation_log(dataset_file)
+            save_column_statistics(dataset_name, dataset_file, df)
+        else:
+            # Fails the same way writing the file would for the columns parquet can not store
+            pa.Schema.from_pandas(df, preserve_index=False)
+            signature = dataset_cache.get_file_signature(dataset_file)
+            if generation is None and not operations:
+                generation = start_operation_log(dataset_file) # copy made before the logs had a generation
+            append_operation(dataset_file, *operation)
+            dataset_cache.put(dataset_file, df, signature, version=get_operation_log_version(generation, operations + [operation]))
+            # No statistics for the logged edits, the longer log invalidates the saved ones and the APIs read the data
         return None
     except Exception as e:
         app.logger.error("Error in saving the dataset copy")
@@ -65,14 +245,15 @@ def log_error(err_msg = None, error=None, exception=None):
 
 def make_dataset_copy(dataset_name_inp, user_id, user_email):
     try:
-        df, err = load_dataset(dataset_name_inp, user_id, user_email)
-        if err:
-            app.logger.error("Error in making the dataset copy. Error: %s", err)
-            return err
-        
         dataset_name = get_dataset_name(user_id, dataset_name_inp) # dataset_name = iris_1
         dataset_name_copy = dataset_name + "_copy" # dataset_name = iris_1_copy
 
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
+        if not Path(dataset_file).is_file():
+            err = f"'{dataset_name}' dataset does not exists"
+            app.logger.error("Error in making the dataset copy. Error: %s", err)
+            return err
+
         og_metadata_obj = MetaData.objects(dataset_file_name=dataset_name).first_or_404(message=f"Metadata for dataset {dataset_name} not found")
         metadata_dict = og_metadata_obj.to_mongo().to_dict()
         metadata_dict["is_copy"] = True
@@ -81,9 +262,11 @@ def make_dataset_copy(dataset_name_inp, user_id, user_email):
         copy_metadata_obj = MetaData(**metadata_dict)
         copy_metadata_obj.save()
 
-        # save dataset copy
+        # save dataset copy, the copy shares the data of the original until the first edit is saved
         dataset_file_copy = get_parquet_dataset_file_name(dataset_name_copy, user_email) # iris_1_copy
-        df.to_parquet(dataset_file_copy, compression="snappy", index=False)
+        link_dataset_file(dataset_file, dataset_file_copy)
+        start_operation_log(dataset_file_copy)
+        copy_column_statistics(dataset_name, dataset_name_copy, dataset_file_copy)
         
         app.logger.info("Dataset copy %s created successfully", dataset_name)
         return None
@@ -106,14 +289,14 @@ def check_dataset_copy_exists(dataset_name, user_id, user_email):
         app.logger.error("Error in checking the dataset copy exists")
         raise Exception(e)
 
-def load_dataset_copy(dataset_name, user_id, user_email):
+def load_dataset_copy(dataset_name, user_id, user_email, columns=None):
     try:
         dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
         dataset_name = dataset_name + "_copy" # dataset_name = iris_1_copy
         dataset_file_copy = get_parquet_dataset_file_name(dataset_name, user_email)
 
         if Path(dataset_file_copy).is_file():
-            df = pd.read_parquet(dataset_file_copy)
+            df = read_dataset_copy_file(dataset_file_copy, columns=columns)
             return df, None
         else:
             err = "Dataset copy does not exists"
@@ -122,6 +305,212 @@ def load_dataset_copy(dataset_name, user_id, user_email):
         app.logger.error("Error in getting the dataset copy")
         raise Exception(e)
 
+def materialise_dataset_copy(dataset_name, user_id, user_email):
+    """
+        PERFORMS a write of the logged edits of the copy to its file, before the copy replaces the saved dataset
+    """
+    try:
+        dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
+        dataset_name = dataset_name + "_copy" # dataset_name = iris_1_copy
+        dataset_file_copy = get_parquet_dataset_file_name(dataset_name, user_email)
+
+        if not Path(dataset_file_copy).is_file() or not get_operation_count(dataset_file_copy):
+            return None
+
+        # Readers of the dataset can materialise the copy concurrently, only one of them writes it
+        with dataset_lock([dataset_name], exclusive=True):
+            generation, operations = read_operation_log(dataset_file_copy)
+            if not operations:
+                return None
+            df = _read_dataset_copy_file(dataset_file_copy)
+            metadata = MetaData.objects(dataset_file_name=dataset_name).only("copy_compression").first()
+            write_dataset_file(
+                df, dataset_file_copy, index=False, compression=get_dataset_compression(metadata, is_copy=True),
+                metadata=get_checkpoint_metadata(generation, operations)
+            )
+            start_operation_log(dataset_file_copy)
+            save_column_statistics(dataset_name, dataset_file_copy, df)
+        return None
+    except Exception as e:
+        app.logger.error("Error in materialising the dataset copy")
+        raise Exception(e)
+
+def get_dataset_file(dataset_name, user_id, user_email):
+    """
+        RETURNS the parquet file the dataset is currently read from, the copy if it exists otherwise the original,
+                along with the edited DataFrame of the copy if it has logged edits which are not in its file yet.
+                The file is read only when there is no DataFrame, the copy is not rewritten for a read.
+    """
+    try:
+        dataset_file_copy = get_parquet_dataset_file_name(get_dataset_name(user_id, dataset_name) + "_copy", user_email)
+        if Path(dataset_file_copy).is_file():
+            if get_operation_count(dataset_file_copy):
+                # Replayed once per version of the log, then served from the dataset cache
+                return dataset_file_copy, read_dataset_copy_file(dataset_file_copy), None
+            return dataset_file_copy, None, None
+
+        dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
+
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
+        if Path(dataset_file).is_file():
+            return dataset_file, None, None
+
+        err = f"'{dataset_name}' dataset does not exists"
+        return None, None, err
+    except Exception as e:
+        app.logger.error("Error in getting the dataset file")
+        raise Exception(e)
+
+def read_dataset_table(dataset_file, columns=None):
+    """
+        Reads the parquet file through a memory map into an Arrow table.
+        Uncompressed column chunks are referenced straight from the page cache, which is shared
+        between all the workers, instead of being copied into the private memory of each worker.
+    """
+    if columns is not None:
+        columns = list(dict.fromkeys(columns)) # remove the duplicate columns, keeping the order
+    start_time = time.perf_counter()
+    table = pq.read_table(dataset_file, columns=columns, memory_map=True, use_threads=True)
+    log_decode_time(dataset_file, start_time, table.num_rows, table.num_columns)
+    return table
+
+def load_dataset_table(dataset_name, user_id, user_email, columns=None):
+    try:
+        dataset_name = get_dataset_name(user_id, dataset_name)
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
+        
+        if not Path(dataset_file).is_file():
+            err = f"'{dataset_name}' dataset does not exists"
+            return None, err
+
+        table = read_dataset_table(dataset_file, columns=columns)
+        return table, None
+
+    except Exception as e:
+        app.logger.error("Error in loading the dataset table")
+        raise Exception(e)
+
+def load_dataset_copy_table(dataset_name, user_id, user_email, columns=None):
+    try:
+        dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
+        dataset_name = dataset_name + "_copy" # dataset_name = iris_1_copy
+        dataset_file_copy = get_parquet_dataset_file_name(dataset_name, user_email)
+
+        if Path(dataset_file_copy).is_file():
+            if get_operation_count(dataset_file_copy):
+                # The edits are not in the file yet, the table is made from the edited DataFrame
+                df = read_dataset_copy_file(dataset_file_copy, columns=columns)
+                return pa.Table.from_pandas(df, preserve_index=False), None
+            table = read_dataset_table(dataset_file_copy, columns=columns)
+            return table, None
+        else:
+            err = "Dataset copy does not exists"
+            return None, err
+    except Exception as e:
+        app.logger.error("Error in getting the dataset copy table")
+        raise Exception(e)
+
+def read_dataset_table_head(dataset_file, n_rows):
+    """
+        Reads only the first row groups of the parquet file, as many as hold the first n_rows rows
+        RETURNS the Arrow table of the first n_rows rows and the number of rows of the file, which is in its footer
+    """
+    start_time = time.perf_counter()
+    parquet_file = pq.ParquetFile(dataset_file, memory_map=True)
+    tables = []
+    n_rows_read = 0
+    for i in range(parquet_file.num_row_groups):
+        if n_rows_read >= n_rows:
+            break
+        table = parquet_file.read_row_group(i, use_pandas_metadata=True)
+        tables.append(table)
+        n_rows_read += table.num_rows
+    table = pa.concat_tables(tables) if tables else parquet_file.schema_arrow.empty_table()
+    log_decode_time(dataset_file, start_time, table.num_rows, table.num_columns)
+    return table.slice(0, n_rows), parquet_file.metadata.num_rows
+
+def load_dataset_table_head(dataset_name, user_id, user_email, n_rows, is_copy=False):
+    """
+        TAKES dataset name, whether its copy is to be read and the number of rows
+        RETURNS the Arrow table of the first rows of the dataset, its total number of rows and the error if any
+    """
+    try:
+        dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
+        if is_copy:
+            dataset_name = dataset_name + "_copy" # dataset_name = iris_1_copy
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
+
+        if not Path(dataset_file).is_file():
+            err = f"'{dataset_name}' dataset does not exists"
+            return None, None, err
+
+        if is_copy and get_operation_count(dataset_file):
+            # The edits are not in the file yet, the head is taken from the edited DataFrame
+            df = read_dataset_copy_file(dataset_file)
+            return pa.Table.from_pandas(df.head(n_rows), preserve_index=False), df.shape[0], None
+
+        table, total_rows = read_dataset_table_head(dataset_file, n_rows)
+        return table, total_rows, None
+
+    except Exception as e:
+        app.logger.error("Error in loading the head of the dataset table")
+        raise Exception(e)
+
+def get_table_schema_frame(table):
+    """
+        Returns an empty DataFrame with the columns and pandas dtypes the table converts to,
+        so pandas helpers like select_dtypes can be used without converting any data
+    """
+    return table.schema.empty_table().to_pandas()
+
+def table_to_dataframe(table):
+    """
+        Converts the Arrow table to pandas without consolidating the columns into blocks.
+        Numerical columns without nulls are wrapped zero-copy, the rest is converted column by column.
+    """
+    return table.to_pandas(split_blocks=True)
+
+def load_dataset_column_statistics(dataset_name, user_id, user_email, is_copy=False):
+    """
+        RETURNS the column statistics ({column_name: statistics}) and the number of rows of the dataset (or its copy),
+        or (None, None) if they are missing or out of date with the file
+    """
+    try:
+        dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
+        if is_copy:
+            dataset_name = dataset_name + "_copy" # dataset_name = iris_1_copy
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
+        return load_column_statistics(dataset_name, dataset_file)
+    except Exception as e:
+        app.logger.error("Error in loading the column statistics of the dataset")
+        raise Exception(e)
+
+def get_null_counts(dataset_name, user_id, user_email, is_copy=False):
+    """
+        RETURNS the null count of each column and the number of rows of the dataset (or its copy).
+        They are taken from the column statistics saved with the file, the data is only read when those are missing.
+    """
+    try:
+        statistics, n_rows = load_dataset_column_statistics(dataset_name, user_id, user_email, is_copy=is_copy)
+        if statistics is not None and n_rows:
+            null_counts = {column: column_statistics["null_count"] for column, column_statistics in statistics.items()}
+            return null_counts, n_rows, None
+
+        dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
+        if is_copy:
+            dataset_name = dataset_name + "_copy" # dataset_name = iris_1_copy
+        dataset_file = get_parquet_dataset_file_name(dataset_name, user_email)
+        if not Path(dataset_file).is_file():
+            err = f"'{dataset_name}' dataset does not exists"
+            return None, None, err
+
+        df = read_dataset_copy_file(dataset_file) if is_copy else read_dataset_file(dataset_file)
+        return df.isna().sum().to_dict(), df.shape[0], None
+
+    except Exception as e:
+        app.logger.error("Error in getting the null counts of the dataset")
+        raise Exception(e)
+
 def delete_dataset_copy(dataset_name, user_id, user_email):
     try:
         dataset_name = get_dataset_name(user_id, dataset_name) # dataset_name = iris_1
@@ -130,6 +519,9 @@ def delete_dataset_copy(dataset_name, user_id, user_email):
 
         if Path(dataset_file_copy).is_file():
             Path(dataset_file_copy).unlink()
+            dataset_cache.invalidate(dataset_file_copy)
+            clear_operation_log(dataset_file_copy)
+            delete_column_statistics(dataset_name)
             return None
         else:
             err = "Dataset copy does not exists"
@@ -144,8 +536,8 @@ def get_row_column_metadata(df):
     n_values = n_rows * n_columns # Number of values in the dataset
     column_list = list(df.columns) # List of columns in the dataset
     column_datatypes = df.dtypes.astype(str).to_dict() # Dictionary of column name and its type
-    numerical_column_list = df.select_dtypes(exclude=['object', 'bool']).columns.tolist() # List of numerical columns
-    categorical_column_list = df.select_dtypes(include=['object', 'bool']).columns.tolist() # List of categorical columns
+    numerical_column_list = df.select_dtypes(exclude=CATEGORICAL_DTYPES).columns.tolist() # List of numerical columns
+    categorical_column_list = df.select_dtypes(include=CATEGORICAL_DTYPES).columns.tolist() # List of categorical columns
     
     return {
         "n_rows": n_rows,
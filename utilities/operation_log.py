@@ -0,0 +1,141 @@
+"""Append only log of the edits made to the working copy of a dataset since its last checkpoint"""
+
+import json
+import os
+import uuid
+from pathlib import Path
+import pyarrow.parquet as pq
+
+# name => function(df, **params) returning the edited DataFrame
+OPERATIONS = {}
+# Key of the parquet key-value metadata recording the "generation:n_operations" of the log a checkpoint covers
+CHECKPOINT_METADATA_KEY = "rbl_operation_log"
+
+
+def register_operation(name):
+    """
+        Registers the function as a replayable edit. The function takes the DataFrame and JSON serialisable
+        parameters and returns the edited DataFrame, it has to give the same result every time it is replayed.
+    """
+    def decorator(function):
+        OPERATIONS[name] = function
+        return function
+    return decorator
+
+
+def _load_operations():
+    # The operations are registered by the API utilities modules, which are not imported by every process (celery)
+    import api.DataPreprocessing.utilities_data_preprocessing # noqa: F401
+    import api.FeatureEngineering.utilities_feature_engineering # noqa: F401
+
+
+def apply_operation(df, name, params):
+    """
+        TAKES the DataFrame, the name of the operation and its parameters
+        PERFORMS the operation exactly as it is done when the operation is replayed from the log
+        RETURNS the edited DataFrame
+    """
+    if name not in OPERATIONS:
+        _load_operations()
+    params = json.loads(json.dumps(params)) # same parameters as the ones read back from the log
+    df = OPERATIONS[name](df, **params)
+    # The copy is written without the index, so a replayed DataFrame always starts from a fresh index
+    return df.reset_index(drop=True)
+
+
+def get_operation_log_file(dataset_file):
+    return dataset_file[:-len(".parquet")] + ".oplog" # iris_1_copy.parquet => iris_1_copy.oplog
+
+
+def read_operation_log(dataset_file):
+    """
+        RETURNS the generation of the log and the list of (name, params) of its operations.
+        The first line of the log is its generation, a new one every time the log is started, so two logs of the
+        same length are never taken for one another. (None, []) if the copy has no log.
+    """
+    operation_log_file = get_operation_log_file(dataset_file)
+    if not Path(operation_log_file).is_file():
+        return None, []
+    generation = None
+    operations = []
+    with open(operation_log_file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "generation" in entry:
+                generation = entry["generation"]
+            else:
+                operations.append((entry["name"], entry["params"]))
+    return generation, operations
+
+
+def get_operation_count(dataset_file):
+    return len(read_operation_log(dataset_file)[1])
+
+
+def get_operation_log_version(generation, operations):
+    """RETURNS the version the edited DataFrame is cached and its statistics are saved under"""
+    return f"{generation}:{len(operations)}"
+
+
+def get_checkpoint_metadata(generation, operations):
+    """
+        RETURNS the key-value metadata of a checkpoint written with the operations of the log. A crash after the
+        file is written but before the log is started again leaves the log behind, its operations are then skipped.
+    """
+    return {CHECKPOINT_METADATA_KEY: get_operation_log_version(generation, operations)}
+
+
+def get_pending_operations(dataset_file, generation, operations):
+    """
+        TAKES the parquet file and its log (read_operation_log)
+        RETURNS the operations which are not in the file yet, the ones after the checkpoint recorded in the file
+    """
+    if not operations:
+        return operations
+    metadata = pq.read_metadata(dataset_file).metadata or {}
+    checkpoint = metadata.get(CHECKPOINT_METADATA_KEY.encode())
+    if checkpoint is None:
+        return operations
+    checkpoint_generation, n_operations = checkpoint.decode().rsplit(":", 1)
+    if checkpoint_generation != str(generation):
+        return operations
+    return operations[int(n_operations):]
+
+
+def start_operation_log(dataset_file):
+    """
+        Starts a new empty log of a new generation, in place of the previous one.
+        Called when the copy is created and once the operations are written to the dataset file.
+        RETURNS the generation of the new log
+    """
+    generation = uuid.uuid4().hex
+    operation_log_file = get_operation_log_file(dataset_file)
+    temporary_file = f"{operation_log_file}.{generation}"
+    with open(temporary_file, "w") as f:
+        f.write(json.dumps({"generation": generation}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_file, operation_log_file)
+    return generation
+
+
+def append_operation(dataset_file, name, params):
+    with open(get_operation_log_file(dataset_file), "a") as f:
+        f.write(json.dumps({"name": name, "params": params}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def clear_operation_log(dataset_file):
+    """Called when the copy is removed"""
+    operation_log_file = get_operation_log_file(dataset_file)
+    if Path(operation_log_file).is_file():
+        Path(operation_log_file).unlink()
+
+
+def replay_operations(df, operations):
+    for name, params in operations:
+        df = apply_operation(df, name, params)
+    return df
@@ -0,0 +1,34 @@
+"""Compression settings of the parquet dataset files"""
+
+import pyarrow as pa
+from utilities.constants import PARQUET_CODECS
+
+
+def parse_compression(compression):
+    """
+        TAKES the compression setting, the codec optionally followed by its level (none, snappy, lz4, zstd:9)
+        RETURNS the (codec, level) to write the parquet file with, level is None for the default level of the codec.
+        Raises ValueError for an invalid setting
+    """
+    codec, _, level = str(compression).strip().lower().partition(":")
+    if codec not in PARQUET_CODECS:
+        raise ValueError(f"Invalid compression '{compression}'. Codec should be one of {', '.join(PARQUET_CODECS)}")
+    if not level:
+        return codec, None
+
+    if codec == "none" or not pa.Codec.supports_compression_level(codec):
+        raise ValueError(f"Compression level is not supported for {codec}")
+    try:
+        level = int(level)
+    except ValueError:
+        raise ValueError(f"Invalid compression level '{level}'")
+    minimum, maximum = pa.Codec.minimum_compression_level(codec), pa.Codec.maximum_compression_level(codec)
+    if not minimum <= level <= maximum:
+        raise ValueError(f"Compression level of {codec} should be between {minimum} and {maximum}")
+    return codec, level
+
+
+def get_parquet_write_options(compression):
+    """RETURNS the keyword arguments of DataFrame.to_parquet / pyarrow.parquet.write_table for the compression setting"""
+    codec, level = parse_compression(compression)
+    return {"compression": None if codec == "none" else codec, "compression_level": level}
@@ -0,0 +1,178 @@
+"""Upload time pass choosing the smallest dtypes which hold the values of the dataset exactly"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (
+    infer_dtype,
+    is_bool_dtype,
+    is_categorical_dtype,
+    is_float_dtype,
+    is_integer_dtype,
+)
+
+INTEGER_DTYPES = ["int8", "int16", "int32", "int64"]
+BOOL_LIKE_VALUES = [("true", "false"), ("yes", "no"), ("y", "n"), ("t", "f")] # (True, False) spellings, compared lower cased
+DATE_LIKE_PATTERN = r"\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?" # 2020-01-31, 2020-01-31 10:30, 2020-01-31T10:30:15.5
+
+
+def _numeric_profile(values):
+    # values are the non null values of a numeric column or the parsed values of a numeric string column
+    if values.empty:
+        return {"min": None, "max": None, "integral": True, "float32_exact": True}
+    as_float = values.astype("float64")
+    return {
+        "min": float(as_float.min()),
+        "max": float(as_float.max()),
+        "integral": bool(np.all(np.mod(as_float, 1) == 0)),
+        "float32_exact": bool(np.all(as_float.astype("float32").astype("float64") == as_float)),
+    }
+
+
+def profile_column_types(df):
+    """
+        TAKES a DataFrame, the whole dataset or a chunk of it
+        RETURNS the profile of the values of each column, the profiles of the chunks are combined with merge_type_profiles
+    """
+    profiles = {}
+    for column in df.columns:
+        series = df[column]
+        values = series.dropna()
+        profile = {
+            "dtype": str(series.dtype),
+            "n_values": int(values.shape[0]),
+            "n_nulls": int(series.shape[0] - values.shape[0]),
+            "all_numeric": False,
+            "all_dates": False,
+            "bool_values": None,
+            "min": None,
+            "max": None,
+            "integral": False,
+            "float32_exact": False,
+        }
+
+        if is_bool_dtype(series.dtype):
+            profile["bool_values"] = ["false", "true"]
+        elif is_categorical_dtype(series.dtype):
+            pass
+        elif is_integer_dtype(series.dtype) or is_float_dtype(series.dtype):
+            profile["all_numeric"] = True
+            profile.update(_numeric_profile(values))
+        elif infer_dtype(values, skipna=True) in ("string", "empty"):
+            strings = values.astype(str).str.strip()
+            lowered = strings.str.lower().unique()
+            if len(lowered) <= 2:
+                profile["bool_values"] = sorted(lowered.tolist())
+            profile["all_dates"] = bool(strings.str.fullmatch(DATE_LIKE_PATTERN).all()) and \
+                bool(pd.to_datetime(strings, errors="coerce").notna().all())
+            numeric = pd.to_numeric(strings, errors="coerce")
+            if numeric.notna().all():
+                profile["all_numeric"] = True
+                profile.update(_numeric_profile(numeric))
+        profiles[column] = profile
+    return profiles
+
+
+def merge_dtypes(dtype, other_dtype):
+    """RETURNS the dtype pandas gives a column whose chunks were parsed as the two dtypes"""
+    if dtype == other_dtype:
+        return dtype
+    numeric = ("int", "uint", "float")
+    if dtype.startswith(numeric) and other_dtype.startswith(numeric):
+        return "float64" # what pandas infers for a column with both integers and decimals
+    return "object"
+
+
+def merge_type_profiles(profiles, other_profiles):
+    """
+        TAKES the profiles of two chunks of the same dataset
+        RETURNS the profile of both chunks together
+    """
+    merged = {}
+    for column, profile in profiles.items():
+        other = other_profiles[column]
+        bool_values = None
+        if profile["bool_values"] is not None and other["bool_values"] is not None:
+            bool_values = sorted(set(profile["bool_values"]) | set(other["bool_values"]))
+            if len(bool_values) > 2:
+                bool_values = None
+        minimums = [value for value in (profile["min"], other["min"]) if value is not None]
+        maximums = [value for value in (profile["max"], other["max"]) if value is not None]
+        merged[column] = {
+            "dtype": merge_dtypes(profile["dtype"], other["dtype"]),
+            "n_values": profile["n_values"] + other["n_values"],
+            "n_nulls": profile["n_nulls"] + other["n_nulls"],
+            "all_numeric": profile["all_numeric"] and other["all_numeric"],
+            "all_dates": profile["all_dates"] and other["all_dates"],
+            "bool_values": bool_values,
+            "min": min(minimums) if minimums else None,
+            "max": max(maximums) if maximums else None,
+            "integral": profile["integral"] and other["integral"],
+            "float32_exact": profile["float32_exact"] and other["float32_exact"],
+        }
+    return merged
+
+
+def _get_numeric_dtype(profile):
+    if profile["integral"] and profile["n_nulls"] == 0 and profile["min"] is not None:
+        for dtype in INTEGER_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= profile["min"] and profile["max"] <= info.max:
+                return dtype
+    if profile["float32_exact"]:
+        return "float32"
+    return "float64"
+
+
+def get_optimized_dtypes(profiles):
+    """
+        TAKES the profiles of the columns of the dataset
+        RETURNS {column: dtype} for the columns whose values fit in a smaller or more specific dtype
+    """
+    dtypes = {}
+    for column, profile in profiles.items():
+        dtype = profile["dtype"]
+        if profile["n_values"] == 0 or dtype == "bool" or dtype == "category":
+            continue
+
+        if dtype == "object":
+            if profile["all_dates"]:
+                new_dtype = "datetime64[ns]"
+            elif profile["bool_values"] is not None and profile["n_nulls"] == 0 and \
+                    any(set(profile["bool_values"]) <= set(pair) for pair in BOOL_LIKE_VALUES):
+                new_dtype = "bool"
+            elif profile["all_numeric"]:
+                new_dtype = _get_numeric_dtype(profile)
+            else:
+                continue
+        elif dtype.startswith(("int", "uint")):
+            new_dtype = _get_numeric_dtype(profile)
+        elif dtype.startswith("float") and profile["float32_exact"]:
+            new_dtype = "float32" # decimal columns stay decimal, only their width changes
+        else:
+            continue
+
+        if new_dtype != dtype:
+            dtypes[column] = new_dtype
+    return dtypes
+
+
+def apply_optimized_dtypes(df, dtypes):
+    """
+        TAKES the DataFrame (or a chunk of it) and the dtypes given by get_optimized_dtypes
+        RETURNS the DataFrame with the columns converted
+    """
+    for column, dtype in dtypes.items():
+        series = df[column]
+        if series.dtype == object:
+            strings = series.astype(str).str.strip().where(series.notna())
+            if dtype == "bool":
+                lowered = strings.str.lower()
+                true_values = [pair[0] for pair in BOOL_LIKE_VALUES]
+                df[column] = lowered.isin(true_values)
+                continue
+            if dtype.startswith("datetime"):
+                df[column] = pd.to_datetime(strings)
+                continue
+            series = pd.to_numeric(strings)
+        df[column] = series.astype(dtype)
+    return df
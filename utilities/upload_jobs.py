@@ -0,0 +1,53 @@
+"""Status of the dataset uploads processed by the celery workers, kept in redis so every web worker can answer for it"""
+
+import uuid
+from manage.redis_conf import redis
+from utilities.constants import UPLOAD_JOB_TTL
+
+UPLOAD_JOB_QUEUED = "queued"
+UPLOAD_JOB_RUNNING = "running"
+UPLOAD_JOB_SUCCESS = "success"
+UPLOAD_JOB_FAILED = "failed"
+
+INTEGER_FIELDS = ["user_id", "total_bytes", "bytes_parsed", "rows_written"]
+
+
+def _get_upload_job_key(job_id):
+    return f"upload_job:{job_id}"
+
+
+def create_upload_job(user_id, dataset_name, total_bytes):
+    """
+        TAKES the user, the name of the uploaded file and its size in bytes
+        RETURNS the id of the new upload job
+    """
+    job_id = uuid.uuid4().hex
+    key = _get_upload_job_key(job_id)
+    redis.hset(key, mapping={
+        "user_id": user_id,
+        "dataset_name": dataset_name,
+        "status": UPLOAD_JOB_QUEUED,
+        "stage": "",
+        "total_bytes": total_bytes,
+        "bytes_parsed": 0,
+        "rows_written": 0,
+        "error": "",
+    })
+    redis.expire(key, UPLOAD_JOB_TTL)
+    return job_id
+
+
+def update_upload_job(job_id, **fields):
+    """PERFORMS the update of the given fields of the upload job (status, stage, bytes_parsed, rows_written, error)"""
+    redis.hset(_get_upload_job_key(job_id), mapping=fields)
+
+
+def get_upload_job(job_id):
+    """RETURNS the fields of the upload job, or None if there is no such job or it has expired"""
+    job = redis.hgetall(_get_upload_job_key(job_id))
+    if not job:
+        return None
+    job = {field.decode(): value.decode() for field, value in job.items()}
+    for field in INTEGER_FIELDS:
+        job[field] = int(job[field])
+    return job